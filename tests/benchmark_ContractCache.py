@@ -0,0 +1,88 @@
+# encoding: UTF-8
+
+"""
+合约缓存保存及启动读取耗时对比
+
+before: shelve 保存整个 contractDict 并重写 indent=4 的 JSON, 启动时读取全部合约
+after:  ContractCache 增量写入 SQLite, 启动时不读取, 使用时按合约读取
+
+python tests/benchmark_ContractCache.py [合约数量]
+"""
+
+import os
+import sys
+import json
+import shelve
+import shutil
+import tempfile
+from time import perf_counter
+
+from vnpy.base_class import ContractData
+from vnpy.utility.contractCache import ContractCache
+
+
+def makeContracts(total):
+    contracts = []
+    for n in range(total):
+        contract = ContractData()
+        contract.gatewayName = 'CTP'
+        contract.symbol = 'c%05d' % n
+        contract.exchange = 'SHFE'
+        contract.vtSymbol = contract.symbol + '.SHFE'
+        contract.name = contract.symbol
+        contract.size = 10
+        contract.priceTick = 1.0
+        contracts.append(contract)
+    return contracts
+
+
+def timed(func):
+    start = perf_counter()
+    func()
+    return (perf_counter() - start) * 1000
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 30000
+    folder = tempfile.mkdtemp()
+    contracts = makeContracts(total)
+    contractDict = {}
+    for contract in contracts:
+        contractDict[contract.vtSymbol] = contract
+        contractDict[contract.symbol] = contract
+
+    shelvePath = os.path.join(folder, 'ContractData.vt')
+    jsonPath = os.path.join(folder, 'ContractData.json')
+
+    def saveBefore():
+        with shelve.open(shelvePath) as f:
+            f['data'] = contractDict
+        with open(jsonPath, 'w+') as f:
+            f.write(json.dumps([{k: v.__dict__} for k, v in contractDict.items()], indent=4))
+
+    def loadBefore():
+        with shelve.open(shelvePath) as f:
+            dict(f['data'])
+
+    cache = ContractCache(os.path.join(folder, 'ContractCache.db'))
+    cache.upsert(contracts, '20191008')
+
+    # 收盘时只写入当天推送过的合约, 这里按 5% 有变化计算
+    changed = contracts[:total // 20]
+
+    print('{n} contracts'.format(n=total))
+    print('before: save {s:8.1f} ms, cold start {l:8.1f} ms'.format(
+        s=timed(saveBefore), l=timed(loadBefore)))
+    print('after : save {s:8.1f} ms (full {f:.1f} ms), cold start {l:8.1f} ms, '
+          'first lookup {g:.3f} ms'.format(
+              s=timed(lambda: cache.upsert(changed, '20191009')),
+              f=timed(lambda: cache.upsert(contracts, '20191009')),
+              l=timed(lambda: ContractCache(os.path.join(folder, 'ContractCache.db'))),
+              g=timed(lambda: cache.get('c00042.SHFE'))))
+
+    cache.close()
+    shutil.rmtree(folder)
+
+
+if __name__ == '__main__':
+    main()
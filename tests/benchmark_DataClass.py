@@ -0,0 +1,84 @@
+# encoding: UTF-8
+
+"""
+数据类内存占用及复制耗时对比
+
+before: base_class 中基于 __dict__ 的 TickData/BarData/OrderData/TradeData
+after:  compact_class 中基于 __slots__ 的同名类
+
+内存: 用 tracemalloc 统计创建 n 个填满五档行情的对象增加的内存
+耗时: 创建, copy() 及读取 bidPrice1 的单次平均耗时
+
+python tests/benchmark_DataClass.py [对象数量]
+"""
+
+import sys
+import tracemalloc
+from copy import copy
+from timeit import timeit
+
+from vnpy import base_class, compact_class
+
+
+def fillTick(tick, n):
+    tick.vtSymbol = 'rb1910.SHFE'
+    tick.lastPrice = 3500.0 + n
+    tick.volume = n
+    for level in range(1, 6):
+        setattr(tick, 'bidPrice%d' % level, 3500.0 + n - level)
+        setattr(tick, 'askPrice%d' % level, 3500.0 + n + level)
+        setattr(tick, 'bidVolume%d' % level, n + level)
+        setattr(tick, 'askVolume%d' % level, n + level * 2)
+    return tick
+
+
+def measureMemory(cls, total):
+    """每个对象平均占用的字节数, 包括各字段的值"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    ticks = [fillTick(cls(), n) for n in range(total)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del ticks
+    return (after - before) / total
+
+
+def measureTime(stmt, number=100000):
+    """单次平均耗时(微秒)"""
+    return timeit(stmt, number=number) / number * 1e6
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    print('TickData, {n} objects'.format(n=total))
+    results = {}
+    for title, module in (('before', base_class), ('after ', compact_class)):
+        cls = module.TickData
+        tick = fillTick(cls(), 1)
+        results[title] = (
+            measureMemory(cls, total),
+            measureTime(cls),
+            measureTime(lambda: copy(tick)),
+            measureTime(lambda: tick.bidPrice1),
+        )
+        print('{t}: {m:8.0f} bytes/tick, init {i:6.2f} us, copy {c:6.2f} us, '
+              'read bidPrice1 {r:6.3f} us'.format(t=title, m=results[title][0],
+                                                  i=results[title][1], c=results[title][2],
+                                                  r=results[title][3]))
+
+    before, after = results['before'], results['after ']
+    print('ratio : memory {m:.1f}x, copy {c:.1f}x'.format(
+        m=before[0] / after[0], c=before[2] / after[2]))
+
+    for name in ('BarData', 'OrderData', 'TradeData'):
+        line = []
+        for title, module in (('before', base_class), ('after ', compact_class)):
+            data = getattr(module, name)()
+            line.append('{t} copy {c:5.2f} us'.format(
+                t=title.strip(), c=measureTime(lambda: copy(data))))
+        print('{n:9s}: {l}'.format(n=name, l=', '.join(line)))
+
+
+if __name__ == '__main__':
+    main()
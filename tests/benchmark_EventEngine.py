@@ -0,0 +1,131 @@
+# encoding: UTF-8
+
+"""
+事件引擎分发吞吐量测试
+
+沿用 test_EventEngine.py 的设置: 一个按类型注册的处理函数加一个通用处理函数,
+由若干生产线程(模拟各 gateway 回调线程)并发写入行情事件, 统计每秒处理的事件数.
+
+before: BaselineEngine, 原有 EventEngine2 的分发循环, Queue.get 逐条取出 + 列表推导式分发
+after:  EventEngine2, 按生产者分 ring 批量取出 + 不可变 handler tuple 分发
+
+python tests/benchmark_EventEngine.py [事件总数] [生产线程数]
+"""
+
+import sys
+from time import perf_counter, sleep
+from queue import Queue, Empty
+from threading import Thread, Event as ThreadEvent
+from collections import defaultdict
+
+from vnpy.vtConstant import C_EVENT
+from vnpy.base_class import Event, TickData
+from vnpy.utility.eventEngine import EventEngine2
+
+
+class BaselineEngine(object):
+    """原有 EventEngine2 的事件队列和分发方式, 不含计时器"""
+
+    def __init__(self):
+        self.__queue = Queue()
+        self.__active = False
+        self.__thread = Thread(target=self.__run)
+        self.__handlers = defaultdict(list)
+        self.__generalHandlers = []
+
+    def __run(self):
+        while self.__active == True:
+            try:
+                event = self.__queue.get(block=True, timeout=1)
+                self.__process(event)
+            except Empty:
+                pass
+
+    def __process(self, event):
+        if event.type_ in self.__handlers:
+            [handler(event) for handler in self.__handlers[event.type_]]
+
+        if self.__generalHandlers:
+            [handler(event) for handler in self.__generalHandlers]
+
+    def start(self, timer=True):
+        self.__active = True
+        self.__thread.start()
+
+    def stop(self):
+        self.__active = False
+        self.__thread.join()
+
+    def putEvent(self, event):
+        self.__queue.put(event)
+
+    def registerEvent(self, type_, handler):
+        self.__handlers[type_].append(handler)
+
+    def registerGeneralHandler(self, handler):
+        self.__generalHandlers.append(handler)
+
+
+def runBenchmark(engine, total, producers):
+    done = ThreadEvent()
+    counter = [0]
+
+    def onTick(event):
+        counter[0] += 1
+
+    def onGeneral(event):
+        if counter[0] >= total:
+            done.set()
+
+    engine.registerEvent(C_EVENT.EVENT_TICK, onTick)
+    engine.registerGeneralHandler(onGeneral)
+    engine.start(timer=False)
+
+    # 预先生成事件, 避免把对象创建计入分发时间
+    perProducer = total // producers
+    batches = []
+    for n in range(producers):
+        tick = TickData()
+        tick.vtSymbol = 'rb19{n:02d}'.format(n=n)
+        batch = []
+        for _ in range(perProducer):
+            event = Event(type_=C_EVENT.EVENT_TICK)
+            event.dict_['data'] = tick
+            batch.append(event)
+        batches.append(batch)
+    total = perProducer * producers
+
+    def produce(batch):
+        put = engine.putEvent
+        for event in batch:
+            put(event)
+
+    threads = [Thread(target=produce, args=(batch,)) for batch in batches]
+    start = perf_counter()
+    for thread in threads:
+        thread.start()
+    done.wait(60)
+    elapsed = perf_counter() - start
+
+    for thread in threads:
+        thread.join()
+    engine.stop()
+    return total / elapsed
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    producers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+
+    before = runBenchmark(BaselineEngine(), total, producers)
+    sleep(0.5)
+    after = runBenchmark(EventEngine2(), total, producers)
+
+    print('events: {t}, producers: {p}'.format(t=total, p=producers))
+    print('before (baseline):     {r:>12,.0f} events/s'.format(r=before))
+    print('after  (EventEngine2): {r:>12,.0f} events/s'.format(r=after))
+    print('speedup: {x:.2f}x'.format(x=after / before))
+
+
+if __name__ == '__main__':
+    main()
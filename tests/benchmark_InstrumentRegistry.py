@@ -0,0 +1,91 @@
+# encoding: UTF-8
+
+"""
+行情热点路径中按合约查表的耗时对比
+
+before: 以 vtSymbol 为键的字典, DataEngine 保存最新行情, CtaEngine 查询交易该合约的策略
+after:  gateway 创建行情时写入 instrumentId, 引擎按编号直接读取 InstrumentTable.items
+
+每笔行情的查表次数与引擎相同: 保存行情, 查询交易该合约的策略, 停止单检查.
+另外给出 gateway 未写入编号, 由 DataEngine 查询并写入时的耗时.
+
+python tests/benchmark_InstrumentRegistry.py [合约数量]
+"""
+
+import sys
+from timeit import repeat
+
+from vnpy.base_class import TickData, ContractData
+from vnpy.utility.instrumentRegistry import InstrumentTable
+
+
+def measureTime(stmt, namespace, number=200000):
+    """单次平均耗时(纳秒), 取多次测量的最小值"""
+    return min(repeat(stmt, number=number, repeat=7, globals=namespace)) / number * 1e9
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    symbols = ['bm%d.SHFE' % n for n in range(total)]
+
+    tickDict = {}
+    strategyDict = {}
+    tickTable = InstrumentTable()
+    strategyTable = InstrumentTable()
+    for vtSymbol in symbols:
+        contract = ContractData()
+        contract.vtSymbol = vtSymbol
+        strategyDict[vtSymbol] = []
+        strategyTable[contract.instrumentId] = []
+
+    tick = TickData()
+    tick.vtSymbol = symbols[total // 2]
+    tick.instrumentId = strategyTable.registry.getId(tick.vtSymbol)
+
+    namespace = {
+        'tick': tick, 'tickDict': tickDict, 'strategyDict': strategyDict,
+        'tickItems': tickTable.items, 'strategyItems': strategyTable.items,
+        'TickData': TickData, 'vtSymbol': tick.vtSymbol,
+        'register': strategyTable.registry.register,
+    }
+
+    # 与原有引擎代码相同: DataEngine 保存行情, CtaEngine 检查并取出策略列表, 停止单检查
+    before = measureTime(
+        'tickDict[tick.vtSymbol] = tick\n'
+        'if tick.vtSymbol in strategyDict:\n'
+        '    vtSymbol = tick.vtSymbol\n'
+        '    vtSymbol in strategyDict\n'
+        '    l = strategyDict[tick.vtSymbol]', namespace)
+    after = measureTime(
+        'iid = tick.instrumentId\n'
+        'tickItems[iid] = tick\n'
+        'iid = tick.instrumentId\n'
+        'l = strategyItems[iid]\n'
+        'if l is not None:\n'
+        '    iid = tick.instrumentId\n'
+        '    strategyItems[iid] is not None', namespace)
+    lazy = measureTime(
+        'data = TickData.__new__(TickData)\n'
+        'data.vtSymbol = vtSymbol\n'
+        'iid = data.instrumentId\n'
+        'if iid is None:\n'
+        '    iid = data.instrumentId = register(data.vtSymbol)\n'
+        'tickItems[iid] = data\n'
+        'iid = data.instrumentId\n'
+        'l = strategyItems[iid]\n'
+        'if l is not None:\n'
+        '    iid = data.instrumentId\n'
+        '    strategyItems[iid] is not None', namespace)
+    create = measureTime(
+        'data = TickData.__new__(TickData)\n'
+        'data.vtSymbol = vtSymbol', namespace)
+
+    print('{n} instruments, per tick in DataEngine and CtaEngine'.format(n=total))
+    print('before (dict by vtSymbol)     : {t:6.1f} ns/tick'.format(t=before))
+    print('after  (id set by gateway)    : {t:6.1f} ns/tick'.format(t=after))
+    print('after  (id set by DataEngine)  : {t:6.1f} ns/tick'.format(t=lazy - create))
+    print('ratio : {r:.2f}x'.format(r=before / after))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+# encoding: UTF-8
+
+"""
+共享内存事件总线与进程内事件引擎的对比测试
+
+吞吐量: 生产方连续写入行情, 统计每个消费方处理全部行情所用的时间
+延迟:   生产方按固定速率写入行情, 统计从写入到消费方处理函数被调用的耗时分位数
+
+before: 进程内 EventEngine2, 消费方为同一进程中的多个处理函数
+after:  SharedMemoryPublisher + 每个消费进程一个 SharedMemoryEventEngine
+
+python tests/benchmark_SharedMemoryBus.py [行情数量] [消费进程数]
+"""
+
+import os
+import sys
+import multiprocessing
+from time import sleep, perf_counter, monotonic_ns
+
+from vnpy.vtConstant import C_EVENT
+from vnpy.base_class import Event, TickData
+from vnpy.utility.eventEngine import EventEngine2
+from vnpy.utility.sharedMemoryBus import SharedMemoryPublisher, SharedMemoryEventEngine
+
+
+def makeEvents(total):
+    events = []
+    for n in range(total):
+        tick = TickData()
+        tick.vtSymbol = 'rb19{n:02d}'.format(n=n % 20)
+        tick.lastPrice = 3500.0 + n % 10
+        tick.volume = n
+        event = Event(type_=C_EVENT.EVENT_TICK, key=tick.vtSymbol)
+        event.dict_['data'] = tick
+        events.append(event)
+    return events
+
+
+def percentiles(latencies):
+    latencies = sorted(latencies)
+    if not latencies:
+        return {}
+    return {q: latencies[min(int(len(latencies) * q), len(latencies) - 1)] / 1000.0
+            for q in (0.5, 0.9, 0.99)}
+
+
+def consume(name, total, ready, results):
+    """消费进程: 挂载共享内存, 处理 total 条行情后返回耗时及延迟"""
+    ee = SharedMemoryEventEngine(name)
+    latencies = []
+    state = {'count': 0, 'start': None, 'end': None}
+
+    def onTick(event):
+        now = monotonic_ns()
+        if state['start'] is None:
+            state['start'] = perf_counter()
+        latencies.append(now - event.dict_['publishNs'])
+        state['count'] += 1
+        if state['count'] == total:
+            state['end'] = perf_counter()
+
+    ee.registerEvent(C_EVENT.EVENT_TICK, onTick)
+    ee.start(timer=False)
+    ready.set()
+
+    for _ in range(6000):
+        if state['end'] is not None:
+            break
+        sleep(0.01)
+    ee.stop()
+
+    elapsed = (state['end'] or perf_counter()) - (state['start'] or perf_counter())
+    results.put((state['count'], elapsed, percentiles(latencies), ee.getLostCount()))
+
+
+def runShared(total, consumers, rate=None):
+    ctx = multiprocessing.get_context('spawn')
+    name = 'vnpy_bench_{pid}'.format(pid=os.getpid())
+
+    source = EventEngine2()
+    publisher = SharedMemoryPublisher(name, capacity=max(total, 1024))
+    publisher.register(source)
+    source.start(timer=False)
+
+    results = ctx.Queue()
+    readyList = []
+    processes = []
+    for _ in range(consumers):
+        ready = ctx.Event()
+        process = ctx.Process(target=consume, args=(name, total, ready, results))
+        process.start()
+        readyList.append(ready)
+        processes.append(process)
+    for ready in readyList:
+        ready.wait(30)
+
+    publish(source, makeEvents(total), rate)
+
+    reports = [results.get(timeout=120) for _ in processes]
+    for process in processes:
+        process.join()
+    source.stop()
+    publisher.close()
+    return reports
+
+
+def runInProcess(total, consumers, rate=None):
+    ee = EventEngine2()
+    reports = []
+
+    for _ in range(consumers):
+        state = {'count': 0, 'start': None, 'end': None, 'latencies': []}
+
+        def onTick(event, state=state):
+            now = monotonic_ns()
+            if state['start'] is None:
+                state['start'] = perf_counter()
+            state['latencies'].append(now - event.dict_['publishNs'])
+            state['count'] += 1
+            if state['count'] == total:
+                state['end'] = perf_counter()
+
+        ee.registerEvent(C_EVENT.EVENT_TICK, onTick)
+        reports.append(state)
+
+    ee.start(timer=False)
+    publish(ee, makeEvents(total), rate, stamp=True)
+    for _ in range(6000):
+        if all([state['end'] is not None for state in reports]):
+            break
+        sleep(0.01)
+    ee.stop()
+
+    return [(s['count'], (s['end'] or perf_counter()) - s['start'],
+             percentiles(s['latencies']), 0) for s in reports]
+
+
+def publish(engine, events, rate=None, stamp=False):
+    """rate 为 None 时连续写入, 否则按每秒 rate 条的速率写入"""
+    put = engine.putEvent
+    interval = 1.0 / rate if rate else 0
+    start = perf_counter()
+    for n, event in enumerate(events):
+        if interval:
+            while perf_counter() - start < n * interval:
+                pass
+        if stamp:
+            event.dict_['publishNs'] = monotonic_ns()
+        put(event)
+
+
+def report(title, reports):
+    for n, (count, elapsed, latency, lost) in enumerate(reports):
+        print('{t} consumer {n}: {c} ticks, {r:>12,.0f} ticks/s, lost {l}, '
+              'latency us p50 {p50:.1f} p90 {p90:.1f} p99 {p99:.1f}'.format(
+                  t=title, n=n, c=count, r=count / elapsed if elapsed else 0, l=lost,
+                  p50=latency.get(0.5, 0), p90=latency.get(0.9, 0), p99=latency.get(0.99, 0)))
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    consumers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+
+    print('throughput, {t} ticks, {c} consumers'.format(t=total, c=consumers))
+    report('before (in-process) ', runInProcess(total, consumers))
+    report('after  (shared mem) ', runShared(total, consumers))
+
+    paced = min(total, 20000)
+    print('latency, {t} ticks at 10000 ticks/s, {c} consumers'.format(t=paced, c=consumers))
+    report('before (in-process) ', runInProcess(paced, consumers, rate=10000))
+    report('after  (shared mem) ', runShared(paced, consumers, rate=10000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+import unittest
+import asyncio
+from time import sleep
+from threading import current_thread
+
+from aiohttp import web
+
+from vnpy.vtConstant import C_EVENT
+from vnpy.base_class import Event
+from vnpy.utility.asyncEventEngine import AsyncEventEngine, submitCoroutine
+from vnpy.gateway.restGateway import AsyncRestClient
+from vnpy.gateway.websocketGateway import AsyncWebsocketClient
+
+
+def waitUntil(condition, timeout=5):
+    for _ in range(int(timeout / 0.01)):
+        if condition():
+            return True
+        sleep(0.01)
+    return condition()
+
+
+async def startServer():
+    """本地替身服务器: /get 返回查询参数, /status/401 返回401, /ws 原样返回收到的文本"""
+    async def onGet(request):
+        return web.json_response({'args': dict(request.query)})
+
+    async def onUnauthorized(request):
+        return web.Response(status=401)
+
+    async def onWebsocket(request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        async for msg in ws:
+            await ws.send_str(msg.data)
+        return ws
+
+    app = web.Application()
+    app.router.add_get('/get', onGet)
+    app.router.add_post('/status/401', onUnauthorized)
+    app.router.add_get('/ws', onWebsocket)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, port
+
+
+class TestAsyncEventEngine(unittest.TestCase):
+    def setUp(self):
+        self.ee = AsyncEventEngine()
+        self.ee.start(timer=False)
+
+    def tearDown(self):
+        self.ee.stop()
+
+    def test_dispatch(self):
+        received, general, keyed, threads = [], [], [], []
+
+        def onTick(event):
+            threads.append(current_thread().name)
+            received.append(event)
+
+        async def onTickAsync(event):
+            await asyncio.sleep(0)
+            received.append(event)
+
+        self.ee.registerEvent(C_EVENT.EVENT_TICK, onTick)
+        self.ee.registerEvent(C_EVENT.EVENT_TICK, onTickAsync)
+        self.ee.registerEvent(C_EVENT.EVENT_TICK + 'rb1910', keyed.append)
+        self.ee.registerGeneralHandler(general.append)
+
+        event = Event(type_=C_EVENT.EVENT_TICK, key='rb1910')
+        self.ee.putEvent(event)
+        self.assertTrue(waitUntil(lambda: len(received) == 2))
+
+        self.assertEqual(general, [event])
+        self.assertEqual(keyed, [event])
+        self.assertEqual(threads, ['AsyncEventEngine'])
+
+    def test_handlerError(self):
+        received = []
+
+        def onBadTick(event):
+            raise ValueError('bad tick')
+
+        async def onBadTickAsync(event):
+            raise ValueError('bad async tick')
+
+        self.ee.registerEvent(C_EVENT.EVENT_TICK, onBadTick)
+        self.ee.registerEvent(C_EVENT.EVENT_TICK, onBadTickAsync)
+        self.ee.registerEvent(C_EVENT.EVENT_TICK, received.append)
+
+        # 出错的处理函数只记录日志, 不影响其他处理函数和后续事件
+        with self.assertLogs('vnpy.utility.asyncEventEngine.AsyncEventEngine', 'ERROR') as cm:
+            for _ in range(3):
+                self.ee.putEvent(Event(type_=C_EVENT.EVENT_TICK))
+            self.assertTrue(waitUntil(lambda: len(received) == 3))
+            self.assertTrue(waitUntil(lambda: len(cm.output) == 6))
+
+        self.assertEqual(sum(['onBadTickAsync' in line for line in cm.output]), 3)
+
+    def test_scheduleTimer(self):
+        oneShot, periodic = [], []
+        self.ee.scheduleTimer(0.02, oneShot.append)
+        timerId = self.ee.scheduleTimer(0.01, periodic.append, interval=0.01)
+        self.assertTrue(self.ee.cancelTimer(self.ee.scheduleTimer(0.01, oneShot.append)))
+
+        self.assertTrue(waitUntil(lambda: len(periodic) >= 3))
+        self.assertTrue(self.ee.cancelTimer(timerId))
+        sleep(0.05)
+        count = len(periodic)
+        sleep(0.05)
+
+        self.assertEqual(len(oneShot), 1)
+        self.assertEqual(len(periodic), count)
+
+
+class TestAsyncClients(unittest.TestCase):
+    def setUp(self):
+        self.ee = AsyncEventEngine()
+        self.ee.start(timer=False)
+        self.runner, port = submitCoroutine(self.ee.loop, startServer()).result(5)
+        self.url = 'http://127.0.0.1:{p}'.format(p=port)
+
+    def tearDown(self):
+        submitCoroutine(self.ee.loop, self.runner.cleanup()).result(5)
+        self.ee.stop()
+
+    def test_restClient(self):
+        client = AsyncRestClient()
+        client.init(self.url, self.ee.loop)
+        client.start()
+
+        results, failed = [], []
+        client.addRequest('GET', '/get', lambda data, req: results.append(data['args']),
+                          params={'user': 'username'})
+        request = client.addRequest('POST', '/status/401', None,
+                                    onFailed=lambda code, req: failed.append(code))
+        client.join(5)
+        client.stop()
+
+        self.assertEqual(results, [{'user': 'username'}])
+        self.assertEqual(failed, [401])
+        self.assertEqual(request.response.status_code, 401)
+
+    def test_websocketClient(self):
+        packets, states = [], []
+
+        class EchoClient(AsyncWebsocketClient):
+            def onConnected(self):
+                states.append('connected')
+
+            def onDisconnected(self):
+                states.append('disconnected')
+
+            def onPacket(self, packet):
+                packets.append(packet)
+
+        client = EchoClient()
+        client.init(self.url + '/ws', self.ee.loop)
+        client.start()
+        self.assertTrue(waitUntil(lambda: states == ['connected']))
+
+        client.sendPacket({'seq': 1})
+        client.sendPacket({'seq': 2})
+        self.assertTrue(waitUntil(lambda: len(packets) == 2))
+
+        client.stop()
+        client.join(5)
+        self.assertEqual(packets, [{'seq': 1}, {'seq': 2}])
+        self.assertEqual(states, ['connected', 'disconnected'])
+
+
+if __name__ == '__main__':
+    unittest.main()
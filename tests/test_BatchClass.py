@@ -0,0 +1,86 @@
+import unittest
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+from vnpy.base_class import TickData, BarData
+from vnpy.batch_class import TickBatch, BarBatch
+
+
+def makeBars(count):
+    bars = []
+    for n in range(count):
+        bar = BarData()
+        bar.vtSymbol = 'rb1910.SHFE'
+        bar.close = 3500.0 + n
+        bar.volume = n
+        bar.datetime = datetime(2019, 6, 3, 9) + timedelta(minutes=n)
+        bar.date = bar.datetime.strftime('%Y%m%d')
+        bar.time = bar.datetime.strftime('%H:%M:%S')
+        bars.append(bar)
+    return bars
+
+
+class TestBatchClass(unittest.TestCase):
+    def test_roundTrip(self):
+        bars = makeBars(10)
+        batch = BarBatch.fromData(bars)
+        self.assertEqual(len(batch), 10)
+        self.assertEqual([bar.__dict__ for bar in batch], [bar.__dict__ for bar in bars])
+        self.assertIsInstance(batch[3].volume, int)
+
+        tick = TickData()
+        tick.vtSymbol = 'BTCUSD'
+        tick.volume = 1.5
+        tick.bidVolume1 = 0.25
+        ticks = TickBatch.fromRecords([dict(tick.__dict__, _id='x')])
+        self.assertEqual(ticks.toData()[0].__dict__, tick.__dict__)
+
+    def test_between(self):
+        batch = BarBatch.fromData(makeBars(10))
+        view = batch.between(datetime(2019, 6, 3, 9, 2), datetime(2019, 6, 3, 9, 5))
+        self.assertEqual(list(view['close']), [3502.0, 3503.0, 3504.0])
+
+        # 截取结果与原容器共享内存
+        view['close'][0] = 0.0
+        self.assertEqual(batch[2].close, 0.0)
+        self.assertEqual(len(batch[8:]), 2)
+
+    def test_iterFromRecords(self):
+        records = [{'close': 1.0, 'volume': 1}] + [{'close': 2.0, 'volume': 2.5}] * 6
+        chunks = list(BarBatch.iterFromRecords(iter(records), 3))
+        self.assertEqual([len(chunk) for chunk in chunks], [3, 3, 1])
+        # 首条之后的小数不被截断
+        self.assertEqual([list(chunk['volume']) for chunk in chunks], [[1, 2.5, 2.5], [2.5] * 3, [2.5]])
+        self.assertEqual(set([chunk['volume'].dtype.kind for chunk in chunks]), set(['f']))
+
+        # 全部为整数时保存为 int64, 出现小数后之后各段均为 float64
+        records = [{'volume': 1}] * 3 + [{'volume': 2.5}] + [{'volume': 3}] * 3
+        chunks = list(BarBatch.iterFromRecords(iter(records), 3))
+        self.assertEqual([chunk['volume'].dtype.kind for chunk in chunks], ['i', 'f', 'f'])
+        batch = chunks[0].concat(chunks[1])
+        self.assertEqual(list(batch['volume']), [1, 1, 1, 2.5, 3, 3])
+
+    def test_invalidValues(self):
+        self.assertRaises(ValueError, BarBatch.fromRecords, [{'vtSymbol': 'x' * 49}])
+        self.assertRaises(ValueError, BarBatch.fromRecords, [{'volume': 2.5}], 'i8')
+        self.assertEqual(len(BarBatch.fromRecords([{'vtSymbol': 'x' * 48}])), 1)
+
+    def test_fromCsv(self):
+        path = os.path.join(tempfile.mkdtemp(), 'bar.csv')
+        with open(path, 'w') as f:
+            f.write('vtSymbol,datetime,close,volume,extra\n')
+            f.write('rb1910.SHFE,2019-06-03 09:00:00,3500.5,12,x\n')
+            f.write('rb1910.SHFE,2019-06-03 09:01:00,3501,13,y\n')
+
+        batch = BarBatch.fromCsv(path)
+        os.remove(path)
+        bars = batch.toData()
+        self.assertEqual([(bar.datetime, bar.close, bar.volume) for bar in bars],
+                         [(datetime(2019, 6, 3, 9, 0), 3500.5, 12),
+                          (datetime(2019, 6, 3, 9, 1), 3501.0, 13)])
+        self.assertEqual(bars[0].interval, '')
+
+
+if __name__ == '__main__':
+    unittest.main()
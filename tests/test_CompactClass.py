@@ -0,0 +1,178 @@
+import unittest
+import os
+import pickle
+import shutil
+import tempfile
+from copy import copy
+from datetime import datetime
+
+from vnpy import base_class
+from vnpy.vtConstant import C_DIRECTION, C_OFFSET, C_ORDER_STATUS as OSTA
+from vnpy.compact_class import TickData, BarData, OrderData, TradeData
+from vnpy.gateway.base_gateway import BaseGateway
+from vnpy.vtEngine import DataEngine
+
+
+class EventRecorder(object):
+    """同步分发 putEvent 的事件, 代替 MainEngine"""
+    def __init__(self):
+        self.handlerDict = {}
+
+    def scheduleTimer(self, delay, handler, interval=None):
+        return 1
+
+    def cancelTimer(self, timerId):
+        pass
+
+    def registerEvent(self, type_, handler):
+        self.handlerDict.setdefault(type_, []).append(handler)
+
+    def putEvent(self, event):
+        for handler in self.handlerDict.get(event.type_, []):
+            handler(event)
+
+
+class TestCompactClass(unittest.TestCase):
+    def test_dictCompatible(self):
+        for name in ('TickData', 'BarData', 'OrderData', 'TradeData'):
+            compact = globals()[name]()
+            legacy = getattr(base_class, name)()
+            self.assertEqual(compact.__dict__, legacy.__dict__)
+            self.assertFalse(hasattr(compact, '__weakref__'))
+
+        # 从数据库载入: 多余的键被忽略
+        tick = TickData()
+        tick.__dict__ = {'_id': 'x', 'vtSymbol': 'rb1910', 'bidPrice3': 3498.0,
+                         'askVolume5': 7, 'datetime': datetime(2019, 6, 3, 9)}
+        self.assertEqual(tick.vtSymbol, 'rb1910')
+        self.assertEqual(tick.bidPrice3, 3498.0)
+        self.assertEqual(tick.depthVolumes[9], 7)
+        self.assertEqual(vars(tick)['askVolume5'], 7)
+
+    def test_copy(self):
+        tick = TickData()
+        tick.vtSymbol = 'rb1910'
+        tick.bidPrice1 = 3500.0
+        tick.bidVolume1 = 3
+
+        newTick = copy(tick)
+        tick.bidPrice1 = 3501.0
+        tick.bidVolume1 = 4
+        self.assertEqual((newTick.vtSymbol, newTick.bidPrice1, newTick.bidVolume1),
+                         ('rb1910', 3500.0, 3))
+
+        loaded = pickle.loads(pickle.dumps(newTick))
+        self.assertEqual(loaded.__dict__, newTick.__dict__)
+
+        order = OrderData()
+        order.vtOrderID = 'CTP.1'
+        self.assertEqual(copy(order).vtOrderID, 'CTP.1')
+        with self.assertRaises(AttributeError):
+            order.unknownField = 1
+
+    def test_lazyTimestamp(self):
+        dt = datetime(2019, 6, 3, 9, 0, 1, 500000)
+        ns = base_class.datetimeToNs(dt)
+        for cls in (TickData, base_class.TickData):
+            tick = cls()
+            self.assertIsNone(tick.datetime)
+            self.assertEqual(tick.date, '')
+
+            tick = cls()
+            tick.setTimestampNs(ns)
+            self.assertEqual((tick.datetime, tick.date, tick.time),
+                             (dt, '20190603', '09:00:01.500000'))
+            tick.setTimestampNs(ns + 1000000000)
+            self.assertEqual(tick.time, '09:00:02.500000')
+
+            # 只推送日期时间字符串的 gateway
+            tick = cls()
+            tick.date = '20190603'
+            tick.time = '09:00:01.5'
+            self.assertEqual(tick.datetime, dt)
+
+    def test_assignDatetime(self):
+        dt = datetime(2019, 6, 3, 9, 0, 1, 500000)
+        ns = base_class.datetimeToNs(dt)
+        for cls in (TickData, base_class.TickData):
+            # 直接赋值等同于 setDatetime
+            tick = cls()
+            self.assertEqual(tick.time, '')
+            tick.datetime = dt
+            self.assertEqual((tick.timestampNs, tick.date, tick.time),
+                             (ns, '20190603', '09:00:01.500000'))
+            tick.datetime = dt.replace(second=2)
+            self.assertEqual((tick.timestampNs, tick.time), (ns + 1000000000, '09:00:02.500000'))
+            tick.datetime = None
+            self.assertEqual((tick.timestampNs, tick.date), (0, ''))
+
+            # 先写 date/time 字符串的 gateway, 字符串保持不变
+            tick = cls()
+            tick.date = '20190603'
+            tick.time = '09:00:01.5'
+            tick.datetime = dt
+            self.assertEqual((tick.timestampNs, tick.time), (ns, '09:00:01.5'))
+
+            # 从数据库载入不更新时间戳
+            tick = cls.fromDict({'datetime': dt, 'time': '09:00:01', 'timestampNs': 1})
+            self.assertEqual((tick.timestampNs, tick.datetime, tick.time), (1, dt, '09:00:01'))
+
+    def test_persistDict(self):
+        dt = datetime(2019, 6, 3, 9, 1)
+        for cls in (BarData, base_class.BarData):
+            bar = cls()
+            bar.vtSymbol = 'rb1910'
+            bar.setDatetime(dt)
+
+            # 写入数据库的字段包含 datetime/date/time
+            d = bar.toDict()
+            self.assertEqual((d['datetime'], d['date'], d['time']),
+                             (dt, '20190603', '09:01:00.000000'))
+            self.assertNotIn('_log', d)
+
+            # 原有数据库中的数据没有 timestampNs, 载入时由 datetime 计算
+            del d['timestampNs']
+            bar = cls.fromDict(d)
+            self.assertEqual(bar.timestampNs, base_class.datetimeToNs(dt))
+            self.assertEqual(bar.vtSymbol, 'rb1910')
+
+
+    def test_gatewayRoundTrip(self):
+        folder = tempfile.mkdtemp()
+
+        class TempDataEngine(DataEngine):
+            contractCachePath = os.path.join(folder, 'ContractCache.db')
+
+        me = EventRecorder()
+        engine = TempDataEngine(me)
+        gateway = BaseGateway(me, 'CTP')
+        try:
+            tick = TickData.createFromGateway(gateway, 'rb1910', 'SHFE', 3500.0, 10, 3510.0, 3490.0)
+            self.assertIs(type(tick), TickData)
+            self.assertGreater(tick.timestampNs, 0)
+            gateway.onTick(tick)
+            self.assertIs(engine.getTick('rb1910.SHFE'), tick)
+
+            order = OrderData.createFromGateway(gateway, '1', 'rb1910', 'SHFE', 3500.0, 2,
+                                                C_DIRECTION.DIRECTION_LONG, C_OFFSET.OFFSET_OPEN)
+            self.assertIs(type(order), OrderData)
+            gateway.onOrder(order)
+            self.assertIs(engine.getOrder('CTP.1'), order)
+
+            trade = TradeData.createFromOrderData(order, 'T1', 3500.0, 2)
+            self.assertIs(type(trade), TradeData)
+            self.assertEqual((trade.vtOrderID, trade.vtSymbol), ('CTP.1', 'rb1910.SHFE'))
+            gateway.onTrade(trade)
+            detail = engine.getPositionDetail('rb1910.SHFE')
+            self.assertEqual(detail.longPos, 2)
+
+            order.status = OSTA.STATUS_ALLTRADED
+            gateway.onOrder(order)
+            self.assertEqual(engine.getOrder('CTP.1').status, OSTA.STATUS_ALLTRADED)
+        finally:
+            engine.close()
+            shutil.rmtree(folder)
+
+
+if __name__ == '__main__':
+    unittest.main()
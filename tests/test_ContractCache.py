@@ -0,0 +1,58 @@
+import unittest
+import os
+import shutil
+import tempfile
+
+from vnpy.base_class import ContractData
+from vnpy.utility.contractCache import ContractCache
+
+
+def makeContract(symbol, exchange, gatewayName='CTP'):
+    contract = ContractData()
+    contract.gatewayName = gatewayName
+    contract.symbol = symbol
+    contract.exchange = exchange
+    contract.vtSymbol = symbol + '.' + exchange
+    contract.size = 10
+    contract.priceTick = 1.0
+    return contract
+
+
+class TestContractCache(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, 'ContractCache.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_upsert(self):
+        cache = ContractCache(self.path)
+        rb = makeContract('rb1910', 'SHFE')
+        rb.rawData = object()
+        rb.marginRatio = 0.1        # 接口动态添加的字段
+        self.assertEqual(cache.upsert([rb, makeContract('IF1906', 'CFFEX')], '20190603'), 2)
+        self.assertEqual(cache.getVersion('CTP'), ('20190603', 1))
+
+        rb.priceTick = 2.0
+        cache.upsert([rb, makeContract('btcusdt', 'HUOBI', 'HUOBI')], '20190604')
+        self.assertEqual(cache.getVersion('CTP'), ('20190604', 2))
+        self.assertEqual(cache.getVersion('HUOBI'), ('20190604', 1))
+        self.assertEqual(cache.getVersion('BITMEX'), ('', 0))
+        cache.close()
+
+        # 重新打开后按需读取
+        cache = ContractCache(self.path)
+        self.assertEqual(len(cache), 3)
+        contract = cache.get('rb1910.SHFE')
+        self.assertEqual((contract.symbol, contract.size, contract.priceTick, contract.marginRatio),
+                         ('rb1910', 10, 2.0, 0.1))
+        self.assertIsNone(contract.rawData)
+        self.assertEqual(cache.get('IF1906').vtSymbol, 'IF1906.CFFEX')
+        self.assertIsNone(cache.get('unknown'))
+        self.assertEqual([c.vtSymbol for c in cache.getAll('HUOBI')], ['btcusdt.HUOBI'])
+        cache.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
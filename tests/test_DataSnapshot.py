@@ -0,0 +1,111 @@
+import unittest
+import os
+import shutil
+import tempfile
+
+from vnpy.vtConstant import C_EVENT
+from vnpy.vtConstant import C_ORDER_STATUS as OSTA
+from vnpy.base_class import Event, TickData, OrderData, AccountData
+from vnpy.vtEngine import DataEngine
+
+
+class EventRecorder(object):
+    """只记录注册的处理函数和计时器, 代替 MainEngine"""
+    def __init__(self):
+        self.handlerDict = {}
+        self.timerDict = {}
+
+    def scheduleTimer(self, delay, handler, interval=None):
+        timerId = len(self.timerDict) + 1
+        self.timerDict[timerId] = (delay, handler, interval)
+        return timerId
+
+    def cancelTimer(self, timerId):
+        self.timerDict.pop(timerId, None)
+
+    def fireTimers(self):
+        for delay, handler, interval in list(self.timerDict.values()):
+            handler(Event(type_=C_EVENT.EVENT_TIMER_EXPIRED))
+
+    def registerEvent(self, type_, handler):
+        self.handlerDict.setdefault(type_, []).append(handler)
+
+    def put(self, type_, data=None):
+        event = Event(type_=type_)
+        event.dict_['data'] = data
+        for handler in self.handlerDict.get(type_, []):
+            handler(event)
+
+
+class TestDataSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+        class TempDataEngine(DataEngine):
+            contractCachePath = os.path.join(self.folder, 'ContractCache.db')
+
+        self.me = EventRecorder()
+        self.engine = TempDataEngine(self.me)
+
+    def tearDown(self):
+        self.engine.close()
+        shutil.rmtree(self.folder)
+
+    def test_copyOnWrite(self):
+        me, engine = self.me, self.engine
+        empty = engine.getSnapshot()
+        self.assertEqual((empty.version, len(empty.ticks)), (0, 0))
+
+        tick = TickData()
+        tick.vtSymbol = 'rb1910.SHFE'
+        me.put(C_EVENT.EVENT_TICK, tick)
+        account = AccountData()
+        account.vtAccountID = 'CTP.001'
+        me.put(C_EVENT.EVENT_ACCOUNT, account)
+
+        # 由 snapshotInterval 秒的周期计时器发布
+        interval = engine.snapshotInterval
+        self.assertEqual(list(me.timerDict.values())[0][::2], (interval, interval))
+        self.assertIs(engine.getSnapshot(), empty)
+        me.fireTimers()
+        first = engine.getSnapshot()
+        self.assertEqual(first.version, 1)
+        self.assertIs(first.ticks['rb1910.SHFE'], tick)
+        with self.assertRaises(TypeError):
+            first.ticks['x'] = tick
+
+        # 只有委托变化时, 其余部分沿用上一个快照
+        order = OrderData()
+        order.vtOrderID = 'CTP.1'
+        order.vtSymbol = 'rb1910.SHFE'
+        order.status = OSTA.STATUS_NOTTRADED
+        me.put(C_EVENT.EVENT_ORDER, order)
+        second = engine.publishSnapshot()
+        self.assertEqual(second.version, 2)
+        self.assertIs(second.ticks, first.ticks)
+        self.assertIs(second.accounts, first.accounts)
+        self.assertEqual(list(second.workingOrders), ['CTP.1'])
+        self.assertEqual(len(first.workingOrders), 0)
+
+        # 没有变化时不发布新版本
+        self.assertIs(engine.publishSnapshot(), second)
+
+        # 新行情只更新对应的合约, 之前的快照不变
+        other = TickData()
+        other.vtSymbol = 'hc1910.SHFE'
+        me.put(C_EVENT.EVENT_TICK, other)
+        newer = TickData()
+        newer.vtSymbol = 'rb1910.SHFE'
+        me.put(C_EVENT.EVENT_TICK, newer)
+        third = engine.publishSnapshot()
+        self.assertEqual(dict(third.ticks), {'rb1910.SHFE': newer, 'hc1910.SHFE': other})
+        self.assertEqual(dict(first.ticks), {'rb1910.SHFE': tick})
+        self.assertIs(third.workingOrders, second.workingOrders)
+
+        # 关闭时撤销计时器
+        engine.close()
+        self.assertEqual(me.timerDict, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
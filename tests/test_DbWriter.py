@@ -0,0 +1,119 @@
+import unittest
+import threading
+
+from vnpy.utility.dbWriter import WriteBehindWriter
+
+
+class FakeBackend(object):
+    """记录批量写入调用的存储后端"""
+
+    def __init__(self):
+        self.docs = {}
+        self.replaced = {}
+        self.calls = []
+        self.gate = None
+
+    def insertMany(self, dbName, collectionName, docs):
+        if self.gate is not None:
+            self.gate.wait()
+        self.calls.append(('insertMany', collectionName, len(docs)))
+        self.docs.setdefault(collectionName, []).extend(docs)
+        return 0
+
+    def replaceMany(self, dbName, collectionName, requests):
+        self.calls.append(('replaceMany', collectionName, len(requests)))
+        for flt, d, upsert in requests:
+            self.replaced[flt['name']] = d
+        return 0
+
+
+class TestWriteBehindWriter(unittest.TestCase):
+    def test_batchAndCoalesce(self):
+        backend = FakeBackend()
+        writer = WriteBehindWriter(backend, batchSize=100, flushInterval=60)
+        d = {'price': 0}
+        for i in range(250):
+            d['price'] = i
+            writer.insert('db', 'tick', d)
+        for i in range(10):
+            writer.replace('db', 'sync', {'name': 'atr', 'pos': i}, {'name': 'atr'}, True)
+        writer.replace('db', 'sync', {'name': 'ma', 'pos': 1}, {'name': 'ma'}, True)
+        writer.close()
+
+        self.assertEqual([d['price'] for d in backend.docs['tick']], list(range(250)))
+        inserts = [n for method, _, n in backend.calls if method == 'insertMany']
+        self.assertTrue(all([n <= 100 for n in inserts]))
+
+        self.assertEqual(backend.calls[-1], ('replaceMany', 'sync', 2))
+        self.assertEqual(backend.replaced['atr']['pos'], 9)
+
+        stats = writer.getStats()
+        self.assertEqual((stats['inserted'], stats['replaced'], stats['pending']), (250, 2, 0))
+
+    def test_orderAndFlushCollection(self):
+        backend = FakeBackend()
+        writer = WriteBehindWriter(backend, batchSize=100, flushInterval=60)
+        writer.insert('db', 'sync', {'name': 'a'})
+        writer.replace('db', 'sync', {'name': 'atr', 'pos': 1}, {'name': 'atr'}, True)
+        writer.insert('db', 'sync', {'name': 'b'})
+        writer.replace('db', 'sync', {'name': 'atr', 'pos': 2}, {'name': 'atr'}, True)
+        writer.insert('db', 'tick', {'i': 1})
+        writer.replace('db', 'sync', {'name': 'ma', 'pos': 1}, {'name': 'ma'}, True)
+        writer.insert('db', 'sync', {'name': 'c'})
+
+        # 只写入指定集合, 插入和替换按调用的先后写入, 旧的替换被合并
+        writer.flush('db', 'sync')
+        self.assertEqual(backend.calls, [('insertMany', 'sync', 2), ('replaceMany', 'sync', 2),
+                                         ('insertMany', 'sync', 1)])
+        self.assertEqual([d['name'] for d in backend.docs['sync']], ['a', 'b', 'c'])
+        self.assertEqual(backend.replaced['atr']['pos'], 2)
+        self.assertEqual(writer.getStats()['pending'], 1)
+
+        writer.close()
+        self.assertEqual(backend.calls[-1], ('insertMany', 'tick', 1))
+
+    def test_backpressure(self):
+        gate = threading.Event()
+        backend = FakeBackend()
+        backend.gate = gate
+        writer = WriteBehindWriter(backend, batchSize=5, flushInterval=0.01, maxPending=10)
+
+        def produce():
+            for i in range(30):
+                writer.insert('db', 'tick', {'i': i})
+
+        producer = threading.Thread(target=produce)
+        producer.start()
+        producer.join(0.3)
+        # 写入被阻塞时缓冲不超过上限, 写入方等待
+        self.assertTrue(producer.is_alive())
+        self.assertLessEqual(writer.getStats()['maxPendingSeen'], 10)
+
+        gate.set()
+        producer.join(5)
+        self.assertFalse(producer.is_alive())
+        writer.flush()
+        self.assertEqual([d['i'] for d in backend.docs['tick']], list(range(30)))
+        self.assertGreater(writer.getStats()['blocked'], 0)
+        writer.close()
+
+    def test_writeError(self):
+        class FailBackend(FakeBackend):
+            def insertMany(self, dbName, collectionName, docs):
+                return 1
+
+            def replaceMany(self, dbName, collectionName, requests):
+                raise IOError('connection lost')
+
+        writer = WriteBehindWriter(FailBackend(), flushInterval=60)
+        writer.insert('db', 'tick', {'i': 1})
+        writer.insert('db', 'tick', {'i': 2})
+        writer.replace('db', 'sync', {'pos': 1}, {'name': 'atr'})
+        writer.flush()
+        stats = writer.getStats()
+        self.assertEqual((stats['errors'], stats['pending']), (2, 0))
+        writer.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,9 +3,29 @@ import unittest
 import sys
 from time import sleep
 from datetime import datetime
+from threading import Thread, current_thread, Event as ThreadEvent
 
-from vnpy.vtConstant import C_EVENT
-from vnpy.utility.eventEngine import EventEngine2
+from vnpy.vtConstant import C_EVENT, C_OVERLOAD
+from vnpy.base_class import Event, TickData
+from vnpy.utility.eventEngine import EventEngine2, conflationKey, DEFAULT_OVERLOAD_POLICIES
+from vnpy.utility.eventQueue import IngressRingQueue, PriorityRingQueue, BoundedEventQueue
+
+
+def makeTickEvent(vtSymbol, seq):
+    tick = TickData()
+    tick.vtSymbol = vtSymbol
+    tick.volume = seq
+    event = Event(type_=C_EVENT.EVENT_TICK)
+    event.dict_['data'] = tick
+    return event
+
+
+def waitUntil(condition, timeout=5):
+    for _ in range(int(timeout / 0.01)):
+        if condition():
+            return True
+        sleep(0.01)
+    return condition()
 
 
 class TestEventEngine(unittest.TestCase):
@@ -42,6 +62,403 @@ class TestEventEngine(unittest.TestCase):
 
         ee.stop()
 
+    def test_shardedOrdering(self):
+        ee = EventEngine2(workerCount=4)
+        symbols = ['rb{n}'.format(n=n) for n in range(1900, 1920)]
+        received = {s: [] for s in symbols}
+        threadNames = {s: set() for s in symbols}
+
+        def onTick(event):
+            tick = event.dict_['data']
+            received[tick.vtSymbol].append(tick.volume)
+            threadNames[tick.vtSymbol].add(current_thread().name)
+
+        ee.registerEvent(C_EVENT.EVENT_TICK, onTick)
+        ee.start(timer=False)
+        count = 200
+        for seq in range(count):
+            for s in symbols:
+                ee.putEvent(makeTickEvent(s, seq))
+
+        self.assertTrue(waitUntil(
+            lambda: all(len(l) == count for l in received.values())))
+        ee.stop()
+
+        # 同一合约的事件由同一线程按顺序处理
+        for s in symbols:
+            self.assertEqual(received[s], list(range(count)))
+            self.assertEqual(len(threadNames[s]), 1)
+
+        # 不同合约分布到多个线程
+        allThreads = set.union(*threadNames.values())
+        self.assertGreater(len(allThreads), 1)
+
+    def test_stats(self):
+        ee = EventEngine2(stats=True, handlerBudget=0.005)
+        alerts = []
+
+        def onTick(event):
+            pass
+
+        def onSlowTick(event):
+            sleep(0.02)
+
+        ee.registerEvent(C_EVENT.EVENT_TICK, onTick)
+        ee.registerEvent(C_EVENT.EVENT_TICK, onSlowTick)
+        ee.registerEvent(C_EVENT.EVENT_SLOW_HANDLER, alerts.append)
+        ee.start(timer=False)
+        for seq in range(5):
+            ee.putEvent(makeTickEvent('rb1910', seq))
+
+        self.assertTrue(waitUntil(lambda: alerts))
+        stats = ee.getStats()
+        ee.stop()
+
+        self.assertEqual(stats['queueLatency'][C_EVENT.EVENT_TICK]['count'], 5)
+        handlerLatency = stats['handlerLatency']
+        fastName = [k for k in handlerLatency if k.endswith('.onTick')][0]
+        slowName = [k for k in handlerLatency if k.endswith('.onSlowTick')][0]
+        self.assertEqual(handlerLatency[fastName]['count'], 5)
+        self.assertGreaterEqual(handlerLatency[slowName]['max'], 0.02)
+        self.assertEqual(stats['slowHandlerCount'], {slowName: 5})
+        self.assertEqual(alerts[0].dict_['data']['handler'], slowName)
+        self.assertTrue(stats['queueDepth'][0])
+
+    def test_statsDisabled(self):
+        ee = EventEngine2()
+        self.assertIsNone(ee.getStats())
+
+    def test_keyedTopic(self):
+        ee = EventEngine2()
+        generic, keyed, other = [], [], []
+        ee.registerEvent(C_EVENT.EVENT_TICK, generic.append)
+        ee.registerEvent(C_EVENT.EVENT_TICK + 'rb1910', keyed.append)
+        ee.registerEvent(C_EVENT.EVENT_TICK + 'rb2001', other.append)
+        ee.start(timer=False)
+
+        event = makeTickEvent('rb1910', 0)
+        event.key = 'rb1910'
+        ee.putEvent(event)
+
+        # 旧式拼接类型的事件仍只分发给该类型的监听函数
+        legacy = Event(type_=C_EVENT.EVENT_TICK + 'rb1910')
+        ee.putEvent(legacy)
+
+        self.assertTrue(waitUntil(lambda: len(keyed) == 2))
+        self.assertEqual(generic, [event])
+        self.assertEqual(keyed, [event, legacy])
+
+        ee.unregisterEvent(C_EVENT.EVENT_TICK + 'rb1910', keyed.append)
+        ee.putEvent(event)
+        self.assertTrue(waitUntil(lambda: len(generic) == 2))
+        ee.stop()
+
+        self.assertEqual(len(keyed), 2)
+        self.assertEqual(other, [])
+
+    def test_conflation(self):
+        ee = EventEngine2()
+        gate = ThreadEvent()
+        lossless, conflated = [], []
+
+        def onSlowTick(event):
+            gate.wait(5)
+            conflated.append(event.dict_['data'])
+
+        ee.registerEvent(C_EVENT.EVENT_TICK, lossless.append)
+        ee.registerConflatedEvent(C_EVENT.EVENT_TICK, onSlowTick)
+        ee.start(timer=False)
+
+        # 第一条行情阻塞在慢速订阅者中, 之后的行情在其待推送队列中合并
+        ee.putEvent(makeTickEvent('rb1910', 0))
+        self.assertTrue(waitUntil(lambda: len(lossless) == 1))
+        sleep(0.1)
+        for seq in range(1, 11):
+            ee.putEvent(makeTickEvent('rb1910', seq))
+            ee.putEvent(makeTickEvent('rb2001', seq))
+        self.assertTrue(waitUntil(lambda: len(lossless) == 21))
+        gate.set()
+
+        self.assertTrue(waitUntil(lambda: len(conflated) == 3))
+        sleep(0.1)
+        stats = ee.getConflationStats()
+        ee.stop()
+
+        self.assertEqual([(t.vtSymbol, t.volume) for t in conflated],
+                         [('rb1910', 0), ('rb1910', 10), ('rb2001', 10)])
+        self.assertEqual(len(stats), 1)
+        self.assertEqual(stats[0]['received'], 21)
+        self.assertEqual(stats[0]['delivered'], 3)
+        self.assertEqual(stats[0]['dropped'], 18)
+
+    def test_handlerError(self):
+        ee = EventEngine2()
+        received, conflated = [], []
+
+        def onBadTick(event):
+            raise ValueError('bad tick')
+
+        def onConflatedTick(event):
+            conflated.append(event.dict_['data'].volume)
+            if len(conflated) == 1:
+                raise ValueError('bad tick')
+
+        ee.registerEvent(C_EVENT.EVENT_TICK, onBadTick)
+        ee.registerEvent(C_EVENT.EVENT_TICK, received.append)
+        ee.registerConflatedEvent(C_EVENT.EVENT_TICK, onConflatedTick)
+        ee.start(timer=False)
+
+        # 出错的处理函数不影响同一事件的其他处理函数, 也不影响后续事件
+        ee.putEvent(makeTickEvent('rb1910', 1))
+        self.assertTrue(waitUntil(lambda: len(conflated) == 1))
+        ee.putEvent(makeTickEvent('rb1910', 2))
+        self.assertTrue(waitUntil(lambda: len(conflated) == 2))
+        ee.stop()
+
+        self.assertEqual(len(received), 2)
+        self.assertEqual(conflated, [1, 2])
+
+    def test_scheduleTimer(self):
+        ee = EventEngine2()
+        oneShot, periodic = [], []
+
+        ee.start(timer=False)
+        ee.scheduleTimer(0.05, lambda event: oneShot.append(current_thread().name))
+        timerId = ee.scheduleTimer(0.02, periodic.append, interval=0.02)
+        cancelled = ee.scheduleTimer(0.05, oneShot.append)
+        self.assertTrue(ee.cancelTimer(cancelled))
+
+        self.assertTrue(waitUntil(lambda: len(periodic) >= 5))
+        ee.cancelTimer(timerId)
+        sleep(0.1)
+        count = len(periodic)
+        sleep(0.1)
+        ee.stop()
+
+        # 计时器函数在事件处理线程中调用
+        self.assertEqual(oneShot, ['EventEngine2-0'])
+        self.assertEqual(len(periodic), count)
+        self.assertEqual(periodic[0].dict_['data'].timerId, timerId)
+
+    def test_priorityLanes(self):
+        ee = EventEngine2(stats=True, priorityClasses=True)
+        gate = ThreadEvent()
+        processed = []
+
+        def onTick(event):
+            if event.dict_['data'].volume == 0:
+                gate.wait(5)
+            processed.append(('tick', event.dict_['data'].volume))
+
+        def onOrder(event):
+            processed.append(('order', event.key))
+
+        ee.registerEvent(C_EVENT.EVENT_TICK, onTick)
+        ee.registerEvent(C_EVENT.EVENT_ORDER, onOrder)
+        ee.start(timer=False)
+
+        # 第一条行情阻塞处理线程, 期间积压的委托回报应先于后续行情处理
+        ee.putEvent(makeTickEvent('rb1910', 0))
+        sleep(0.1)
+        for seq in range(1, 51):
+            ee.putEvent(makeTickEvent('rb1910', seq))
+        ee.putEvent(Event(type_=C_EVENT.EVENT_ORDER, key='CTP.1'))
+        gate.set()
+
+        self.assertTrue(waitUntil(lambda: len(processed) == 52))
+        stats = ee.getStats()
+        ee.stop()
+
+        self.assertEqual(processed[:2], [('tick', 0), ('order', 'CTP.1')])
+        self.assertEqual(processed[2:], [('tick', seq) for seq in range(1, 51)])
+        self.assertEqual(stats['laneLatency']['tick']['count'], 51)
+        self.assertEqual(stats['laneLatency']['order']['count'], 1)
+
+    def test_ringReclaim(self):
+        queue = IngressRingQueue()
+
+        def produce(n):
+            queue.put(n)
+
+        for n in range(3):
+            thread = Thread(target=produce, args=(n,))
+            thread.start()
+            thread.join()
+        self.assertEqual(queue.ringCount(), 3)
+
+        # 已退出线程的 ring 中还有事件时不回收
+        queue.put(3)
+        self.assertEqual(queue.ringCount(), 4)
+        events = []
+        queue.drain(events.append, 10)
+        self.assertEqual(sorted(events), [0, 1, 2, 3])
+
+        # 新生产者加入时回收已退出线程的空 ring
+        thread = Thread(target=produce, args=(4,))
+        thread.start()
+        thread.join()
+        self.assertEqual(queue.ringCount(), 2)
+        queue.drain(events.append, 10)
+        self.assertEqual(events[-1], 4)
+
+    def test_priorityNoStarvation(self):
+        queue = PriorityRingQueue([8, 2])
+        for n in range(100):
+            queue.put(('high', n), 0)
+            queue.put(('low', n), 1)
+
+        processed = []
+        queue.drain(processed.append, 8)
+        self.assertEqual(processed, [('high', n) for n in range(8)] +
+                                    [('low', n) for n in range(2)])
+        self.assertEqual(queue.qsize(), 190)
+
+    def test_overloadPolicies(self):
+        queue = BoundedEventQueue(4, {C_EVENT.EVENT_TICK: C_OVERLOAD.OVERLOAD_CONFLATE,
+                                      C_EVENT.EVENT_TIMER: C_OVERLOAD.OVERLOAD_DROP_OLDEST,
+                                      C_EVENT.EVENT_ERROR: C_OVERLOAD.OVERLOAD_REJECT},
+                                  keyFunc=conflationKey)
+        timer = Event(type_=C_EVENT.EVENT_TIMER)
+        timer.dict_['data'] = 0
+        queue.put(timer)
+        queue.put(makeTickEvent('rb1910', 1))
+        queue.put(makeTickEvent('rb2001', 1))
+        queue.put(Event(type_=C_EVENT.EVENT_ORDER, key='CTP.1'))
+
+        # 队列已满: 行情按合约合并, 计时器丢弃最早的一条, 日志直接拒绝
+        self.assertTrue(queue.put(makeTickEvent('rb1910', 2)))
+        timer = Event(type_=C_EVENT.EVENT_TIMER)
+        timer.dict_['data'] = 1
+        self.assertTrue(queue.put(timer))
+        self.assertFalse(queue.put(Event(type_=C_EVENT.EVENT_ERROR)))
+        self.assertEqual(queue.qsize(), 4)
+
+        processed = []
+        queue.drain(processed.append, 10)
+        self.assertEqual([(e.type_, e.dict_['data'] if e.type_ == C_EVENT.EVENT_TIMER
+                           else getattr(e.dict_.get('data'), 'volume', e.key))
+                          for e in processed],
+                         [(C_EVENT.EVENT_TICK, 2), (C_EVENT.EVENT_TICK, 1),
+                          (C_EVENT.EVENT_ORDER, 'CTP.1'), (C_EVENT.EVENT_TIMER, 1)])
+
+        stats = queue.getStats()
+        self.assertEqual(stats['conflated'], {C_EVENT.EVENT_TICK: 1})
+        self.assertEqual(stats['dropped'], {C_EVENT.EVENT_TIMER: 1})
+        self.assertEqual(stats['rejected'], {C_EVENT.EVENT_ERROR: 1})
+
+    def test_overloadBound(self):
+        queue = BoundedEventQueue(10, DEFAULT_OVERLOAD_POLICIES, keyFunc=conflationKey)
+        for n in range(1000):
+            self.assertTrue(queue.put(makeTickEvent('rb%d' % n, n)))
+
+        # 没有可合并的行情时丢弃最早的行情, 积压不超过容量
+        self.assertEqual(queue.qsize(), 10)
+        self.assertEqual(queue.getStats()['dropped'], {C_EVENT.EVENT_TICK: 990})
+
+        # 到期计时器不阻塞: 同一计时器合并, 队列中没有同类型事件时拒绝
+        handle = object()
+        expired = Event(type_=C_EVENT.EVENT_TIMER_EXPIRED)
+        expired.dict_['data'] = handle
+        self.assertFalse(queue.put(expired))
+
+        processed = []
+        queue.drain(processed.append, 1)
+        self.assertTrue(queue.put(expired))
+        self.assertTrue(queue.put(expired))
+        self.assertEqual(queue.getStats()['conflated'], {C_EVENT.EVENT_TIMER_EXPIRED: 1})
+
+        queue.drain(processed.append, 20)
+        self.assertEqual([e.dict_['data'].volume for e in processed[:10]], list(range(990, 1000)))
+        self.assertIs(processed[-1], expired)
+        self.assertEqual(queue.qsize(), 0)
+
+    def test_overloadBlock(self):
+        queue = BoundedEventQueue(2)
+        queue.put(Event(type_=C_EVENT.EVENT_ORDER))
+        queue.put(Event(type_=C_EVENT.EVENT_ORDER))
+
+        # 队列满时生产线程阻塞, 处理线程取出事件后放行
+        producer = Thread(target=queue.put, args=(Event(type_=C_EVENT.EVENT_TRADE),))
+        producer.start()
+        sleep(0.1)
+        self.assertTrue(producer.is_alive())
+
+        processed = []
+        queue.drain(processed.append, 1)
+        producer.join(2)
+        self.assertFalse(producer.is_alive())
+        queue.drain(processed.append, 10)
+        self.assertEqual([e.type_ for e in processed],
+                         [C_EVENT.EVENT_ORDER, C_EVENT.EVENT_ORDER, C_EVENT.EVENT_TRADE])
+        self.assertEqual(queue.getStats()['blocked'], {C_EVENT.EVENT_TRADE: 1})
+
+    def test_overloadAlarm(self):
+        ee = EventEngine2(maxQueueSize=10, highWatermark=5, lowWatermark=2)
+        gate = ThreadEvent()
+        alarms = []
+
+        def onOrder(event):
+            gate.wait(5)
+
+        ee.registerEvent(C_EVENT.EVENT_ORDER, onOrder)
+        ee.registerEvent(C_EVENT.EVENT_QUEUE_ALARM,
+                         lambda event: alarms.append(event.dict_['data']['level']))
+        ee.start(timer=False)
+
+        ee.putEvent(Event(type_=C_EVENT.EVENT_ORDER))
+        sleep(0.1)
+        for _ in range(6):
+            ee.putEvent(Event(type_=C_EVENT.EVENT_ORDER))
+        gate.set()
+
+        self.assertTrue(waitUntil(lambda: alarms == ['high', 'low']))
+        self.assertEqual(ee.getOverloadStats()['maxSize'], 10)
+        ee.stop()
+
+        with self.assertRaises(ValueError):
+            EventEngine2(maxQueueSize=10, priorityClasses=True)
+
+    def test_derivedEvent(self):
+        ee = EventEngine2()
+        processed = []
+        depths = []
+
+        def onTick(event):
+            processed.append(('tick', event.dict_['data'].volume))
+            spread = Event(type_='eSpread')
+            spread.dict_['data'] = event.dict_['data'].volume
+            ee.putDerivedEvent(spread)
+
+        def onSpread(event):
+            processed.append(('spread', event.dict_['data']))
+
+        # 不断派生自身的事件: 超过嵌套上限后改为排队, 不会无限递归
+        def onChain(event):
+            depths.append(event.dict_['data'])
+            if event.dict_['data'] < 20:
+                chained = Event(type_='eChain')
+                chained.dict_['data'] = event.dict_['data'] + 1
+                ee.putDerivedEvent(chained)
+
+        ee.registerEvent(C_EVENT.EVENT_TICK, onTick)
+        ee.registerEvent('eSpread', onSpread)
+        ee.registerEvent('eChain', onChain)
+        ee.start(timer=False)
+
+        for seq in range(3):
+            ee.putEvent(makeTickEvent('rb1910', seq))
+        chain = Event(type_='eChain')
+        chain.dict_['data'] = 0
+        ee.putEvent(chain)
+
+        self.assertTrue(waitUntil(lambda: len(processed) == 6 and len(depths) == 21))
+        ee.stop()
+
+        # 派生事件紧跟在产生它的行情之后处理
+        self.assertEqual(processed, [('tick', 0), ('spread', 0), ('tick', 1),
+                                     ('spread', 1), ('tick', 2), ('spread', 2)])
+        self.assertEqual(depths, list(range(21)))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,132 @@
+import unittest
+import os
+import shutil
+import tempfile
+from time import sleep, perf_counter
+from datetime import datetime
+
+from vnpy.vtConstant import C_EVENT
+from vnpy.base_class import Event, TickData, OrderData
+from vnpy.utility.eventEngine import EventEngine2
+from vnpy.utility.eventJournal import (EventJournal, JournalReplayer, readJournal,
+                                       sessionName)
+
+
+def waitUntil(condition, timeout=5):
+    for _ in range(int(timeout / 0.01)):
+        if condition():
+            return True
+        sleep(0.01)
+    return condition()
+
+
+def makeTickEvent(vtSymbol, seq):
+    tick = TickData()
+    tick.vtSymbol = vtSymbol
+    tick.lastPrice = 3500.0 + seq
+    tick.volume = seq
+    tick.datetime = datetime(2019, 6, 3, 9, 0, 0, 500000)
+    tick.rawData = object()
+    event = Event(type_=C_EVENT.EVENT_TICK, key=vtSymbol)
+    event.dict_['data'] = tick
+    return event
+
+
+class TestEventJournal(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def writeJournal(self, gap=0):
+        ee = EventEngine2()
+        journal = EventJournal(self.folder, flushInterval=0.01)
+        journal.register(ee)
+        ee.start(timer=False)
+
+        ee.putEvent(makeTickEvent('rb1910', 1))
+        if gap:
+            sleep(gap)
+        order = OrderData()
+        order.vtOrderID = 'CTP.1'
+        order.totalVolume = 3
+        event = Event(type_=C_EVENT.EVENT_ORDER, key=order.vtOrderID)
+        event.dict_['data'] = order
+        ee.putEvent(event)
+        ee.putEvent(Event(type_=C_EVENT.EVENT_TIMER))
+        ee.putEvent(Event(type_='eNotJournaled'))
+
+        self.assertTrue(waitUntil(lambda: journal.recordCount == 3))
+        ee.stop()
+        journal.close()
+        return journal.path
+
+    def test_roundTrip(self):
+        path = self.writeJournal()
+        self.assertTrue(os.path.basename(path).startswith('journal_'))
+
+        frames = list(readJournal(path))
+        self.assertEqual(frames[0]['version'], 1)
+        events = [event for _, event in frames[1:]]
+        self.assertEqual([(e.type_, e.key) for e in events],
+                         [(C_EVENT.EVENT_TICK, 'rb1910'), (C_EVENT.EVENT_ORDER, 'CTP.1'),
+                          (C_EVENT.EVENT_TIMER, None)])
+
+        tick = events[0].dict_['data']
+        self.assertIsInstance(tick, TickData)
+        self.assertEqual(tick.lastPrice, 3501.0)
+        self.assertEqual(tick.datetime, datetime(2019, 6, 3, 9, 0, 0, 500000))
+        self.assertIsNone(tick.rawData)
+        self.assertEqual(events[1].dict_['data'].totalVolume, 3)
+
+        stamps = [ns for ns, _ in frames[1:]]
+        self.assertEqual(stamps, sorted(stamps))
+
+    def test_ingressTime(self):
+        ee = EventEngine2()
+        journal = EventJournal(self.folder, flushInterval=0.01)
+        journal.register(ee)
+        ee.registerEvent('eSlow', lambda event: sleep(0.3))
+        ee.start(timer=False)
+
+        # 处理积压时记录的仍是事件进入队列的时间间隔
+        ee.putEvent(Event(type_='eSlow'))
+        ee.putEvent(makeTickEvent('rb1910', 1))
+        sleep(0.1)
+        ee.putEvent(Event(type_=C_EVENT.EVENT_TIMER))
+
+        self.assertTrue(waitUntil(lambda: journal.recordCount == 2))
+        ee.stop()
+        journal.close()
+
+        stamps = [ns for ns, _ in list(readJournal(journal.path))[1:]]
+        self.assertGreaterEqual(stamps[1] - stamps[0], 0.09 * 1e9)
+
+    def test_replaySpeed(self):
+        path = self.writeJournal(gap=0.2)
+
+        replayed = []
+        ee = EventEngine2()
+        ee.registerGeneralHandler(lambda event: replayed.append(event.type_))
+        ee.start(timer=False)
+
+        start = perf_counter()
+        self.assertEqual(JournalReplayer(ee, speed=1.0).replay(path), 3)
+        self.assertGreaterEqual(perf_counter() - start, 0.19)
+
+        start = perf_counter()
+        JournalReplayer(ee, speed=None).replay([path])
+        self.assertLess(perf_counter() - start, 0.1)
+
+        self.assertTrue(waitUntil(lambda: len(replayed) == 6))
+        ee.stop()
+
+    def test_sessionName(self):
+        self.assertEqual(sessionName(datetime(2019, 10, 9, 9, 0)), '20191009-day')
+        self.assertEqual(sessionName(datetime(2019, 10, 9, 21, 0)), '20191009-night')
+        self.assertEqual(sessionName(datetime(2019, 10, 10, 1, 0)), '20191009-night')
+
+
+if __name__ == '__main__':
+    unittest.main()
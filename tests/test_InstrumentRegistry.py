@@ -0,0 +1,66 @@
+import unittest
+from copy import copy
+
+from vnpy import base_class, compact_class
+from vnpy.utility.instrumentRegistry import InstrumentRegistry, InstrumentTable, instrumentRegistry
+
+
+class TestInstrumentRegistry(unittest.TestCase):
+    def test_register(self):
+        registry = InstrumentRegistry()
+        self.assertEqual(registry.register('rb1910.SHFE'), 0)
+        self.assertEqual(registry.register('IF1906.CFFEX'), 1)
+        self.assertEqual(registry.register('rb1910.SHFE'), 0)
+        self.assertEqual(registry.getSymbol(1), 'IF1906.CFFEX')
+        self.assertIsNone(registry.getId('unknown'))
+        self.assertEqual(len(registry), 2)
+
+        table = InstrumentTable(registry)
+        table[1] = 'IF'
+        self.assertIsNone(table.get(0))
+        self.assertIsNone(table.get(None))
+        self.assertEqual(table.get(1), 'IF')
+        self.assertEqual(table.toDict(), {'IF1906.CFFEX': 'IF'})
+
+        # view 随表更新, 不能写入
+        view = table.view()
+        self.assertEqual(dict(view), {'IF1906.CFFEX': 'IF'})
+        self.assertNotIn('rb1910.SHFE', view)
+        self.assertNotIn('unknown', view)
+        table[0] = 'rb'
+        self.assertEqual(view['rb1910.SHFE'], 'rb')
+        self.assertEqual(len(view), 2)
+        self.assertRaises(KeyError, view.__getitem__, 'unknown')
+        with self.assertRaises(TypeError):
+            view['IF1906.CFFEX'] = 'x'
+        del table[0]
+        del table[1]
+        self.assertEqual(table.values(), [])
+
+        # 分配编号时已有的表同步扩展, 可以直接按下标读取
+        iid = registry.register('ag1912.SHFE')
+        self.assertIsNone(table.items[iid])
+        self.assertEqual(len(InstrumentTable(registry).items), 3)
+
+    def test_dataInstrumentId(self):
+        for module in (base_class, compact_class):
+            vtSymbol = 'ag1912.SHFE.' + module.__name__
+            # 行情只携带 gateway 写入的编号, 不为未注册的合约分配编号
+            tick = module.TickData()
+            tick.vtSymbol = vtSymbol
+            self.assertIsNone(tick.instrumentId)
+            self.assertNotIn(vtSymbol, instrumentRegistry)
+
+            order = module.OrderData()
+            order.vtSymbol = vtSymbol
+            iid = order.instrumentId
+            self.assertEqual(iid, instrumentRegistry.getId(vtSymbol))
+
+            tick.instrumentId = iid
+            self.assertEqual(copy(tick).instrumentId, iid)
+            self.assertNotIn('instrumentId', tick.toDict())
+            self.assertNotIn('instrumentId', order.toDict())
+
+
+if __name__ == '__main__':
+    unittest.main()
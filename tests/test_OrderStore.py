@@ -0,0 +1,123 @@
+import unittest
+import os
+import shutil
+import tempfile
+
+from vnpy.vtConstant import C_ORDER_STATUS as OSTA
+from vnpy.base_class import OrderData, TradeData
+from vnpy.utility.orderStore import OrderStore, TradeStore, WorkingOrderIndex
+
+
+def makeOrder(n, vtSymbol='rb1910.SHFE', status=OSTA.STATUS_NOTTRADED):
+    order = OrderData()
+    order.gatewayName = 'CTP'
+    order.vtOrderID = 'CTP.%d' % n
+    order.vtSymbol = vtSymbol
+    order.status = status
+    order.totalVolume = n
+    return order
+
+
+class TestOrderStore(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_index(self):
+        store = OrderStore()
+        store.setStrategyName('CTP.1', 'atr')
+        for n in range(4):
+            store.update(makeOrder(n, 'rb1910.SHFE' if n % 2 else 'IF1906.CFFEX'))
+        store.update(makeOrder(3, 'rb1910.SHFE', OSTA.STATUS_ALLTRADED))
+        # 委托推送先于发单记录到达时, 记录策略后重建索引
+        store.setStrategyName('CTP.2', 'atr')
+
+        self.assertEqual([o.vtOrderID for o in store.query(vtSymbol='rb1910.SHFE')],
+                         ['CTP.1', 'CTP.3'])
+        self.assertEqual([o.vtOrderID for o in store.query(vtSymbol='rb1910.SHFE',
+                                                           status=OSTA.STATUS_NOTTRADED)],
+                         ['CTP.1'])
+        self.assertEqual(sorted([o.vtOrderID for o in store.query(strategyName='atr')]),
+                         ['CTP.1', 'CTP.2'])
+        self.assertEqual(store.query(status=OSTA.STATUS_CANCELLED), [])
+        with self.assertRaises(ValueError):
+            store.query(price=1.0)
+
+    def test_spill(self):
+        path = os.path.join(self.folder, 'OrderStore.db')
+        store = OrderStore(maxFinished=10, path=path)
+        for n in range(30):
+            store.update(makeOrder(n, status=OSTA.STATUS_CANCELLED if n < 25 else
+                                   OSTA.STATUS_NOTTRADED))
+
+        self.assertLessEqual(len(store.finishedDict), 10)
+        self.assertEqual(store.spilledCount + len(store), 30)
+        self.assertNotIn('CTP.0', store.dataDict)
+
+        order = store.get('CTP.0')
+        self.assertIsInstance(order, OrderData)
+        self.assertEqual((order.vtOrderID, order.status), ('CTP.0', OSTA.STATUS_CANCELLED))
+        self.assertIsNone(store.get('CTP.99'))
+
+        cancelled = store.query(includeSpilled=True, status=OSTA.STATUS_CANCELLED)
+        self.assertEqual([o.totalVolume for o in cancelled], list(range(25)))
+        self.assertEqual(len(store.query(True)), 30)
+        store.close()
+
+        trades = TradeStore(maxFinished=1, path=os.path.join(self.folder, 'TradeStore.db'))
+        for n in range(3):
+            trade = TradeData()
+            trade.vtTradeID = 'CTP.T%d' % n
+            trade.vtOrderID = 'CTP.1'
+            trades.update(trade)
+        self.assertEqual(len(trades.query(True, vtOrderID='CTP.1')), 3)
+        trades.close()
+
+    def test_tradeAfterSpill(self):
+        strategyDict = {}
+        orders = OrderStore(maxFinished=1, path=os.path.join(self.folder, 'OrderStore.db'),
+                            strategyDict=strategyDict)
+        trades = TradeStore(strategyDict=strategyDict, orderStore=orders)
+        for n in range(3):
+            orders.setStrategyName('CTP.%d' % n, 'atr')
+            orders.update(makeOrder(n, status=OSTA.STATUS_ALLTRADED))
+        self.assertNotIn('CTP.0', orders.dataDict)
+        self.assertNotIn('CTP.0', strategyDict)
+
+        # 委托推送先于成交推送, 成交到达时委托已经转存
+        trade = TradeData()
+        trade.vtTradeID = 'CTP.T0'
+        trade.vtOrderID = 'CTP.0'
+        trades.update(trade)
+        self.assertEqual(trades.query(strategyName='atr'), [trade])
+
+        # 手动委托没有策略
+        orders.update(makeOrder(3))
+        trade = TradeData()
+        trade.vtTradeID = 'CTP.T3'
+        trade.vtOrderID = 'CTP.3'
+        trades.update(trade)
+        self.assertEqual(trades.count(strategyName=''), 1)
+        orders.close()
+
+    def test_workingOrderCount(self):
+        index = WorkingOrderIndex()
+        for n in range(5):
+            index.update(makeOrder(n, 'rb1910.SHFE' if n < 3 else 'IF1906.CFFEX'))
+        index.setStrategyName('CTP.0', 'atr')
+        index.update(makeOrder(1, 'rb1910.SHFE', OSTA.STATUS_PARTTRADED))
+        index.remove('CTP.2')
+        index.remove('CTP.9')
+
+        self.assertEqual(index.count(), 4)
+        self.assertEqual(index.count(vtSymbol='rb1910.SHFE'), 2)
+        self.assertEqual(index.count(gatewayName='CTP'), 4)
+        self.assertEqual(index.count(strategyName='atr'), 1)
+        self.assertEqual(index.count(strategyName='atr', vtSymbol='IF1906.CFFEX'), 0)
+        self.assertEqual(index.count(vtSymbol='ag1912.SHFE'), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import unittest
+import random
+from copy import copy
+
+from vnpy.vtConstant import C_DIRECTION as CDIR
+from vnpy.vtConstant import C_OFFSET as COFF
+from vnpy.vtConstant import C_ORDER_STATUS as OSTA
+from vnpy.base_class import OrderReq
+from vnpy.vtEngine import PositionDetail
+
+
+DIRECTIONS = [CDIR.DIRECTION_LONG, CDIR.DIRECTION_SHORT, CDIR.DIRECTION_NET]
+OFFSETS = [COFF.OFFSET_OPEN, COFF.OFFSET_CLOSE, COFF.OFFSET_CLOSETODAY,
+           COFF.OFFSET_CLOSEYESTERDAY]
+FROZEN_FIELDS = ['longPosFrozen', 'longYdFrozen', 'longTdFrozen',
+                 'shortPosFrozen', 'shortYdFrozen', 'shortTdFrozen']
+
+
+def frozenOf(detail):
+    return [getattr(detail, name) for name in FROZEN_FIELDS]
+
+
+class TestPositionDetail(unittest.TestCase):
+    def checkFrozen(self, detail):
+        """增量计算的冻结量与遍历全部活动委托的结果相同"""
+        incremental = frozenOf(detail)
+        detail.recalculateFrozen()
+        self.assertEqual(incremental, frozenOf(detail))
+
+    def test_closeOverflow(self):
+        detail = PositionDetail('rb1910.SHFE')
+        detail.longTd = 2
+        detail.longYd = 5
+
+        req = OrderReq()
+        req.direction = CDIR.DIRECTION_SHORT
+        req.offset = COFF.OFFSET_CLOSE
+        req.volume = 4
+        detail.updateOrderReq(req, 'CTP.1')
+        self.assertEqual((detail.longTdFrozen, detail.longYdFrozen), (2, 2))
+
+        req.offset = COFF.OFFSET_CLOSETODAY
+        req.volume = 1
+        detail.updateOrderReq(req, 'CTP.2')
+        self.assertEqual((detail.longTdFrozen, detail.longYdFrozen), (3, 2))
+
+    def test_randomStreams(self):
+        for seed in range(20):
+            rng = random.Random(seed)
+            detail = PositionDetail('rb1910.SHFE')
+            orders = {}
+            finished = []
+
+            for n in range(300):
+                action = rng.random()
+                if action < 0.1:
+                    # 持仓变化不会立即重算冻结, 下一笔委托时生效
+                    detail.longTd = rng.randint(-1, 10)
+                    detail.shortTd = rng.randint(-1, 10)
+                    continue
+
+                if action < 0.45 or not orders:
+                    req = OrderReq()
+                    req.direction = rng.choice(DIRECTIONS)
+                    req.offset = rng.choice(OFFSETS)
+                    req.volume = rng.randint(0, 5)
+                    vtOrderID = 'CTP.%d' % n
+                    detail.updateOrderReq(req, vtOrderID)
+                    order = copy(detail.workingOrderDict[vtOrderID])
+                    order.vtOrderID = vtOrderID
+                    orders[vtOrderID] = order
+                elif action < 0.5 and finished:
+                    # 已完成的委托再次以活动状态推送
+                    order = copy(rng.choice(finished))
+                    order.status = OSTA.STATUS_NOTTRADED
+                    orders[order.vtOrderID] = order
+                    detail.updateOrder(order)
+                else:
+                    order = copy(orders[rng.choice(list(orders))])
+                    change = rng.random()
+                    if change < 0.5 and order.tradedVolume < order.totalVolume:
+                        order.tradedVolume += 1
+                        order.status = OSTA.STATUS_PARTTRADED
+                    elif change < 0.6:
+                        order.offset = rng.choice(OFFSETS)
+                        order.direction = rng.choice(DIRECTIONS)
+                        order.status = OSTA.STATUS_NOTTRADED
+                    else:
+                        order.status = rng.choice([OSTA.STATUS_ALLTRADED, OSTA.STATUS_CANCELLED,
+                                                   OSTA.STATUS_REJECTED])
+                    detail.updateOrder(order)
+
+                    if order.status in detail.WorkingStatus:
+                        orders[order.vtOrderID] = order
+                    else:
+                        del orders[order.vtOrderID]
+                        finished.append(order)
+
+                self.checkFrozen(detail)
+
+
+if __name__ == '__main__':
+    unittest.main()
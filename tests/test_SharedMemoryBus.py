@@ -0,0 +1,151 @@
+import unittest
+import os
+from time import sleep
+from datetime import datetime, timezone
+
+from vnpy.vtConstant import C_EVENT
+from vnpy.base_class import Event, TickData, OrderData
+from vnpy.utility.eventEngine import EventEngine2
+from vnpy.utility.sharedMemoryBus import (SharedMemoryRing, SharedMemoryPublisher,
+                                          SharedMemoryEventEngine, RECORD_TICK)
+
+
+def waitUntil(condition, timeout=5):
+    for _ in range(int(timeout / 0.01)):
+        if condition():
+            return True
+        sleep(0.01)
+    return condition()
+
+
+def makeTick(vtSymbol, seq):
+    tick = TickData()
+    tick.gatewayName = 'CTP'
+    tick.symbol = vtSymbol
+    tick.vtSymbol = vtSymbol
+    tick.lastPrice = 3500.0 + seq
+    tick.volume = seq
+    tick.datetime = datetime(2019, 6, 3, 9, 0, 0, 500000)
+    tick.time = '09:00:00.5'
+    tick.date = '20190603'
+    tick.bidPrice1 = 3499.0
+    tick.askVolume5 = 7
+    return tick
+
+
+class TestSharedMemoryBus(unittest.TestCase):
+    def setUp(self):
+        self.name = 'vnpy_test_{pid}'.format(pid=os.getpid())
+
+    def test_ringRoundTrip(self):
+        writer = SharedMemoryRing(self.name, capacity=8, create=True)
+        reader = SharedMemoryRing(self.name)
+        try:
+            writer.publish(RECORD_TICK, makeTick('rb1910', 1))
+            records = reader.poll(10)
+            self.assertEqual(len(records), 1)
+
+            recordType, publishNs, tick = records[0]
+            self.assertEqual(recordType, RECORD_TICK)
+            self.assertGreater(publishNs, 0)
+            self.assertEqual(tick.__dict__, dict(makeTick('rb1910', 1).__dict__))
+            self.assertEqual(reader.poll(10), [])
+
+            # 落后超过一圈时跳过被覆盖的记录
+            for seq in range(20):
+                writer.publish(RECORD_TICK, makeTick('rb1910', seq))
+            records = reader.poll(100)
+            self.assertEqual([r[2].volume for r in records], list(range(12, 20)))
+            self.assertEqual(reader.lost, 12)
+        finally:
+            reader.close()
+            writer.close()
+
+    def test_eventEngine(self):
+        source = EventEngine2()
+        publisher = SharedMemoryPublisher(self.name, capacity=1024)
+        publisher.register(source)
+
+        ee = SharedMemoryEventEngine(self.name)
+        ticks, keyed, orders = [], [], []
+        ee.registerEvent(C_EVENT.EVENT_TICK, ticks.append)
+        ee.registerEvent(C_EVENT.EVENT_TICK + 'rb1910', keyed.append)
+        ee.registerEvent(C_EVENT.EVENT_ORDER, orders.append)
+
+        source.start(timer=False)
+        ee.start(timer=False)
+        try:
+            for seq in range(100):
+                event = Event(type_=C_EVENT.EVENT_TICK, key='rb1910')
+                event.dict_['data'] = makeTick('rb1910', seq)
+                source.putEvent(event)
+
+            order = OrderData()
+            order.vtOrderID = 'CTP.1'
+            order.status = '全部成交'
+            event = Event(type_=C_EVENT.EVENT_ORDER, key=order.vtOrderID)
+            event.dict_['data'] = order
+            source.putEvent(event)
+
+            self.assertTrue(waitUntil(lambda: len(orders) == 1))
+        finally:
+            ee.stop()
+            source.stop()
+            publisher.close()
+
+        self.assertEqual([e.dict_['data'].volume for e in ticks], list(range(100)))
+        self.assertEqual(len(keyed), 100)
+        self.assertEqual(orders[0].key, 'CTP.1')
+        self.assertEqual(orders[0].dict_['data'].status, '全部成交')
+        self.assertEqual(ee.getLostCount(), 0)
+
+    def test_floatVolume(self):
+        writer = SharedMemoryRing(self.name, capacity=8, create=True)
+        reader = SharedMemoryRing(self.name)
+        try:
+            tick = makeTick('btcusdt', 1)
+            tick.volume = 0.125
+            tick.bidVolume1 = None
+            tick.datetime = datetime(2019, 6, 3, 9, 0, 0, 500000, tzinfo=timezone.utc)
+            writer.publish(RECORD_TICK, tick)
+
+            tick = reader.poll(10)[0][2]
+            self.assertEqual(tick.volume, 0.125)
+            self.assertEqual(tick.bidVolume1, 0)
+            self.assertEqual(tick.datetime, datetime(2019, 6, 3, 9, 0, 0, 500000))
+        finally:
+            reader.close()
+            writer.close()
+
+    def test_dropBadEvent(self):
+        source = EventEngine2()
+        publisher = SharedMemoryPublisher(self.name, capacity=1024)
+        publisher.register(source)
+
+        ee = SharedMemoryEventEngine(self.name)
+        ticks = []
+        ee.registerEvent(C_EVENT.EVENT_TICK, ticks.append)
+
+        source.start(timer=False)
+        ee.start(timer=False)
+        try:
+            bad = makeTick('rb1910', 0)
+            bad.volume = 'n/a'
+            for tick in [bad, makeTick('rb1910', 1)]:
+                event = Event(type_=C_EVENT.EVENT_TICK, key='rb1910')
+                event.dict_['data'] = tick
+                source.putEvent(event)
+
+            # 无法编码的行情被丢弃, 后续行情照常发布
+            self.assertTrue(waitUntil(lambda: len(ticks) == 1))
+        finally:
+            ee.stop()
+            source.stop()
+            publisher.close()
+
+        self.assertEqual(ticks[0].dict_['data'].volume, 1)
+        self.assertEqual(publisher.dropped, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
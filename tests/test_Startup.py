@@ -0,0 +1,143 @@
+import unittest
+import os
+import shutil
+import tempfile
+from threading import Timer
+from time import sleep, perf_counter
+from unittest import mock
+
+from vnpy.app import AppEngine
+from vnpy.base_class import ContractData
+from vnpy.gateway.base_gateway import BaseGateway
+from vnpy.vtEngine import DataEngine
+from vnpy.bin.mainEngine import MainEngine
+
+
+class FakeGateway(BaseGateway):
+    """connect 耗时 connectDelay 秒, 再过 readyDelay 秒后就绪, readyDelay 为 None 时不就绪"""
+    signalsReady = True
+
+    def __init__(self, mainEngine, gatewayName, connectDelay, readyDelay):
+        super(FakeGateway, self).__init__(mainEngine, gatewayName)
+        self.connectDelay = connectDelay
+        self.readyDelay = readyDelay
+        self.readyTime = None
+
+    def connect(self):
+        sleep(self.connectDelay)
+        if self.readyDelay is not None:
+            Timer(self.readyDelay, self.onReady).start()
+
+    def onReady(self):
+        self.readyTime = perf_counter()
+        super(FakeGateway, self).onReady()
+
+
+class SilentGateway(FakeGateway):
+    """不发出就绪通知的接口"""
+    signalsReady = False
+
+
+class ContractGateway(FakeGateway):
+    """连接后推送 count 个合约, 推送完毕后立即通知就绪"""
+
+    def connect(self):
+        for n in range(self.readyDelay):
+            contract = ContractData()
+            contract.symbol = contract.vtSymbol = 'sc%d' % n
+            self.onContract(contract)
+        self.onReady()
+
+
+class BrokenGateway(FakeGateway):
+    def connect(self):
+        raise IOError('front unreachable')
+
+
+class FakeApp(AppEngine):
+    def __init__(self, mainEngine, gatewayNames, initDelay):
+        self.mainEngine = mainEngine
+        self.gatewayNames = gatewayNames
+        self.initDelay = initDelay
+        self.readyAtInit = None
+        self.startTime = None
+
+    def getGatewayNames(self):
+        return self.gatewayNames
+
+    def initAll(self):
+        names = self.gatewayNames
+        if names is None:
+            names = list(self.mainEngine.gatewayDict.keys())
+        self.readyAtInit = [self.mainEngine.gatewayDict[name].isReady() for name in names]
+        self.contractsAtInit = len(self.mainEngine.dataEngine.contractDict)
+        sleep(self.initDelay)
+
+    def startAll(self):
+        self.startTime = perf_counter()
+
+    def stop(self):
+        pass
+
+
+class TestStartup(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        path = os.path.join(self.folder, 'ContractCache.db')
+        with mock.patch.object(DataEngine, 'contractCachePath', path):
+            self.me = MainEngine()
+        self.me.gatewayReadyDelay = 0.4
+
+    def tearDown(self):
+        self.me.exit()
+        shutil.rmtree(self.folder)
+
+    def test_parallelStartup(self):
+        me = self.me
+        me.gatewayDict['A'] = FakeGateway(me, 'A', 0.3, 0.2)
+        me.gatewayDict['B'] = FakeGateway(me, 'B', 0.3, 1.0)
+        me.gatewayDict['C'] = SilentGateway(me, 'C', 0.3, None)
+        me.appDict['X'] = FakeApp(me, ['A'], 0.3)
+        me.appDict['Y'] = FakeApp(me, None, 0.3)
+        me.appDict['Z'] = FakeApp(me, ['C'], 0.3)
+
+        me.startAll()
+
+        for app in me.appDict.values():
+            self.assertTrue(all(app.readyAtInit))
+        # 只依赖 A 的应用不等待 B
+        self.assertLess(me.appDict['X'].startTime, me.gatewayDict['B'].readyTime)
+        self.assertGreater(me.appDict['Y'].startTime, me.gatewayDict['B'].readyTime)
+        # 接口同时连接, 应用同时初始化: 约 0.3 + 1.0 + 0.3 秒
+        self.assertLess(me.startupTimes['接口连接'], 0.6)
+        self.assertLess(me.startupTimes['启动合计'], 2.5)
+        self.assertIn('Z', me.startupTimes)
+
+    def test_readyAfterContracts(self):
+        me = self.me
+        me.gatewayDict['A'] = ContractGateway(me, 'A', 0, 2000)
+        me.appDict['X'] = FakeApp(me, ['A'], 0)
+
+        me.startAll()
+
+        # 就绪事件在全部合约事件之后处理
+        self.assertEqual(me.appDict['X'].readyAtInit, [True])
+        self.assertEqual(me.appDict['X'].contractsAtInit, 2000)
+
+    def test_notReady(self):
+        me = self.me
+        me.gatewayReadyTimeout = 0.5
+        me.gatewayDict['A'] = FakeGateway(me, 'A', 0, None)
+        me.gatewayDict['B'] = BrokenGateway(me, 'B', 0, None)
+        me.appDict['X'] = FakeApp(me, None, 0)
+
+        me.startAll()
+
+        # 未就绪的接口等待到超时, 连接出错的接口不等待
+        self.assertEqual(me.appDict['X'].readyAtInit, [False, False])
+        self.assertEqual(me.failedGatewaySet, set(['B']))
+        self.assertLess(me.startupTimes['启动合计'], 1.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
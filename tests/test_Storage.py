@@ -0,0 +1,130 @@
+import unittest
+import os
+import pickle
+import shutil
+import sqlite3
+import tempfile
+from datetime import datetime, timedelta
+from unittest import mock
+
+from vnpy.vtConstant import C_MONGO_DB_NAME as C_DB
+from vnpy.utility.storage import SqliteBackend, createBackend, openBackend, matchFilter, DESCENDING
+
+
+def makeBars(start, count):
+    return [{'vtSymbol': 'rb1910', 'datetime': start + timedelta(minutes=i), 'close': 3000.0 + i}
+            for i in range(count)]
+
+
+class TestSqliteBackend(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.backend = SqliteBackend(self.folder)
+        self.assertTrue(self.backend.connect())
+
+    def tearDown(self):
+        self.backend.close()
+        shutil.rmtree(self.folder)
+
+    def test_history(self):
+        start = datetime(2019, 10, 9, 9)
+        bars = makeBars(start, 100)
+        # 乱序写入, 读取时按时间排序
+        self.backend.saveHistory(C_DB.MINUTE_DB_NAME, 'rb1910', bars[50:] + bars[:50])
+
+        l = self.backend.loadHistory(C_DB.MINUTE_DB_NAME, 'rb1910',
+                                     start + timedelta(minutes=10), start + timedelta(minutes=20))
+        self.assertEqual(l, bars[10:20])
+        self.assertEqual(len(self.backend.loadHistory(C_DB.MINUTE_DB_NAME, 'rb1910')), 100)
+
+        # 相同时间的数据覆盖原有数据
+        bar = dict(bars[5], close=0.0)
+        self.backend.saveHistory(C_DB.MINUTE_DB_NAME, 'rb1910', [bar])
+        l = self.backend.query(C_DB.MINUTE_DB_NAME, 'rb1910', {'datetime': bar['datetime']})
+        self.assertEqual(l, [bar])
+
+        l = self.backend.query(C_DB.MINUTE_DB_NAME, 'rb1910',
+                               {'close': {'$gte': 3095.0}}, 'datetime', DESCENDING)
+        self.assertEqual([d['close'] for d in l], [3099.0, 3098.0, 3097.0, 3096.0, 3095.0])
+
+    def test_queryIter(self):
+        start = datetime(2019, 10, 9, 9)
+        bars = makeBars(start, 100)
+        self.backend.saveHistory(C_DB.MINUTE_DB_NAME, 'rb1910', bars)
+
+        records = self.backend.iterHistory(C_DB.MINUTE_DB_NAME, 'rb1910', start + timedelta(minutes=90),
+                                           projection=['datetime', 'close'], batchSize=3)
+        self.assertEqual(next(records), {'datetime': start + timedelta(minutes=90), 'close': 3090.0})
+        # 读取过程中写入不受影响
+        self.backend.saveHistory(C_DB.MINUTE_DB_NAME, 'rb1910', makeBars(start, 1))
+        self.assertEqual(len(list(records)), 9)
+
+        l = list(self.backend.queryIter(C_DB.MINUTE_DB_NAME, 'rb1910', {'close': {'$lt': 3003.0}},
+                                        'datetime', DESCENDING, batchSize=2))
+        self.assertEqual(l, bars[2::-1])
+
+    def test_documents(self):
+        backend = self.backend
+        backend.saveSyncData('AtrStrategy', {'name': 'atr', 'vtSymbol': 'rb1910', 'pos': 1})
+        backend.saveSyncData('AtrStrategy', {'name': 'atr', 'vtSymbol': 'rb1910', 'pos': 3})
+        backend.saveSyncData('AtrStrategy', {'name': 'atr', 'vtSymbol': 'hc1910', 'pos': 2})
+        self.assertEqual(backend.loadSyncData('AtrStrategy', 'atr', 'rb1910')['pos'], 3)
+        self.assertIsNone(backend.loadSyncData('AtrStrategy', 'ma', 'rb1910'))
+
+        # 不 upsert 时不写入新数据
+        backend.replace('db', 'setting', {'settingName': 'a'}, {'settingName': 'a'})
+        self.assertEqual(backend.query('db', 'setting', {}), [])
+
+        backend.insert('db', 'setting', {'settingName': 'b', 'templateName': 'z'})
+        backend.insert('db', 'setting', {'settingName': 'c', 'templateName': 'y'})
+        l = backend.query('db', 'setting', {}, 'templateName')
+        self.assertEqual([d['settingName'] for d in l], ['c', 'b'])
+
+        backend.delete('db', 'setting', {'settingName': 'c'})
+        l = backend.query('db', 'setting', {'settingName': {'$in': ['b', 'c']}})
+        self.assertEqual([d['settingName'] for d in l], ['b'])
+
+        # 重新打开后数据仍在
+        backend.close()
+        backend = self.backend = SqliteBackend(self.folder)
+        self.assertEqual(backend.loadSyncData('AtrStrategy', 'atr', 'hc1910')['pos'], 2)
+
+    def test_keyIndex(self):
+        # 旧版本只有 t, doc 两列的表, 打开时补充索引列
+        self.backend.close()
+        conn = sqlite3.connect(os.path.join(self.folder, 'db.db'))
+        conn.execute('CREATE TABLE "AtrStrategy" (t INTEGER, doc BLOB)')
+        conn.execute('INSERT INTO "AtrStrategy" VALUES (?, ?)',
+                     (None, pickle.dumps({'name': 'atr', 'vtSymbol': 'rb1910', 'pos': 1})))
+        conn.commit()
+        conn.close()
+
+        backend = self.backend = SqliteBackend(self.folder)
+        backend.replace('db', 'AtrStrategy', {'name': 'atr', 'vtSymbol': 'rb1910', 'pos': 2},
+                        {'name': 'atr', 'vtSymbol': 'rb1910'})
+        self.assertEqual(backend.query('db', 'AtrStrategy', {'name': 'atr'})[0]['pos'], 2)
+
+        # 按索引字段查询时不扫描全表
+        conn, table = backend.getTable('db', 'AtrStrategy')
+        sql, params = backend.makeSelect(table, {'name': 'atr', 'vtSymbol': 'rb1910'})
+        plan = ' '.join([row[-1] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, params)])
+        self.assertIn('USING INDEX', plan)
+
+    def test_filter(self):
+        d = {'a': 1, 'b': 'x'}
+        self.assertTrue(matchFilter(d, {'a': {'$gt': 0, '$lte': 1}, 'b': 'x'}))
+        self.assertFalse(matchFilter(d, {'a': {'$ne': 1}}))
+        self.assertFalse(matchFilter(d, {'c': {'$gte': 0}}))
+        self.assertRaises(ValueError, matchFilter, d, {'a': {'$regex': '1'}})
+
+    def test_createBackend(self):
+        self.assertIsInstance(createBackend('sqlite'), SqliteBackend)
+        self.assertRaises(ValueError, createBackend, 'csv')
+
+    def test_openBackend(self):
+        with mock.patch.object(SqliteBackend, 'connect', return_value=False):
+            self.assertRaises(IOError, openBackend, 'sqlite')
+
+
+if __name__ == '__main__':
+    unittest.main()
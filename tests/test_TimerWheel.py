@@ -0,0 +1,60 @@
+import unittest
+
+from vnpy.utility.timerWheel import TimerWheel
+
+
+class TestTimerWheel(unittest.TestCase):
+    def collect(self, wheel, start, end):
+        """逐刻度推进, 返回 [(到期刻度, timerId)]"""
+        fired = []
+        for tick in range(start, end):
+            for handle in wheel.advance(tick):
+                fired.append((tick, handle.timerId))
+        return fired
+
+    def test_oneShot(self):
+        wheel = TimerWheel()
+        delays = [1, 5, 255, 256, 257, 1000, 20000, 300000]
+        ids = [wheel.schedule(d, None) for d in delays]
+
+        fired = self.collect(wheel, 0, 300002)
+        self.assertEqual(fired, list(zip(delays, ids)))
+        self.assertEqual(len(wheel), 0)
+
+    def test_periodicAndCancel(self):
+        wheel = TimerWheel(1000)
+        periodic = wheel.schedule(10, None, interval=100)
+        cancelled = wheel.schedule(50, None)
+        self.assertTrue(wheel.cancel(cancelled))
+        self.assertFalse(wheel.cancel(cancelled))
+
+        fired = self.collect(wheel, 1000, 1400)
+        self.assertEqual(fired, [(1010, periodic), (1110, periodic),
+                                 (1210, periodic), (1310, periodic)])
+
+        wheel.cancel(periodic)
+        self.assertEqual(self.collect(wheel, 1400, 2000), [])
+
+    def test_catchUp(self):
+        # 一次推进多个刻度时到期计时器按顺序返回, 周期计时器不集中补发
+        wheel = TimerWheel()
+        a = wheel.schedule(300, None)
+        b = wheel.schedule(20, None, interval=10)
+        c = wheel.schedule(100, None)
+
+        expired = [h.timerId for h in wheel.advance(1000)]
+        self.assertEqual(expired, [b, c, a])
+        self.assertEqual([h.timerId for h in wheel.advance(1009)], [])
+        self.assertEqual([h.timerId for h in wheel.advance(1010)], [b])
+
+    def test_nextTimeout(self):
+        wheel = TimerWheel(1)
+        self.assertEqual(wheel.nextTimeout(1000), 1000)
+        wheel.schedule(30, None)
+        self.assertEqual(wheel.nextTimeout(1000), 30)
+        wheel.schedule(5000, None)
+        self.assertEqual(wheel.nextTimeout(10), 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -14,3 +14,7 @@ class AppEngine(LoggingMixin):
 
     def stopAll(self):
         raise NotImplementedError
+
+    def getGatewayNames(self):
+        """初始化前需要就绪的接口名称列表, None 表示全部接口"""
+        return None
@@ -13,11 +13,11 @@ from itertools import product
 import multiprocessing
 import copy
 
-import pymongo
 import numpy as np
 import matplotlib.pyplot as plt
 
 from vnpy.rpc import RpcClient, RpcServer, RemoteException
+from vnpy.utility.storage import openBackend
 
 
 # 如果安装了seaborn则设置为白色风格
@@ -69,7 +69,7 @@ class BacktestingEngine(object):
         self.size = 1               # 合约大小，默认为1
         self.priceTick = 0          # 价格最小变动
 
-        self.dbClient = None        # 数据库客户端
+        self.dbBackend = None       # 数据存储后端
         self.dbCursor = None        # 数据库指针
         self.hdsClient = None       # 历史数据服务器客户端
 
@@ -171,9 +171,9 @@ class BacktestingEngine(object):
         self.hdsClient.start()
 
     def loadHistoryData(self):
-        """载入历史数据"""
-        self.dbClient = pymongo.MongoClient(globalSetting['mongoHost'], globalSetting['mongoPort'])
-        collection = self.dbClient[self.dbName][self.symbol]
+        """载入历史数据, 回测数据按批读取, 在 runBacktesting 中逐条回放"""
+        if not self.hdsClient:
+            self.dbBackend = openBackend()
 
         self.output(u'开始载入数据')
 
@@ -192,9 +192,8 @@ class BacktestingEngine(object):
                                                         self.dataStartDate,
                                                         self.strategyStartDate)
         else:
-            flt = {'datetime':{'$gte':self.dataStartDate,
-                               '$lt':self.strategyStartDate}}
-            initCursor = collection.find(flt).sort('datetime')
+            initCursor = self.dbBackend.loadHistory(self.dbName, self.symbol,
+                                                    self.dataStartDate, self.strategyStartDate)
 
         # 将数据从查询指针中读取出，并生成列表
         self.initData = []              # 清空initData列表
@@ -215,13 +214,9 @@ class BacktestingEngine(object):
             else:
                 flt = {'datetime':{'$gte':self.strategyStartDate,
                                    '$lte':self.dataEndDate}}
-            self.dbCursor = collection.find(flt).sort('datetime')
+            self.dbCursor = self.dbBackend.queryIter(self.dbName, self.symbol, flt, 'datetime')
 
-        if isinstance(self.dbCursor, list):
-            count = len(initCursor) + len(self.dbCursor)
-        else:
-            count = initCursor.count() + self.dbCursor.count()
-        self.output(u'载入完成，数据量：%s' %count)
+        self.output(u'载入完成，初始化数据量：%s' %len(self.initData))
 
     def runBacktesting(self):
         """运行回测"""
@@ -248,12 +243,19 @@ class BacktestingEngine(object):
 
         self.output(u'开始回放数据')
 
-        for d in self.dbCursor:
-            data = dataClass()
-            data.__dict__ = d
-            func(data)
+        count = 0
+        try:
+            for d in self.dbCursor:
+                data = dataClass()
+                data.__dict__ = d
+                func(data)
+                count += 1
+        finally:
+            if self.dbBackend:
+                self.dbBackend.close()
+                self.dbBackend = None
 
-        self.output(u'数据回放结束')
+        self.output(u'数据回放结束，数据量：%s' %count)
 
     def newBar(self, bar):
         """新的K线"""
@@ -535,6 +537,14 @@ class BacktestingEngine(object):
         """直接返回初始化数据列表中的Tick"""
         return self.initData
 
+    def iterBar(self, dbName, collectionName, startDate):
+        """回测中初始化数据已经载入内存, 与 loadBar 相同"""
+        return self.initData
+
+    def iterTick(self, dbName, collectionName, startDate):
+        """回测中初始化数据已经载入内存, 与 loadTick 相同"""
+        return self.initData
+
     def writeCtaLog(self, content):
         """记录日志"""
         log = str(self.dt) + ' ' + content
@@ -1247,8 +1257,7 @@ class HistoryDataServer(RpcServer):
         """Constructor"""
         super(HistoryDataServer, self).__init__(repAddress, pubAddress)
 
-        self.dbClient = pymongo.MongoClient(globalSetting['mongoHost'],
-                                            globalSetting['mongoPort'])
+        self.dbBackend = openBackend()
 
         self.historyDict = {}
 
@@ -1263,15 +1272,7 @@ class HistoryDataServer(RpcServer):
             return history
 
         # 否则从数据库加载
-        collection = self.dbClient[dbName][symbol]
-
-        if end:
-            flt = {'datetime':{'$gte':start, '$lt':end}}
-        else:
-            flt = {'datetime':{'$gte':start}}
-
-        cx = collection.find(flt).sort('datetime')
-        history = [d for d in cx]
+        history = self.dbBackend.loadHistory(dbName, symbol, start, end or None)
 
         self.historyDict[(dbName, symbol, start, end)] = history
         print(u'从数据库加载：%s %s %s %s' %(dbName, symbol, start, end))
@@ -10,7 +10,9 @@ import json
 import os
 import traceback
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from time import perf_counter
 from copy import copy
 
 from vnpy.vtConstant import C_EVENT
@@ -21,7 +23,9 @@ from vnpy.vtConstant import C_OFFSET as COFF
 from vnpy.vtConstant import C_PRICETYPE as CPRI
 from vnpy.base_class import Event, TickData, BarData
 from vnpy.base_class import OrderReq, CancelOrderReq
+from vnpy.batch_class import TickBatch, BarBatch
 from vnpy.utility.file import todayDate, getJsonPath
+from vnpy.utility.instrumentRegistry import instrumentRegistry, InstrumentTable
 from vnpy.app import AppEngine
 from vnpy.config import globalSetting
 
@@ -29,6 +33,12 @@ from .ctaBase import *
 from .strategy import STRATEGY_CLASS
 
 
+# 读取历史数据时只读取数据类的字段, 不读取数据库中的 _id 等其他字段
+BAR_PROJECTION = [name for name in BarData().__dict__ if name != 'rawData'] + \
+    ['date', 'time', 'datetime']
+TICK_PROJECTION = [name for name in TickData().__dict__ if name != 'rawData'] + \
+    ['date', 'time', 'datetime']
+
 class CtaEngine(AppEngine):
     """CTA策略引擎"""
     settingFilePath = getJsonPath('CTA_setting.json', __file__)
@@ -43,10 +53,10 @@ class CtaEngine(AppEngine):
         # key为策略名称，value为策略实例，注意策略名称不允许重复
         self.strategyDict = {}
 
-        # 保存vtSymbol和策略实例映射的字典（用于推送tick数据）
-        # 由于可能多个strategy交易同一个vtSymbol，因此key为vtSymbol
+        # 保存合约和策略实例的映射（用于推送tick数据）
+        # 由于可能多个strategy交易同一个合约，因此以合约编号为下标
         # value为包含所有相关strategy对象的list
-        self.tickStrategyDict = {}
+        self.tickStrategyTable = InstrumentTable()
 
         # 保存vtOrderID和strategy对象映射的字典（用于推送order和trade数据）
         # key为vtOrderID，value为strategy对象
@@ -77,6 +87,12 @@ class CtaEngine(AppEngine):
         # RQData能获取的合约代码列表
         self.rqSymbolSet = set()
 
+        # 读取历史数据时每批从数据库取回的条数
+        self.historyBatchSize = globalSetting.getint('historyQueryBatchSize', 1000)
+
+        # 同时初始化策略的线程数
+        self.initWorkers = globalSetting.getint('ctaInitWorkers', 1)
+
         # 初始化RQData服务
         self.initRqData()
 
@@ -89,6 +105,11 @@ class CtaEngine(AppEngine):
             for setting in l:
                 self.loadStrategy(setting)
 
+    @property
+    def tickStrategyDict(self):
+        """vtSymbol:策略列表 的字典, 兼容按字符串访问的代码"""
+        return self.tickStrategyTable.toDict()
+
     def registerEvent(self):
         self.mainEngine.registerEvent(C_EVENT.EVENT_TICK, self.processTickEvent)
         self.mainEngine.registerEvent(C_EVENT.EVENT_ORDER, self.processOrderEvent)
@@ -96,8 +117,15 @@ class CtaEngine(AppEngine):
 
     def initAll(self):
         # 初始化策略, 同步策略持仓, 订阅行情
-        for name in self.strategyDict.keys():
-            self.initStrategy(name)
+        start = perf_counter()
+        names = list(self.strategyDict.keys())
+        if self.initWorkers > 1 and len(names) > 1:
+            self.initParallel(names)
+        else:
+            for name in names:
+                self.initStrategy(name)
+        self.writeLog('{n} 个策略初始化完成, 耗时 {t:.2f} 秒'.format(
+            n=len(names), t=perf_counter() - start))
 
     def startAll(self):
         for name in self.strategyDict.keys():
@@ -119,6 +147,7 @@ class CtaEngine(AppEngine):
 
         req.productClass = strategy.productClass
         req.currency = strategy.currency
+        req.strategyName = strategy.name
 
         # 设计为CTA引擎发出的委托只允许使用限价单
         req.priceType = CPRI.PRICETYPE_LIMITPRICE
@@ -240,7 +269,8 @@ class CtaEngine(AppEngine):
         vtSymbol = tick.vtSymbol
 
         # 首先检查是否有策略交易该合约
-        if vtSymbol in self.tickStrategyDict:
+        iid = tick.instrumentId
+        if iid is not None and self.tickStrategyTable.items[iid] is not None:
             # 遍历等待中的停止单，检查是否会被触发
             for so in self.workingStopOrderDict.values():
                 if so.vtSymbol == vtSymbol:
@@ -282,28 +312,36 @@ class CtaEngine(AppEngine):
     def processTickEvent(self, event):
         """处理行情推送"""
         tick = event.dict_['data']
+
+        # 没有策略交易该合约时不需要处理
+        iid = tick.instrumentId
+        if iid is None:
+            iid = instrumentRegistry.getId(tick.vtSymbol)
+            if iid is None:
+                return
+        l = self.tickStrategyTable.items[iid]
+        if l is None:
+            return
         tick = copy(tick)
+        tick.instrumentId = iid
 
         # 收到tick行情后, 先处理本地停止单(检查是否要立即发出)
         self.processStopOrder(tick)
 
         # 推送tick到对应的策略实例进行处理
-        if tick.vtSymbol in self.tickStrategyDict:
-            # tick时间可能出现异常数据
-            try:
-                if not tick.datetime:
-                    tick.datetime = datetime.strptime(' '.join([tick.date, tick.time]), '%Y%m%d %H:%M:%S.%f')
-            except ValueError:
-                self.writeLog('tick.date: ' + str(tick.date))
-                self.writeLog('tick.time: ' + str(tick.time))
-                self.writeLog(traceback.format_exc())
-                return
+        # tick时间可能出现异常数据, datetime 在首次读取时由时间戳计算或解析 date/time
+        try:
+            tick.datetime
+        except ValueError:
+            self.writeLog('tick.date: ' + str(tick.date))
+            self.writeLog('tick.time: ' + str(tick.time))
+            self.writeLog(traceback.format_exc())
+            return
 
-            # 逐个推送到策略实例中
-            l = self.tickStrategyDict[tick.vtSymbol]
-            for strategy in l:
-                if strategy.inited:
-                    self.callStrategyFunc(strategy, strategy.onTick, tick)
+        # 逐个推送到策略实例中
+        for strategy in l:
+            if strategy.inited:
+                self.callStrategyFunc(strategy, strategy.onTick, tick)
 
     def processOrderEvent(self, event):
         """处理委托推送"""
@@ -348,41 +386,55 @@ class CtaEngine(AppEngine):
 
     def insertData(self, dbName, collectionName, data):
         """插入数据到数据库（这里的data可以是TickData或者BarData）"""
-        self.mainEngine.dbInsert(dbName, collectionName, data.__dict__)
+        self.mainEngine.dbInsert(dbName, collectionName, data.toDict())
 
     def loadBar(self, dbName, collectionName, days):
         """从数据库中读取Bar数据，startDate是datetime对象"""
+        return list(self.iterBar(dbName, collectionName, days))
+
+    def loadTick(self, dbName, collectionName, days):
+        """从数据库中读取Tick数据，startDate是datetime对象"""
+        return list(self.iterTick(dbName, collectionName, days))
+
+    def iterBar(self, dbName, collectionName, days):
+        """逐条读取Bar数据, 数据库按批返回, 只读取BarData的字段"""
         # 优先尝试从RQData获取数据
         if dbName == C_DB.MINUTE_DB_NAME and collectionName.upper() in self.rqSymbolSet:
-            l = self.loadRqBar(collectionName, days)
-            return l
+            return iter(self.loadRqBar(collectionName, days))
 
         # 如果没有则从数据库中读取数据
+        records = self.queryHistory(dbName, collectionName, days, BAR_PROJECTION)
+        return self.makeData(BarData, records)
+
+    def iterTick(self, dbName, collectionName, days):
+        """逐条读取Tick数据, 数据库按批返回, 只读取TickData的字段"""
+        records = self.queryHistory(dbName, collectionName, days, TICK_PROJECTION)
+        return self.makeData(TickData, records)
+
+    def loadBarBatch(self, dbName, collectionName, days):
+        """从数据库中读取Bar数据, 返回按列存储的 BarBatch, 不为每条数据创建对象"""
+        records = self.queryHistory(dbName, collectionName, days,
+                                    [name for name, _ in BarBatch.fields])
+        return BarBatch.fromRecords(records)
+
+    def loadTickBatch(self, dbName, collectionName, days):
+        """从数据库中读取Tick数据, 返回按列存储的 TickBatch"""
+        records = self.queryHistory(dbName, collectionName, days,
+                                    [name for name, _ in TickBatch.fields])
+        return TickBatch.fromRecords(records)
+
+    def queryHistory(self, dbName, collectionName, days, projection):
         startDate = self.today - timedelta(days)
 
         d = {'datetime':{'$gte':startDate}}
-        barData = self.mainEngine.dbQuery(dbName, collectionName, d, 'datetime')
+        return self.mainEngine.dbQueryIter(dbName, collectionName, d, 'datetime',
+                                           projection=projection, batchSize=self.historyBatchSize)
 
-        l = []
-        for d in barData:
-            bar = BarData()
-            bar.__dict__ = d
-            l.append(bar)
-        return l
-
-    def loadTick(self, dbName, collectionName, days):
-        """从数据库中读取Tick数据，startDate是datetime对象"""
-        startDate = self.today - timedelta(days)
-
-        d = {'datetime':{'$gte':startDate}}
-        tickData = self.mainEngine.dbQuery(dbName, collectionName, d, 'datetime')
-
-        l = []
-        for d in tickData:
-            tick = TickData()
-            tick.__dict__ = d
-            l.append(tick)
-        return l
+    @staticmethod
+    def makeData(dataClass, records):
+        fromDict = dataClass.fromDict
+        for d in records:
+            yield fromDict(d)
 
     def loadStrategy(self, setting):
         try:
@@ -408,13 +460,31 @@ class CtaEngine(AppEngine):
             self.strategyOrderDict[name] = set()
 
             # 保存Tick映射关系
-            if strategy.vtSymbol in self.tickStrategyDict:
-                l = self.tickStrategyDict[strategy.vtSymbol]
-            else:
+            instrumentId = instrumentRegistry.register(strategy.vtSymbol)
+            l = self.tickStrategyTable.get(instrumentId)
+            if l is None:
                 l = []
-                self.tickStrategyDict[strategy.vtSymbol] = l
+                self.tickStrategyTable[instrumentId] = l
             l.append(strategy)
 
+    def initParallel(self, names):
+        """
+        各策略的预热(onInit)主要等待数据库读取, 使用多个线程同时执行;
+        同步持仓和订阅行情仍在当前线程中按顺序进行.
+        各策略的 onInit 在不同线程中运行, 策略之间不能共享可变对象
+        """
+        strategies = [self.strategyDict[name] for name in names
+                      if not self.strategyDict[name].inited]
+        for strategy in strategies:
+            strategy.inited = True
+
+        with ThreadPoolExecutor(min(self.initWorkers, len(strategies) or 1)) as executor:
+            list(executor.map(lambda s: self.callStrategyFunc(s, s.onInit), strategies))
+
+        for strategy in strategies:
+            self.loadSyncData(strategy)         # 同步数据库中保存的持仓情况
+            self.mainEngine.subscribeMarketData(strategy.vtSymbol)
+
     def initStrategy(self, name):
         if name in self.strategyDict:
             strategy = self.strategyDict[name]
@@ -609,9 +679,7 @@ class CtaEngine(AppEngine):
             bar.low = row['low']
             bar.close = row['close']
             bar.volume = row['volume']
-            bar.datetime = row.name
-            bar.date = bar.datetime.strftime("%Y%m%d")
-            bar.time = bar.datetime.strftime("%H:%M:%S")
+            bar.setDatetime(row.name)
             l.append(bar)
 
         return l
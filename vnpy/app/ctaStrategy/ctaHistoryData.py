@@ -2,10 +2,12 @@
 
 """
 本模块中主要包含：
-1. 将MultiCharts导出的历史数据载入到MongoDB中用的函数
-2. 将通达信导出的历史数据载入到MongoDB中的函数
-3. 将交易开拓者导出的历史数据载入到MongoDB中的函数
-4. 将OKEX下载的历史数据载入到MongoDB中的函数
+1. 将MultiCharts导出的历史数据载入到数据库中用的函数
+2. 将通达信导出的历史数据载入到数据库中的函数
+3. 将交易开拓者导出的历史数据载入到数据库中的函数
+4. 将OKEX下载的历史数据载入到数据库中的函数
+
+数据库由 vtcmd.ini 的 dbBackend 选择(MongoDB 或本地 SQLite)
 """
 from __future__ import print_function
 
@@ -14,7 +16,7 @@ from datetime import datetime, timedelta
 from time import time
 from struct import unpack
 
-import pymongo
+from vnpy.utility.storage import openBackend, DESCENDING
 
 from vnpy.trader.vtGlobal import globalSetting
 from vnpy.trader.vtConstant import *
@@ -30,10 +32,9 @@ def downloadEquityDailyBarts(self, symbol):
     print(u'开始下载%s日行情' %symbol)
     
     # 查询数据库中已有数据的最后日期
-    cl = self.dbClient[DAILY_DB_NAME][symbol]
-    cx = cl.find(sort=[('datetime', pymongo.DESCENDING)])
-    if cx.count():
-        last = cx[0]
+    l = self.dbBackend.query(DAILY_DB_NAME, symbol, {}, 'datetime', DESCENDING)
+    if l:
+        last = l[0]
     else:
         last = ''
     # 开始下载数据
@@ -45,10 +46,7 @@ def downloadEquityDailyBarts(self, symbol):
     data = ts.get_k_data(symbol,start)
     
     if not data.empty:
-        # 创建datetime索引
-        self.dbClient[DAILY_DB_NAME][symbol].ensure_index([('datetime', pymongo.ASCENDING)], 
-                                                            unique=True)                
-        
+        bars = []
         for index, d in data.iterrows():
             bar = VtBarData()
             bar.vtSymbol = symbol
@@ -65,23 +63,22 @@ def downloadEquityDailyBarts(self, symbol):
             except KeyError:
                 print(d)
             
-            flt = {'datetime': bar.datetime}
-            self.dbClient[DAILY_DB_NAME][symbol].update_one(flt, {'$set':bar.__dict__}, upsert=True)            
-        
+            bars.append(bar.__dict__)
+        self.dbBackend.saveHistory(DAILY_DB_NAME, symbol, bars)
+
         print(u'%s下载完成' %symbol)
     else:
         print(u'找不到合约%s' %symbol)
 
 #----------------------------------------------------------------------
 def loadMcCsv(fileName, dbName, symbol):
-    """将Multicharts导出的csv格式的历史数据插入到Mongo数据库中"""
+    """将Multicharts导出的csv格式的历史数据插入到数据库中"""
     start = time()
     print(u'开始读取CSV文件%s中的数据插入到%s的%s中' %(fileName, dbName, symbol))
     
-    # 锁定集合，并创建索引
-    client = pymongo.MongoClient(globalSetting['mongoHost'], globalSetting['mongoPort']) 
-    collection = client[dbName][symbol]
-    collection.ensure_index([('datetime', pymongo.ASCENDING)], unique=True)   
+    # 连接存储后端, 数据读取完后批量写入
+    backend = openBackend()
+    bars = []
     
     # 读取数据和插入到数据库
     with open(fileName, 'r') as f:
@@ -99,22 +96,22 @@ def loadMcCsv(fileName, dbName, symbol):
             bar.datetime = datetime.strptime(bar.date + ' ' + bar.time, '%Y%m%d %H:%M:%S')
             bar.volume = d['TotalVolume']
     
-            flt = {'datetime': bar.datetime}
-            collection.update_one(flt, {'$set':bar.__dict__}, upsert=True)  
+            bars.append(bar.__dict__)
             print(bar.date, bar.time)
     
+    backend.saveHistory(dbName, symbol, bars)
+    backend.close()
     print(u'插入完毕，耗时：%s' % (time()-start))
 
 #----------------------------------------------------------------------
 def loadTbCsv(fileName, dbName, symbol):
-    """将TradeBlazer导出的csv格式的历史分钟数据插入到Mongo数据库中"""
+    """将TradeBlazer导出的csv格式的历史分钟数据插入到数据库中"""
     start = time()
     print(u'开始读取CSV文件%s中的数据插入到%s的%s中' %(fileName, dbName, symbol))
     
-    # 锁定集合，并创建索引
-    client = pymongo.MongoClient(globalSetting['mongoHost'], globalSetting['mongoPort'])
-    collection = client[dbName][symbol]
-    collection.ensure_index([('datetime', pymongo.ASCENDING)], unique=True)   
+    # 连接存储后端, 数据读取完后批量写入
+    backend = openBackend()
+    bars = []
     
     # 读取数据和插入到数据库
     reader = csv.reader(file(fileName, 'r'))
@@ -132,22 +129,22 @@ def loadTbCsv(fileName, dbName, symbol):
         bar.volume = d[5]
         bar.openInterest = d[6]
 
-        flt = {'datetime': bar.datetime}
-        collection.update_one(flt, {'$set':bar.__dict__}, upsert=True)  
+        bars.append(bar.__dict__)
         print(bar.date, bar.time)
     
+    backend.saveHistory(dbName, symbol, bars)
+    backend.close()
     print(u'插入完毕，耗时：%s' % (time()-start))
     
  #----------------------------------------------------------------------
 def loadTbPlusCsv(fileName, dbName, symbol):
-    """将TB极速版导出的csv格式的历史分钟数据插入到Mongo数据库中"""
+    """将TB极速版导出的csv格式的历史分钟数据插入到数据库中"""
     start = time()
     print(u'开始读取CSV文件%s中的数据插入到%s的%s中' %(fileName, dbName, symbol)) 
 
-    # 锁定集合，并创建索引
-    client = pymongo.MongoClient(globalSetting['mongoHost'], globalSetting['mongoPort'])
-    collection = client[dbName][symbol]
-    collection.ensure_index([('datetime', pymongo.ASCENDING)], unique=True)      
+    # 连接存储后端, 数据读取完后批量写入
+    backend = openBackend()
+    bars = []
 
     # 读取数据和插入到数据库
     reader = csv.reader(file(fileName, 'r'))
@@ -167,10 +164,11 @@ def loadTbPlusCsv(fileName, dbName, symbol):
         bar.datetime = datetime.strptime(bar.date + ' ' + bar.time, '%Y%m%d %H:%M:%S')
         bar.volume = d[6]
         bar.openInterest = d[7]
-        flt = {'datetime': bar.datetime}
-        collection.update_one(flt, {'$set':bar.__dict__}, upsert=True)  
+        bars.append(bar.__dict__)
         print(bar.date, bar.time)    
 
+    backend.saveHistory(dbName, symbol, bars)
+    backend.close()
     print(u'插入完毕，耗时：%s' % (time()-start))
 
 #----------------------------------------------------------------------
@@ -185,15 +183,14 @@ def loadTbPlusCsv(fileName, dbName, symbol):
 注意事项：导出csv后手工删除表头和表尾
 """
 def loadTdxCsv(fileName, dbName, symbol):
-    """将通达信导出的csv格式的历史分钟数据插入到Mongo数据库中"""
+    """将通达信导出的csv格式的历史分钟数据插入到数据库中"""
     start = time()
     date_correct = ""
     print(u'开始读取CSV文件%s中的数据插入到%s的%s中' %(fileName, dbName, symbol))
     
-    # 锁定集合，并创建索引
-    client = pymongo.MongoClient(globalSetting['mongoHost'], globalSetting['mongoPort'])
-    collection = client[dbName][symbol]
-    collection.ensure_index([('datetime', pymongo.ASCENDING)], unique=True)   
+    # 连接存储后端, 数据读取完后批量写入
+    backend = openBackend()
+    bars = []
     
     # 读取数据和插入到数据库
     reader = csv.reader(file(fileName, 'r'))
@@ -217,9 +214,10 @@ def loadTdxCsv(fileName, dbName, symbol):
         bar.datetime = datetime.strptime(bar.date + ' ' + bar.time, '%Y%m%d %H:%M:%S')
         bar.volume = d[5]
 
-        flt = {'datetime': bar.datetime}
-        collection.update_one(flt, {'$set':bar.__dict__}, upsert=True)  
+        bars.append(bar.__dict__)
     
+    backend.saveHistory(dbName, symbol, bars)
+    backend.close()
     print(u'插入完毕，耗时：%s' % (time()-start))
 
 #----------------------------------------------------------------------
@@ -230,15 +228,14 @@ def loadTdxCsv(fileName, dbName, symbol):
 注意事项：
 """   
 def loadTdxLc1(fileName, dbName, symbol):
-    """将通达信导出的lc1格式的历史分钟数据插入到Mongo数据库中"""
+    """将通达信导出的lc1格式的历史分钟数据插入到数据库中"""
     start = time()
 
     print(u'开始读取通达信Lc1文件%s中的数据插入到%s的%s中' %(fileName, dbName, symbol))
     
-    # 锁定集合，并创建索引
-    client = pymongo.MongoClient(globalSetting['mongoHost'], globalSetting['mongoPort'])
-    collection = client[dbName][symbol]
-    collection.ensure_index([('datetime', pymongo.ASCENDING)], unique=True)  
+    # 连接存储后端, 数据读取完后批量写入
+    backend = openBackend()
+    bars = []
 
     #读取二进制文件
     ofile=open(fileName,'rb')
@@ -266,21 +263,21 @@ def loadTdxLc1(fileName, dbName, symbol):
         bar.datetime = datetime.strptime(bar.date + ' ' + bar.time, '%Y%m%d %H:%M:%S')
         bar.volume = a[7]
 
-        flt = {'datetime': bar.datetime}
-        collection.update_one(flt, {'$set':bar.__dict__}, upsert=True)
+        bars.append(bar.__dict__)
     
+    backend.saveHistory(dbName, symbol, bars)
+    backend.close()
     print(u'插入完毕，耗时：%s' % (time()-start))
 
 #----------------------------------------------------------------------
 def loadOKEXCsv(fileName, dbName, symbol):
-    """将OKEX导出的csv格式的历史分钟数据插入到Mongo数据库中"""
+    """将OKEX导出的csv格式的历史分钟数据插入到数据库中"""
     start = time()
     print(u'开始读取CSV文件%s中的数据插入到%s的%s中' %(fileName, dbName, symbol))
 
-    # 锁定集合，并创建索引
-    client = pymongo.MongoClient(globalSetting['mongoHost'], globalSetting['mongoPort'])
-    collection = client[dbName][symbol]
-    collection.ensure_index([('datetime', pymongo.ASCENDING)], unique=True)
+    # 连接存储后端, 数据读取完后批量写入
+    backend = openBackend()
+    bars = []
 
     # 读取数据和插入到数据库
     reader = csv.reader(open(fileName,"r"))
@@ -302,9 +299,10 @@ def loadOKEXCsv(fileName, dbName, symbol):
             bar.volume = float(d[6])
             bar.tobtcvolume = float(d[7])
 
-            flt = {'datetime': bar.datetime}
-            collection.update_one(flt, {'$set':bar.__dict__}, upsert=True)
+            bars.append(bar.__dict__)
             print('%s \t %s' % (bar.date, bar.time))
 
+    backend.saveHistory(dbName, symbol, bars)
+    backend.close()
     print(u'插入完毕，耗时：%s' % (time()-start))
     
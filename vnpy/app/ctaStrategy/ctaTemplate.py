@@ -149,6 +149,14 @@ class CtaTemplate(LoggingMixin):
         """读取bar数据"""
         return self.ctaEngine.loadBar(self.__barDbName, self.vtSymbol, days)
 
+    def iterTick(self, days):
+        """逐条读取tick数据, 不一次载入全部数据"""
+        return self.ctaEngine.iterTick(self.__tickDbName, self.vtSymbol, days)
+
+    def iterBar(self, days):
+        """逐条读取bar数据, 不一次载入全部数据"""
+        return self.ctaEngine.iterBar(self.__barDbName, self.vtSymbol, days)
+
     def writeLog(self, content):
         self.log.info(content)
 
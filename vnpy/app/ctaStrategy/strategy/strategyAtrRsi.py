@@ -86,7 +86,7 @@ class AtrRsiStrategy(CtaTemplate):
         self.rsiSell = 50 - self.rsiEntry
 
         # 载入历史数据，并采用回放计算的方式初始化策略数值
-        initData = self.loadBar(self.initDays)
+        initData = self.iterBar(self.initDays)
         for bar in initData:
             self.onBar(bar)
 
@@ -92,7 +92,7 @@ class BollChannelStrategy(CtaTemplate):
         self.writeLog('%s策略初始化' %self.name)
 
         # 载入历史数据，并采用回放计算的方式初始化策略数值
-        initData = self.loadBar(self.initDays)
+        initData = self.iterBar(self.initDays)
         for bar in initData:
             self.onBar(bar)
 
@@ -64,7 +64,7 @@ class DoubleMaStrategy(CtaTemplate):
         """初始化策略（必须由用户继承实现）"""
         self.writeLog('双EMA演示策略初始化')
 
-        initData = self.loadBar(self.initDays)
+        initData = self.iterBar(self.initDays)
         for bar in initData:
             self.onBar(bar)
 
@@ -73,7 +73,7 @@ class KkStrategy(CtaTemplate):
         self.writeLog('%s策略初始化' %self.name)
 
         # 载入历史数据，并采用回放计算的方式初始化策略数值
-        initData = self.loadBar(self.initDays)
+        initData = self.iterBar(self.initDays)
         for bar in initData:
             self.onBar(bar)
 
@@ -46,7 +46,7 @@ class DrEngine(AppEngine):
 
         # 收盘相关
         self.marketCloseTime = None             # 收盘时间
-        self.timerCount = 0                     # 定时器计数
+        self.timerInterval = 10                 # 收盘检查间隔(秒)
         self.lastTimerTime = None               # 上一次记录时间
 
         # 注册事件监听
@@ -55,12 +55,25 @@ class DrEngine(AppEngine):
     def registerEvent(self):
         """注册事件监听"""
         self.mainEngine.registerEvent(C_EVENT.EVENT_TICK, self.procecssTickEvent)
-        self.mainEngine.registerEvent(C_EVENT.EVENT_TIMER, self.processTimerEvent)
+        self.mainEngine.scheduleTimer(self.timerInterval, self.processTimerEvent,
+                                      interval=self.timerInterval)
 
     def startAll(self):
         self.active = True
         self.thread.start()
 
+    def getGatewayNames(self):
+        """只需要等待配置中订阅行情的接口"""
+        with open(self.settingFilePath) as f:
+            drSetting = json.load(f)
+        if not drSetting.get('working'):
+            return []
+        names = set()
+        for key in ('tick', 'bar'):
+            for setting in drSetting.get(key, []):
+                names.add(setting[1])
+        return sorted(names)
+
     def initAll(self):
         """加载配置"""
         with open(self.settingFilePath) as f:
@@ -167,12 +180,8 @@ class DrEngine(AppEngine):
         tick = event.dict_['data']
         vtSymbol = tick.vtSymbol
 
-        # 生成datetime对象
-        if not tick.datetime:
-            if '.' in tick.time:
-                tick.datetime = datetime.strptime(' '.join([tick.date, tick.time]), '%Y%m%d %H:%M:%S.%f')
-            else:
-                tick.datetime = datetime.strptime(' '.join([tick.date, tick.time]), '%Y%m%d %H:%M:%S')
+        # datetime 在首次读取时由时间戳计算(或解析 date/time), 保证写入数据库的记录中包含
+        tick.datetime
 
         self.onTick(tick)
 
@@ -181,17 +190,11 @@ class DrEngine(AppEngine):
             bm.updateTick(tick)
 
     def processTimerEvent(self, event):
-        """处理定时事件"""
+        """处理定时事件, 每 timerInterval 秒检查一次"""
         # 如果没有设置收盘时间，则无需处理
         if not self.marketCloseTime:
             return
 
-        # 10秒检查一次
-        self.timerCount += 1
-        if self.timerCount < 10:
-            return
-        self.timerCount = 0
-
         # 获取当前时间
         currentTime = datetime.now().time()
 
@@ -247,7 +250,7 @@ class DrEngine(AppEngine):
 
     def insertData(self, dbName, collectionName, data):
         """插入数据到数据库（这里的data可以是TickData或者BarData）"""
-        self.queue.put((dbName, collectionName, data.__dict__))
+        self.queue.put((dbName, collectionName, data.toDict()))
 
     def run(self):
         """运行插入线程"""
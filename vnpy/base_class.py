@@ -1,15 +1,24 @@
 # encoding: UTF-8
 
+from time import mktime, time_ns
 from datetime import datetime
 from vnpy.vtConstant import C_ORDER_STATUS as OSTA
 from vnpy.utility.logging_mixin import LoggingMixin
+from vnpy.utility.instrumentRegistry import instrumentRegistry
 
 
 class Event(LoggingMixin):
-    """事件对象, 类似 message"""
-    def __init__(self, type_=None):
+    """
+    事件对象, 类似 message
+
+    key 为主题的子键, 例如 type_='eTick.', key='rb1910' 的事件会同时
+    分发给 'eTick.' 和 'eTick.rb1910' 的监听函数
+    """
+    def __init__(self, type_=None, key=None):
         # 事件类型
         self.type_ = type_
+        # 主题子键
+        self.key = key
         # 字典用于保存具体的事件数据
         self.dict_ = {}
 
@@ -20,9 +29,180 @@ class BaseData(LoggingMixin):
         self.gatewayName = ''         # Gateway名称
         self.rawData = None           # 原始数据
 
+    def toDict(self):
+        """用于持久化的字段字典(写入数据库, 日志等)"""
+        d = dict(self.__dict__)
+        d.pop('_log', None)
+        d.pop('instrumentId', None)
+        return d
+
+    @classmethod
+    def fromDict(cls, d):
+        """由持久化的字段字典还原数据对象, d 直接作为实例的 __dict__"""
+        data = cls.__new__(cls)
+        data.__dict__ = d
+        return data
+
+
+class InstrumentIdField(object):
+    """
+    合约在本进程内的整数编号, 见 vnpy.utility.instrumentRegistry
+    用于合约, 委托, 成交, 持仓: 首次读取时按 vtSymbol 查询(未注册时分配)并保存为实例属性,
+    之后的读取与普通属性相同. 编号只在本进程内有效, toDict 不包含该字段.
+    """
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        iid = obj.instrumentId = instrumentRegistry.register(obj.vtSymbol)
+        return iid
+
+
+def nsToDatetime(ns):
+    """epoch 纳秒时间戳转为本地时间的 datetime, 精确到微秒"""
+    return datetime.fromtimestamp(ns // 1000000000).replace(microsecond=ns // 1000 % 1000000)
+
+
+def datetimeToNs(dt):
+    """本地时间的 datetime 转为 epoch 纳秒时间戳"""
+    return int(mktime(dt.timetuple())) * 1000000000 + dt.microsecond * 1000
+
+
+def parseDateTime(date, time):
+    """解析 gateway 推送的日期和时间字符串, 如 '20151009', '11:20:56.5'"""
+    if '.' in time:
+        return datetime.strptime(' '.join([date, time]), '%Y%m%d %H:%M:%S.%f')
+    return datetime.strptime(' '.join([date, time]), '%Y%m%d %H:%M:%S')
+
+
+def lazyDatetime(data):
+    """优先由 timestampNs 计算, 没有时解析 date/time 字符串(如 CTP 推送)"""
+    d = data.__dict__
+    ns = d.get('timestampNs', 0)
+    if ns:
+        return nsToDatetime(ns)
+    date = d.get('date', '')
+    time = d.get('time', '')
+    if date and time:
+        return parseDateTime(date, time)
+    return None
+
+
+def lazyDate(data):
+    dt = data.datetime
+    if dt is None:
+        return ''
+    return '%04d%02d%02d' % (dt.year, dt.month, dt.day)
+
+
+def lazyTime(data):
+    dt = data.datetime
+    if dt is None:
+        return ''
+    return '%02d:%02d:%02d.%06d' % (dt.hour, dt.minute, dt.second, dt.microsecond)
+
+
+class LazyTimeField(object):
+    """
+    按需计算的时间属性, 首次读取时计算并缓存在实例 __dict__ 中, 之后的读取与普通属性相同
+    直接赋值(如从数据库载入)会覆盖缓存; 修改时间戳请使用 setTimestampNs/setDatetime
+    """
+    def __init__(self, compute):
+        self.compute = compute
+        self.name = None
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        value = self.compute(obj)
+        obj.__dict__[self.name] = value
+        return value
+
+
+class DatetimeField(LazyTimeField):
+    """
+    datetime 属性, 读取时与 LazyTimeField 相同;
+    直接赋值等同于 setDatetime, 同时更新 timestampNs, 因此为数据描述器, 读取时先查实例 __dict__
+    """
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        d = obj.__dict__
+        try:
+            return d['datetime']
+        except KeyError:
+            value = d['datetime'] = self.compute(obj)
+            return value
+
+    def __set__(self, obj, value):
+        obj.setDatetime(value)
 
-class TickData(BaseData):
+
+class TimestampData(BaseData):
+    """
+    带时间戳的行情数据基础类
+
+    timestampNs(epoch 纳秒)为唯一的时间来源, datetime/date/time 在首次读取时
+    才由它计算并缓存, gateway 不必为每条行情 strftime, 使用方也不必再 strptime.
+    只推送日期时间字符串的 gateway(如 CTP)直接设置 date/time, datetime 在首次读取时解析.
+    对 datetime 赋值等同于 setDatetime, timestampNs 随之更新.
+    """
+    datetime = DatetimeField(lazyDatetime)      # python的datetime时间对象
+    date = LazyTimeField(lazyDate)              # 日期 20151009
+    time = LazyTimeField(lazyTime)              # 时间 11:20:56.500000
+
+    def __init__(self):
+        super(TimestampData, self).__init__()
+        self.timestampNs = 0            # epoch 纳秒时间戳
+
+    def setTimestampNs(self, ns):
+        """更新时间戳并清除已缓存的 datetime/date/time"""
+        d = self.__dict__
+        d['timestampNs'] = ns
+        d.pop('datetime', None)
+        d.pop('date', None)
+        d.pop('time', None)
+
+    def setDatetime(self, dt):
+        """
+        按 datetime 更新时间戳, 直接对 datetime 赋值时同样调用.
+        原时间戳为 0 时保留已赋值的 date/time 字符串(gateway 先写 date/time 再写 datetime),
+        否则清除缓存, 由新的时间戳计算
+        """
+        d = self.__dict__
+        ns = d.get('timestampNs', 0)
+        if ns or not d.get('date'):
+            d.pop('date', None)
+        if ns or not d.get('time'):
+            d.pop('time', None)
+        d['timestampNs'] = datetimeToNs(dt) if dt is not None else 0
+        d['datetime'] = dt
+
+    def toDict(self):
+        """持久化时补全 datetime/date/time, 与原有数据库中的字段一致"""
+        d = super(TimestampData, self).toDict()
+        d['datetime'] = self.datetime
+        d['date'] = self.date
+        d['time'] = self.time
+        return d
+
+    @classmethod
+    def fromDict(cls, d):
+        """数据库中的数据没有 timestampNs 时由 datetime 计算"""
+        if not d.get('timestampNs', 0):
+            dt = d.get('datetime', None)
+            d['timestampNs'] = datetimeToNs(dt) if dt is not None else 0
+        return super(TimestampData, cls).fromDict(d)
+
+
+class TickData(TimestampData):
     """Tick行情数据类"""
+    # 合约编号, 由 gateway 创建行情时写入, 没有写入时由 DataEngine 在收到行情时写入;
+    # 热点路径中按普通属性读取, 因此不使用 InstrumentIdField
+    instrumentId = None
+
     def __init__(self):
         super(TickData, self).__init__()
 
@@ -36,9 +216,6 @@ class TickData(BaseData):
         self.lastVolume = 0             # 最新成交量
         self.volume = 0                 # 今天总成交量
         self.openInterest = 0           # 持仓量
-        self.time = ''                # 时间 11:20:56.5
-        self.date = ''                # 日期 20151009
-        self.datetime = None                    # python的datetime时间对象
 
         # 常规行情
         self.openPrice = 0.0            # 今日开盘价
@@ -74,15 +251,15 @@ class TickData(BaseData):
         self.askVolume4 = 0
         self.askVolume5 = 0
 
-    @staticmethod
-    def createFromGateway(gateway, symbol, exchange,
+    @classmethod
+    def createFromGateway(cls, gateway, symbol, exchange,
                           lastPrice, lastVolume,
                           highPrice, lowPrice,
                           openPrice=0.0,
                           openInterest=0,
                           upperLimit=0.0,
                           lowerLimit=0.0):
-        tick = TickData()
+        tick = cls()
         tick.gatewayName = gateway.gatewayName
         tick.symbol = symbol
         tick.exchange = exchange
@@ -91,9 +268,7 @@ class TickData(BaseData):
         tick.lastPrice = lastPrice
         tick.lastVolume = lastVolume
         tick.openInterest = openInterest
-        tick.datetime = datetime.now()
-        tick.date = tick.datetime.strftime('%Y%m%d')
-        tick.time = tick.datetime.strftime('%H:%M:%S.%f')
+        tick.timestampNs = time_ns()
 
         tick.openPrice = openPrice
         tick.highPrice = highPrice
@@ -103,8 +278,10 @@ class TickData(BaseData):
         return tick
 
 
-class BarData(BaseData):
+class BarData(TimestampData):
     """K线数据"""
+    instrumentId = None     # 合约编号, 同 TickData
+
     def __init__(self):
         super(BarData, self).__init__()
 
@@ -117,10 +294,6 @@ class BarData(BaseData):
         self.low = 0.0
         self.close = 0.0
 
-        self.date = ''            # bar开始的时间，日期
-        self.time = ''            # 时间
-        self.datetime = None                # python的datetime时间对象
-
         self.volume = 0             # 成交量
         self.openInterest = 0       # 持仓量
         self.interval = ''       # K线周期
@@ -131,6 +304,8 @@ class TradeData(BaseData):
     成交数据类
     一般来说，一个OrderData可能对应多个TradeData：一个订单可能多次部分成交
     """
+    instrumentId = InstrumentIdField()     # 合约编号
+
     def __init__(self):
         super(TradeData, self).__init__()
 
@@ -152,9 +327,9 @@ class TradeData(BaseData):
         self.volume = 0                 # 成交数量
         self.tradeTime = ''           # 成交时间
 
-    @staticmethod
-    def createFromGateway(gateway, symbol, exchange, tradeID, orderID, direction, tradePrice, tradeVolume):
-        trade = TradeData()
+    @classmethod
+    def createFromGateway(cls, gateway, symbol, exchange, tradeID, orderID, direction, tradePrice, tradeVolume):
+        trade = cls()
         trade.gatewayName = gateway.gatewayName
         trade.symbol = symbol
         trade.exchange = exchange
@@ -172,14 +347,16 @@ class TradeData(BaseData):
         trade.tradeTime = datetime.now().strftime('%H:%M:%S')
         return trade
 
-    @staticmethod
-    def createFromOrderData(order,
+    @classmethod
+    def createFromOrderData(cls,
+                            order,
                             tradeID,
                             tradePrice,
                             tradeVolume):  # type: (OrderData, str, float, float)->TradeData
-        trade = TradeData()
+        trade = cls()
         trade.gatewayName = order.gatewayName
         trade.symbol = order.symbol
+        trade.exchange = order.exchange
         trade.vtSymbol = order.vtSymbol
 
         trade.orderID = order.orderID
@@ -187,6 +364,7 @@ class TradeData(BaseData):
         trade.tradeID = tradeID
         trade.vtTradeID = trade.gatewayName + '.' + tradeID
         trade.direction = order.direction
+        trade.offset = order.offset
         trade.price = tradePrice
         trade.volume = tradeVolume
         trade.tradeTime = datetime.now().strftime('%H:%M:%S')
@@ -195,6 +373,8 @@ class TradeData(BaseData):
 
 class OrderData(BaseData):
     """订单数据类"""
+    instrumentId = InstrumentIdField()     # 合约编号
+
     def __init__(self):
         super(OrderData, self).__init__()
 
@@ -221,8 +401,9 @@ class OrderData(BaseData):
         self.frontID = 0                # 前置机编号
         self.sessionID = 0              # 连接编号
 
-    @staticmethod
-    def createFromGateway(gateway,                          # type: Gateway
+    @classmethod
+    def createFromGateway(cls,
+                          gateway,                          # type: Gateway
                           orderId,                          # type: str
                           symbol,                           # type: str
                           exchange,                         # type: str
@@ -235,7 +416,7 @@ class OrderData(BaseData):
                           orderTime='',          # type: str
                           cancelTime='',         # type: str
                           ):                                # type: (...)->OrderData
-        vtOrder = OrderData()
+        vtOrder = cls()
         vtOrder.gatewayName = gateway.gatewayName
         vtOrder.symbol = symbol
         vtOrder.exchange = exchange
@@ -256,6 +437,8 @@ class OrderData(BaseData):
 
 class PositionData(BaseData):
     """持仓数据类"""
+    instrumentId = InstrumentIdField()     # 合约编号
+
     def __init__(self):
         super(PositionData, self).__init__()
 
@@ -273,8 +456,9 @@ class PositionData(BaseData):
         self.ydPosition = 0             # 昨持仓
         self.positionProfit = 0.0       # 持仓盈亏
 
-    @staticmethod
-    def createFromGateway(gateway,                      # type: Gateway
+    @classmethod
+    def createFromGateway(cls,
+                          gateway,                      # type: Gateway
                           exchange,                     # type: str
                           symbol,                       # type: str
                           direction,                    # type: str
@@ -284,7 +468,7 @@ class PositionData(BaseData):
                           yestordayPosition=0,  # type: int
                           profit=0.0            # type: float
                           ):                            # type: (...)->PositionData
-        vtPosition = PositionData()
+        vtPosition = cls()
         vtPosition.gatewayName = gateway.gatewayName
         vtPosition.symbol = symbol
         vtPosition.exchange = exchange
@@ -321,6 +505,8 @@ class AccountData(BaseData):
 
 class ContractData(BaseData):
     """合约详细信息类"""
+    instrumentId = InstrumentIdField()     # 合约编号
+
     def __init__(self):
         super(ContractData, self).__init__()
 
@@ -339,8 +525,9 @@ class ContractData(BaseData):
         self.optionType = ''         # 期权类型
         self.expiryDate = ''          # 到期日
 
-    @staticmethod
-    def createFromGateway(gateway,
+    @classmethod
+    def createFromGateway(cls,
+                          gateway,
                           exchange,
                           symbol,
                           productClass,
@@ -352,7 +539,7 @@ class ContractData(BaseData):
                           optionType='',
                           expiryDate=''
                           ):
-        d = ContractData()
+        d = cls()
         d.gatewayName = gateway.gatewayName
         d.symbol = symbol
         d.exchange = exchange
@@ -408,6 +595,8 @@ class OrderReq(object):
         self.direction = ''           # 买卖
         self.offset = ''              # 开平
 
+        self.strategyName = ''        # 发单的策略名称, 只在本地使用
+
         # 以下为IB相关
         self.productClass = ''       # 合约类型
         self.currency = ''            # 合约货币
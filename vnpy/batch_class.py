@@ -0,0 +1,270 @@
+# encoding: UTF-8
+
+"""
+按列存储的行情批量容器, 以 NumPy 结构化数组保存 Tick 和 K线
+
+回测, 策略预热和行情记录需要处理大量历史数据时, 用 TickBatch/BarBatch 代替
+TickData/BarData 列表: 每行只占结构化数组中的固定字节数, 不再为每条数据创建对象.
+
+    batch = BarBatch.fromRecords(collection.find(flt).sort('datetime'))
+    for chunk in BarBatch.iterFromRecords(cursor, 10000): ...   # 逐段构建, 不等待全部数据
+    batch['close']                      # 按列读取, 返回数组视图
+    batch.between(start, end)           # 按时间截取, 返回共享内存的视图
+    for bar in batch: strategy.onBar(bar)   # 逐条还原为 BarData
+
+与 TickData/BarData 互相转换时字段值保持不变: 字符串按固定宽度保存
+(宽度见 TICK_FIELDS/BAR_FIELDS, 超出宽度时抛出 ValueError), 数量字段全部为整数时
+保存为 int64, 有任一小数时为 float64; rawData 不保存.
+还原数据对象时, 空的 date/time/datetime 不写入, 由 timestampNs 在首次读取时生成.
+按时间截取要求数据已按 datetime 排序(数据库查询时 sort('datetime')).
+"""
+
+import csv
+from itertools import chain, islice
+from operator import attrgetter
+
+import numpy as np
+
+from vnpy.base_class import TickData, BarData
+
+
+# 各字段的名称及 NumPy 类型, VOLUME 表示按数据确定为 int64 或 float64
+VOLUME = 'volume'
+
+TICK_FIELDS = [
+    ('gatewayName', 'U16'), ('symbol', 'U32'), ('exchange', 'U16'), ('vtSymbol', 'U48'),
+    ('lastPrice', 'f8'), ('lastVolume', VOLUME), ('volume', VOLUME), ('openInterest', VOLUME),
+    ('time', 'U16'), ('date', 'U8'), ('datetime', 'M8[us]'), ('timestampNs', 'i8'),
+    ('openPrice', 'f8'), ('highPrice', 'f8'), ('lowPrice', 'f8'), ('preClosePrice', 'f8'),
+    ('upperLimit', 'f8'), ('lowerLimit', 'f8'),
+] + [('bidPrice%d' % n, 'f8') for n in range(1, 6)] \
+  + [('askPrice%d' % n, 'f8') for n in range(1, 6)] \
+  + [('bidVolume%d' % n, VOLUME) for n in range(1, 6)] \
+  + [('askVolume%d' % n, VOLUME) for n in range(1, 6)]
+
+BAR_FIELDS = [
+    ('gatewayName', 'U16'), ('vtSymbol', 'U48'), ('symbol', 'U32'), ('exchange', 'U16'),
+    ('open', 'f8'), ('high', 'f8'), ('low', 'f8'), ('close', 'f8'),
+    ('date', 'U8'), ('time', 'U16'), ('datetime', 'M8[us]'), ('timestampNs', 'i8'),
+    ('volume', VOLUME), ('openInterest', VOLUME), ('interval', 'U8'),
+]
+
+# 由 timestampNs 延迟生成的时间字段
+LAZY_FIELDS = ('date', 'time', 'datetime')
+
+# 从数据库或 CSV 构建时每次转换的行数, 限制中间 tuple 列表占用的内存
+CHUNK_SIZE = 65536
+
+
+def makeDtype(fields, volumeType, textMargin=0):
+    """textMargin 为字符串字段额外的宽度, 构建时用于检查是否超出宽度"""
+    types = []
+    for name, fmt in fields:
+        if fmt == VOLUME:
+            fmt = volumeType
+        elif textMargin and fmt.startswith('U'):
+            fmt = 'U%d' % (int(fmt[1:]) + textMargin)
+        types.append((name, fmt))
+    return np.dtype(types)
+
+
+def checkTextWidth(array, dtype):
+    """字符串超出 dtype 中的宽度时抛出 ValueError, 不截断"""
+    for name in dtype.names:
+        if dtype[name].kind != 'U':
+            continue
+        width = dtype[name].itemsize // 4
+        lengths = np.char.str_len(array[name])
+        if len(lengths) and lengths.max() > width:
+            value = array[name][lengths.argmax()]
+            raise ValueError('{n} exceeds {w} characters: {v!r}'.format(n=name, w=width, v=value))
+
+
+def isIntegral(array, fields):
+    """全部数量字段均为整数值"""
+    for name, fmt in fields:
+        if fmt == VOLUME:
+            column = array[name]
+            if not np.array_equal(column, np.floor(column)):
+                return False
+    return True
+
+
+class DataBatch(object):
+    """
+    TickBatch/BarBatch 的基础类, 包装一个按 datetime 排序的结构化数组
+
+    batch[n] 返回第 n 条数据对象, batch[a:b] 和 between 返回共享内存的新容器,
+    batch['字段名'] 返回该列的数组视图.
+    """
+
+    fields = []
+    dataClass = None
+
+    def __init__(self, array=None):
+        if array is None:
+            array = np.empty(0, dtype=makeDtype(self.fields, 'f8'))
+        self.array = array
+        self.names = array.dtype.names
+
+    #----------------------------------------------------------------------
+    # 构建
+    @classmethod
+    def fromRecords(cls, records, volumeType=None):
+        """
+        从 dict 序列(如 Mongo 查询指针)构建, 缺少的字段使用数据类的默认值
+        volumeType 为 None 时数量字段全部为整数则使用 int64, 否则 float64;
+        指定为 'i8' 而数据中有小数时抛出 ValueError
+        """
+        fields = cls.fields
+        dtype = makeDtype(fields, 'f8')
+        names = dtype.names
+        sample = cls.dataClass()
+        defaults = {name: getattr(sample, name) for name in names}
+
+        def toRow(d):
+            return tuple([d.get(name, defaults[name]) for name in names])
+
+        # 先以 float64 数量字段及加宽的字符串字段构建, 检查后再转换为最终类型
+        wideDtype = makeDtype(fields, 'f8', textMargin=1)
+        records = iter(records)
+        chunks = []
+        while True:
+            rows = [toRow(d) for d in islice(records, CHUNK_SIZE)]
+            if not rows:
+                break
+            chunks.append(np.array(rows, dtype=wideDtype))
+        if not chunks:
+            return cls(np.empty(0, dtype=makeDtype(fields, volumeType or 'f8')))
+
+        array = np.concatenate(chunks) if len(chunks) > 1 else chunks[0]
+        checkTextWidth(array, dtype)
+
+        integral = isIntegral(array, fields)
+        if volumeType is None:
+            volumeType = 'i8' if integral else 'f8'
+        elif np.dtype(volumeType).kind == 'i' and not integral:
+            raise ValueError('volume fields contain fractional values, cannot store as {t}'.format(
+                t=volumeType))
+        return cls(array.astype(makeDtype(fields, volumeType)))
+
+    @classmethod
+    def iterFromRecords(cls, records, chunkSize=CHUNK_SIZE, volumeType=None):
+        """
+        从 dict 序列逐段构建, 每段最多 chunkSize 条
+        数量字段出现小数后, 之后各段均使用 float64
+        """
+        records = iter(records)
+        while True:
+            chunk = list(islice(records, chunkSize))
+            if not chunk:
+                break
+            batch = cls.fromRecords(chunk, volumeType)
+            if batch.array.dtype['volume'].kind == 'f':
+                volumeType = 'f8'
+            yield batch
+
+    @classmethod
+    def fromData(cls, dataList):
+        """从 TickData/BarData 对象列表构建"""
+        names = [name for name, _ in cls.fields]
+        getter = attrgetter(*names)
+        return cls.fromRecords(dict(zip(names, getter(data))) for data in dataList)
+
+    @classmethod
+    def fromCsv(cls, path, encoding='utf-8'):
+        """
+        从带表头的 CSV 文件构建, 列名与字段名相同, 不需要的列会被忽略
+        datetime 列为 ISO 格式, 如 2019-06-03 09:00:00.500000
+        """
+        with open(path, newline='', encoding=encoding) as f:
+            reader = csv.DictReader(f)
+            first = next(reader, None)
+            if first is None:
+                return cls()
+
+            dtype = makeDtype(cls.fields, 'f8')
+
+            # 只转换文件中存在的列, 空的 datetime 转为 NaT
+            converters = []
+            for name in dtype.names:
+                if name not in first:
+                    continue
+                kind = dtype[name].kind
+                if kind == 'M':
+                    converters.append((name, lambda s: np.datetime64(s) if s else None))
+                elif kind == 'U':
+                    converters.append((name, str))
+                elif kind == 'i':
+                    converters.append((name, lambda s: int(float(s)) if s else 0))
+                else:
+                    converters.append((name, lambda s: float(s) if s else 0.0))
+
+            def toRecord(row):
+                return {name: convert(row[name]) for name, convert in converters}
+
+            return cls.fromRecords(map(toRecord, chain([first], reader)))
+
+    #----------------------------------------------------------------------
+    # 读取
+    def __len__(self):
+        return len(self.array)
+
+    def __getitem__(self, item):
+        if isinstance(item, str):
+            return self.array[item]
+        if isinstance(item, slice):
+            return self.__class__(self.array[item])
+        return self.makeData(self.array[item].tolist())
+
+    def __iter__(self):
+        """逐条还原为数据对象, 每次只转换一小段"""
+        makeData = self.makeData
+        array = self.array
+        for start in range(0, len(array), 4096):
+            for values in array[start:start + 4096].tolist():
+                yield makeData(values)
+
+    def makeData(self, values):
+        data = self.dataClass()
+        d = dict(zip(self.names, values))
+        d['rawData'] = None
+        for name in LAZY_FIELDS:
+            if not d[name]:
+                del d[name]
+        data.__dict__ = d
+        return data
+
+    def toData(self):
+        """还原为数据对象列表"""
+        return list(self)
+
+    @property
+    def datetime(self):
+        return self.array['datetime']
+
+    def between(self, start=None, end=None):
+        """截取 start <= datetime < end 的部分, 返回共享内存的新容器"""
+        column = self.array['datetime']
+        left = 0 if start is None else np.searchsorted(column, np.datetime64(start), 'left')
+        right = len(column) if end is None else np.searchsorted(column, np.datetime64(end), 'left')
+        return self.__class__(self.array[left:right])
+
+    def concat(self, other):
+        """与另一个容器首尾相接, 返回新容器(复制数据), 数量字段类型不同时使用 float64"""
+        dtype = self.array.dtype
+        if dtype['volume'] != other.array.dtype['volume']:
+            dtype = makeDtype(self.fields, 'f8')
+        return self.__class__(np.concatenate([self.array.astype(dtype), other.array.astype(dtype)]))
+
+
+class TickBatch(DataBatch):
+    """Tick 行情批量容器"""
+    fields = TICK_FIELDS
+    dataClass = TickData
+
+
+class BarBatch(DataBatch):
+    """K线批量容器"""
+    fields = BAR_FIELDS
+    dataClass = BarData
@@ -3,20 +3,22 @@
 from __future__ import division
 
 import os
+import json
 import shelve
-from time import sleep
+import traceback
+from threading import Thread, Timer
+from time import perf_counter
 from datetime import datetime
 from collections import OrderedDict
 from copy import copy
 
-from pymongo import MongoClient, ASCENDING
-from pymongo.errors import ConnectionFailure
 
 from vnpy.vtEngine import DataEngine
 from vnpy.config import globalSetting
 from vnpy.base_class import SubscribeReq
 from vnpy.utility.logging_mixin import LoggingMixin
 from vnpy.utility.eventEngine import EventEngine2
+from vnpy.utility.storage import createBackend, ASCENDING
 
 
 class MainEngine(LoggingMixin):
@@ -34,9 +36,41 @@ class MainEngine(LoggingMixin):
     def __init__(self, EventEngineSleepInterval=None):
         self.todayDate = datetime.now().strftime('%Y%m%d')
 
-        self.eventEngine = EventEngine2(EventEngineSleepInterval)
+        # 事件引擎运行统计及处理函数耗时预算(毫秒)
+        handlerBudget = globalSetting.getfloat('eventEngineHandlerBudgetMs', 0)
+
+        # 有界事件队列的过载策略, 未配置时使用 DEFAULT_OVERLOAD_POLICIES
+        overloadPolicies = globalSetting.get('eventEngineOverloadPolicy', '')
+        overloadPolicies = json.loads(overloadPolicies) if overloadPolicies else None
+
+        # DataEngine 及各应用引擎按单线程处理设计, 事件引擎不使用分片模式
+        self.eventEngine = EventEngine2(
+            EventEngineSleepInterval,
+            stats=globalSetting.getboolean('eventEngineStats', False),
+            handlerBudget=handlerBudget / 1000 if handlerBudget else None,
+            priorityClasses=globalSetting.getboolean('eventEnginePriority', False) or None,
+            maxQueueSize=globalSetting.getint('eventEngineMaxQueueSize', 0) or None,
+            overloadPolicies=overloadPolicies)
         self.dataEngine = DataEngine(self)
-        self.dbClient = None    # MongoDB客户端对象
+
+        # 跨进程共享内存事件总线, 未配置名称时不启用
+        self.busPublisher = None
+        busName = globalSetting.get('sharedMemoryBusName', '')
+        if busName:
+            from vnpy.utility.sharedMemoryBus import SharedMemoryPublisher
+            self.busPublisher = SharedMemoryPublisher(
+                busName, globalSetting.getint('sharedMemoryBusCapacity', 65536))
+            self.busPublisher.register(self.eventEngine)
+
+        # 事件日志, 未配置目录时不启用
+        self.eventJournal = None
+        journalFolder = globalSetting.get('eventJournalFolder', '')
+        if journalFolder:
+            from vnpy.utility.eventJournal import EventJournal
+            self.eventJournal = EventJournal(journalFolder)
+            self.eventJournal.register(self.eventEngine)
+        self.dbBackend = None   # 数据存储后端, 连接成功后创建
+        self.dbWriter = None    # 批量后台写入, 连接成功后创建
 
         # 接口实例
         self.gatewayDict = OrderedDict()
@@ -49,12 +83,36 @@ class MainEngine(LoggingMixin):
         # 风控引擎实例（特殊独立对象）
         self.rmEngine = None
 
+        # 启动: 接口就绪的等待上限, 不发出就绪通知的接口在连接后视为就绪的等待时间(秒)
+        self.gatewayReadyTimeout = globalSetting.getfloat('gatewayReadyTimeout', 60)
+        self.gatewayReadyDelay = globalSetting.getfloat('gatewayReadyDelay', 10)
+        self.appStartParallel = globalSetting.getboolean('appStartParallel', True)
+        self.failedGatewaySet = set()       # connect 出错的接口, 启动应用时不再等待
+        self.startupTimes = OrderedDict()   # 启动各阶段耗时(秒)
+
     def startAll(self):
+        """
+        启动事件引擎, 连接数据库, 同时连接全部接口,
+        各应用在所依赖的接口就绪后初始化并启动, 记录各阶段耗时
+        """
+        start = perf_counter()
         self.eventEngine.start()
         self.dbConnect()
+        self.recordPhase('数据库', start)
+
+        phaseStart = perf_counter()
         self.connectGateway()
-        sleep(10) # 等待接口初始化
-        self.runApp()
+        self.recordPhase('接口连接', phaseStart)
+
+        phaseStart = perf_counter()
+        self.startApps(start + self.gatewayReadyTimeout)
+        self.recordPhase('应用启动', phaseStart)
+        self.recordPhase('启动合计', start)
+
+    def recordPhase(self, phase, start):
+        seconds = perf_counter() - start
+        self.startupTimes[phase] = seconds
+        self.writeLog('启动阶段 {phase} 耗时 {t:.2f} 秒'.format(phase=phase, t=seconds))
 
     def addGateway(self, gatewayModule):
         gatewayName = gatewayModule.gatewayName
@@ -87,10 +145,81 @@ class MainEngine(LoggingMixin):
     def connectGateway(self, gatewayName=None):
         # connect all gateways if not specified
         if not gatewayName:
+            # 各接口在单独的线程中同时连接, 全部 connect 返回后本函数返回
+            threads = []
             for k in self.gatewayDict.keys():
-                self.gatewayDict[k].connect()
+                thread = Thread(target=self.connectOneGateway, args=(self.gatewayDict[k],),
+                                name='Connect' + k)
+                thread.start()
+                threads.append(thread)
+            for thread in threads:
+                thread.join()
         else:
-            self.getGateway(gatewayName).connect()
+            self.connectOneGateway(self.getGateway(gatewayName))
+
+    def connectOneGateway(self, gateway):
+        start = perf_counter()
+        try:
+            gateway.connect()
+        except Exception:
+            self.failedGatewaySet.add(gateway.gatewayName)
+            self.log.error('接口 {gw} 连接出错:\n{tb}'.format(
+                gw=gateway.gatewayName, tb=traceback.format_exc()))
+            return
+        self.writeLog('接口 {gw} connect 耗时 {t:.2f} 秒'.format(
+            gw=gateway.gatewayName, t=perf_counter() - start))
+
+        # 不发出就绪通知的接口, 等待固定时间后视为就绪
+        if not gateway.signalsReady:
+            timer = Timer(self.gatewayReadyDelay, gateway.onReady)
+            timer.daemon = True
+            timer.start()
+
+    def startApps(self, deadline):
+        """
+        各应用在单独的线程中等待所依赖的接口就绪, 然后初始化并启动;
+        接口在 deadline(perf_counter 时间)前仍未就绪时记录警告并继续
+        """
+        if not self.appStartParallel:
+            for appName, appEngine in self.appDict.items():
+                self.startOneApp(appName, appEngine, deadline)
+            return
+
+        threads = []
+        for appName, appEngine in self.appDict.items():
+            thread = Thread(target=self.startOneApp, args=(appName, appEngine, deadline),
+                            name='Start' + appName)
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+
+    def startOneApp(self, appName, appEngine, deadline):
+        start = perf_counter()
+        try:
+            gatewayNames = appEngine.getGatewayNames()
+            if gatewayNames is None:
+                gatewayNames = list(self.gatewayDict.keys())
+
+            for gatewayName in gatewayNames:
+                gateway = self.gatewayDict.get(gatewayName)
+                if gateway is None or gatewayName in self.failedGatewaySet:
+                    continue
+                if not gateway.waitReady(max(0, deadline - perf_counter())):
+                    self.log.warning('接口 {gw} 未在 {t:.0f} 秒内就绪, 继续初始化应用 {app}'.format(
+                        gw=gatewayName, t=self.gatewayReadyTimeout, app=appName))
+            waited = perf_counter()
+
+            appEngine.initAll()
+            inited = perf_counter()
+            appEngine.startAll()
+        except Exception:
+            self.log.error('应用 {app} 启动出错:\n{tb}'.format(app=appName, tb=traceback.format_exc()))
+            return
+        end = perf_counter()
+        self.startupTimes[appName] = end - start
+        self.writeLog('应用 {app} 等待接口 {w:.2f} 秒, 初始化 {i:.2f} 秒, 启动 {s:.2f} 秒'.format(
+            app=appName, w=waited - start, i=inited - waited, s=end - inited))
 
     def runApp(self, appName=None):
         # run all apps if not specified
@@ -104,6 +233,24 @@ class MainEngine(LoggingMixin):
             kapp.initAll()
             kapp.startAll()
 
+    def replayJournal(self, paths, speed=1.0):
+        """
+        离线重放事件日志, 代替 startAll 使用: 先 addApp, 再调用本函数
+        事件引擎不启动自己的计时器, EVENT_TIMER 由日志重放
+        speed: 1 为原始速度, N 为 N 倍速, None 为尽快重放
+        重放的事件不再写入事件日志
+        """
+        from vnpy.utility.eventJournal import JournalReplayer
+
+        if self.eventJournal:
+            self.eventJournal.unregister(self.eventEngine)
+            self.eventJournal.close()
+            self.eventJournal = None
+
+        self.eventEngine.start(timer=False)
+        self.runApp()
+        return JournalReplayer(self, speed).replay(paths)
+
     def getGateway(self, gatewayName):
         try:
             return self.gatewayDict[gatewayName]
@@ -121,9 +268,28 @@ class MainEngine(LoggingMixin):
     def registerEvent(self, type, handler):
         self.eventEngine.registerEvent(type, handler)
 
+    def registerConflatedEvent(self, type, handler, keyFunc=None):
+        """注册只需要最新数据的处理函数, 同一合约的积压事件只推送最新一条"""
+        self.eventEngine.registerConflatedEvent(type, handler, keyFunc)
+
+    def unregisterConflatedEvent(self, type, handler):
+        self.eventEngine.unregisterConflatedEvent(type, handler)
+
     def putEvent(self, event):
         self.eventEngine.putEvent(event)
 
+    def putDerivedEvent(self, event):
+        """在事件处理函数中发布派生事件, 监听函数立即在当前线程中调用"""
+        self.eventEngine.putDerivedEvent(event)
+
+    def scheduleTimer(self, delay, handler, interval=None):
+        """注册计时器(秒), interval 为 None 时只触发一次, 返回计时器编号"""
+        return self.eventEngine.scheduleTimer(delay, handler, interval)
+
+    def cancelTimer(self, timerId):
+        """撤销计时器"""
+        return self.eventEngine.cancelTimer(timerId)
+
     def subscribe(self, subscribeReq, gatewayName):
         # 待删除
         gateway = self.getGateway(gatewayName)
@@ -185,66 +351,84 @@ class MainEngine(LoggingMixin):
             gateway.qryPosition()
 
     def dbConnect(self):
-        """连接MongoDB数据库"""
-        if not self.dbClient:
-            try:
-                # 设置MongoDB操作的超时时间为0.5秒
-                self.dbClient = MongoClient(globalSetting['mongoHost'], int(globalSetting['mongoPort']), serverSelectionTimeoutMS=10)
-
-                # 调用server_info查询服务器状态，防止服务器异常并未连接成功
-                self.dbClient.server_info()
-
-                self.writeLog('MongoDB连接成功')
-
-            except ConnectionFailure:
-                self.dbClient = None
-                self.writeLog('MongoDB连接失败')
+        """连接数据库, 后端由 vtcmd.ini 的 dbBackend 选择"""
+        if not self.dbBackend:
+            backend = createBackend()
+            if not backend.connect():
+                self.writeLog('数据库({name})连接失败'.format(name=backend.name))
+                return
+            self.dbBackend = backend
+            self.writeLog('数据库({name})连接成功'.format(name=backend.name))
+
+            if globalSetting.getboolean('dbWriteBehind', False):
+                from vnpy.utility.dbWriter import WriteBehindWriter
+                self.dbWriter = WriteBehindWriter(
+                    backend,
+                    batchSize=globalSetting.getint('dbWriteBatchSize', 1000),
+                    flushInterval=globalSetting.getfloat('dbWriteFlushInterval', 1.0),
+                    maxPending=globalSetting.getint('dbWriteMaxPending', 100000))
 
     def dbInsert(self, dbName, collectionName, d):
-        """向MongoDB中插入数据，d是具体数据"""
-        if self.dbClient:
-            db = self.dbClient[dbName]
-            collection = db[collectionName]
-            collection.insert_one(d)
+        """向数据库中插入数据，d是具体数据, 启用批量写入时只放入缓冲区"""
+        if self.dbWriter:
+            self.dbWriter.insert(dbName, collectionName, d)
+        elif self.dbBackend:
+            self.dbBackend.insert(dbName, collectionName, d)
         else:
-            self.writeLog('数据插入失败, MongoDB没有连接')
+            self.writeLog('数据插入失败, 数据库没有连接')
 
     def dbQuery(self, dbName, collectionName, d, sortKey='', sortDirection=ASCENDING):
-        """从MongoDB中读取数据，d是查询要求，返回的是数据库查询的指针"""
-        if self.dbClient:
-            db = self.dbClient[dbName]
-            collection = db[collectionName]
-
-            if sortKey:
-                cursor = collection.find(d).sort(sortKey, sortDirection)    # 对查询出来的数据进行排序
-            else:
-                cursor = collection.find(d)
-
-            if cursor:
-                return list(cursor)
-            else:
-                return []
+        """从数据库中读取数据，d是查询要求，返回数据字典的列表"""
+        if self.dbBackend:
+            if self.dbWriter:
+                self.dbWriter.flush(dbName, collectionName)
+            return self.dbBackend.query(dbName, collectionName, d, sortKey, sortDirection)
         else:
-            self.writeLog('数据查询失败, MongoDB没有连接')
+            self.writeLog('数据查询失败, 数据库没有连接')
             return []
 
+    def dbQueryIter(self, dbName, collectionName, d, sortKey='', sortDirection=ASCENDING,
+                    projection=None, batchSize=1000, batchClass=None):
+        """
+        按批从数据库读取, 逐条返回数据字典, 不一次载入全部结果
+        projection 为需要的字段名列表; batchClass 为 TickBatch/BarBatch 时,
+        逐段返回按列存储的容器, 每段最多 batchSize 条
+        """
+        if not self.dbBackend:
+            self.writeLog('数据查询失败, 数据库没有连接')
+            return iter([])
+
+        if self.dbWriter:
+            self.dbWriter.flush(dbName, collectionName)
+        records = self.dbBackend.queryIter(dbName, collectionName, d, sortKey, sortDirection,
+                                           projection, batchSize)
+        if batchClass is not None:
+            return batchClass.iterFromRecords(records, batchSize)
+        return records
+
     def dbUpdate(self, dbName, collectionName, d, flt, upsert=False):
-        """向MongoDB中更新数据，d是具体数据，flt是过滤条件，upsert代表若无是否要插入"""
-        if self.dbClient:
-            db = self.dbClient[dbName]
-            collection = db[collectionName]
-            collection.replace_one(flt, d, upsert)
+        """向数据库中更新数据，d是具体数据，flt是过滤条件，upsert代表若无是否要插入"""
+        if self.dbWriter:
+            self.dbWriter.replace(dbName, collectionName, d, flt, upsert)
+        elif self.dbBackend:
+            self.dbBackend.replace(dbName, collectionName, d, flt, upsert)
         else:
-            self.writeLog('数据更新失败, MongoDB没有连接')
+            self.writeLog('数据更新失败, 数据库没有连接')
 
     def dbDelete(self, dbName, collectionName, flt):
         """从数据库中删除数据，flt是过滤条件"""
-        if self.dbClient:
-            db = self.dbClient[dbName]
-            collection = db[collectionName]
-            collection.delete_one(flt)
+        if self.dbBackend:
+            if self.dbWriter:
+                self.dbWriter.flush(dbName, collectionName)
+            self.dbBackend.delete(dbName, collectionName, flt)
         else:
-            self.writeLog('数据删除失败, MongoDB没有连接')
+            self.writeLog('数据删除失败, 数据库没有连接')
+
+    def getDbWriterStats(self):
+        """批量写入的运行统计, 未启用时返回空字典"""
+        if self.dbWriter:
+            return self.dbWriter.getStats()
+        return {}
 
     def getTick(self, vtSymbol):
         """查询行情"""
@@ -270,6 +454,18 @@ class MainEngine(LoggingMixin):
         """查询所有的活跃的委托（返回列表）"""
         return self.dataEngine.getAllWorkingOrders()
 
+    def getWorkingOrderCount(self, **conditions):
+        """活动委托数量, 可按 gatewayName, vtSymbol, strategyName 过滤"""
+        return self.dataEngine.getWorkingOrderCount(**conditions)
+
+    def getWorkingOrders(self, **conditions):
+        """按 gatewayName, vtSymbol, strategyName 查询活动委托"""
+        return self.dataEngine.getWorkingOrders(**conditions)
+
+    def getSnapshot(self):
+        """数据引擎最近发布的只读快照(持仓, 资金, 活动委托, 最新行情), 不需要加锁"""
+        return self.dataEngine.getSnapshot()
+
     def getAllOrders(self):
         """查询所有委托"""
         return self.dataEngine.getAllOrders()
@@ -278,6 +474,14 @@ class MainEngine(LoggingMixin):
         """查询所有成交"""
         return self.dataEngine.getAllTrades()
 
+    def queryOrders(self, includeSpilled=False, **conditions):
+        """按合约, 接口, 策略, 状态查询委托"""
+        return self.dataEngine.queryOrders(includeSpilled, **conditions)
+
+    def queryTrades(self, includeSpilled=False, **conditions):
+        """按合约, 接口, 策略, 委托号查询成交"""
+        return self.dataEngine.queryTrades(includeSpilled, **conditions)
+
     def getAllAccounts(self):
         """查询所有账户"""
         return self.dataEngine.getAllAccounts()
@@ -290,6 +494,18 @@ class MainEngine(LoggingMixin):
         """查询本地持仓缓存细节"""
         return self.dataEngine.getAllPositionDetails()
 
+    def getEventEngineStats(self):
+        """查询事件引擎运行统计（未开启时返回None）"""
+        return self.eventEngine.getStats()
+
+    def getConflationStats(self):
+        """查询合并推送订阅者的丢弃统计"""
+        return self.eventEngine.getConflationStats()
+
+    def getEventEngineOverloadStats(self):
+        """查询有界事件队列的积压及丢弃统计（未开启时返回None）"""
+        return self.eventEngine.getOverloadStats()
+
     def getAllGatewayDetails(self):
         """查询引擎中所有底层接口的信息"""
         return self.gatewayDetailList
@@ -311,10 +527,28 @@ class MainEngine(LoggingMixin):
         # 停止事件引擎
         self.eventEngine.stop()
 
+        # 删除共享内存事件总线
+        if self.busPublisher:
+            self.busPublisher.close()
+
+        # 写完并关闭事件日志
+        if self.eventJournal:
+            self.eventJournal.close()
+
         # 停止上层应用引擎
         for appEngine in self.appDict.values():
             appEngine.stop()
 
+        # 写完缓冲中的数据库数据
+        if self.dbWriter:
+            self.dbWriter.close()
+            self.log.info('数据库批量写入统计: {stats}'.format(stats=self.dbWriter.getStats()))
+        if self.dbBackend:
+            self.dbBackend.close()
+
+        # 保存本次收到的合约, 关闭委托和成交的转存文件
+        self.dataEngine.close()
+
     def writeLog(self, content):
         self.log.info(content)
 
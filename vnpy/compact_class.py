@@ -0,0 +1,438 @@
+# encoding: UTF-8
+
+"""
+基于 __slots__ 的紧凑数据类, 与 base_class 中的同名类属性完全兼容
+
+每个实例没有 __dict__ 和 LoggingMixin, 填满五档的 TickData 占用内存不到 base_class
+版本的一半; 五档行情保存在定长数组中, bidPrice1 等仍可照常读写, 但读取比普通属性慢,
+频繁读取的策略可以直接使用 depthPrices/depthVolumes.
+copy() 使用按字段展开生成的 __copy__, 比 base_class 版本快数倍, 适合 gateway
+对每次更新复制一份行情推送的用法.
+
+__dict__ 为快照属性, 返回与 base_class 版本相同键值的 dict, 因此
+dbInsert(data.__dict__) 等持久化代码无需修改; 对 __dict__ 赋值时忽略多余的
+键(如 Mongo 的 _id), 从数据库载入的 data.__dict__ = d 同样可用.
+修改快照 dict 不会影响对象本身.
+
+createFromGateway 等构造方法与 base_class 共用同一实现, 创建的是紧凑类的实例.
+"""
+
+from array import array
+from operator import attrgetter
+
+from vnpy.vtConstant import C_ORDER_STATUS as OSTA
+from vnpy import base_class
+from vnpy.base_class import nsToDatetime, datetimeToNs, parseDateTime
+from vnpy.utility.instrumentRegistry import instrumentRegistry
+
+
+# 尚未计算的时间属性
+UNSET = object()
+
+# 五档行情在数组中的位置
+DEPTH_LEVELS = 5
+BID_OFFSET = 0
+ASK_OFFSET = DEPTH_LEVELS
+
+
+def priceProperty(index):
+    """把价格数组中的一个元素映射为属性, 如 bidPrice1 -> depthPrices[0]"""
+    def fget(self):
+        return self.depthPrices[index]
+
+    def fset(self, value):
+        self.depthPrices[index] = value
+
+    return property(fget, fset)
+
+
+def volumeProperty(index):
+    """把数量列表中的一个元素映射为属性, 如 bidVolume1 -> depthVolumes[0]"""
+    def fget(self):
+        return self.depthVolumes[index]
+
+    def fset(self, value):
+        self.depthVolumes[index] = value
+
+    return property(fget, fset)
+
+
+def compileCopy(cls):
+    """
+    生成逐字段赋值的 __copy__, 比循环 setattr 快得多
+    cls.copiedSlots 中的数组及列表字段复制一份, 其余字段直接引用
+    """
+    lines = ['def __copy__(self):', '    new = _new(_cls)']
+    for name in cls.slotNames:
+        if name in cls.copiedSlots:
+            lines.append('    new.{n} = self.{n}[:]'.format(n=name))
+        else:
+            lines.append('    new.{n} = self.{n}'.format(n=name))
+    lines.append('    return new')
+
+    namespace = {'_new': object.__new__, '_cls': cls}
+    exec('\n'.join(lines), namespace)
+    return namespace['__copy__']
+
+
+def instrumentIdProperty():
+    """合约编号, 与 base_class.InstrumentIdField 相同, 首次读取后缓存在 _iid 中"""
+    register = instrumentRegistry.register
+
+    def getInstrumentId(self):
+        iid = self._iid
+        if iid is None:
+            iid = self._iid = register(self.vtSymbol)
+        return iid
+
+    def setInstrumentId(self, iid):
+        self._iid = iid
+    return property(getInstrumentId, setInstrumentId)
+
+
+class CompactData(object):
+    """
+    紧凑数据类的基础类
+    子类在 fields 中列出与 base_class 版本 __dict__ 相同顺序的属性名,
+    定义完成后调用 compactClass 生成辅助属性
+    """
+    __slots__ = ('gatewayName', 'rawData', '_iid')
+
+    fields = ()
+    lazyFields = ()
+    slotNames = ()
+    copiedSlots = ()
+    fieldSet = frozenset()
+    fieldGetter = None
+
+    def __init__(self):
+        self.gatewayName = ''         # Gateway名称
+        self.rawData = None           # 原始数据
+        self._iid = None              # 合约编号缓存
+
+    def getFields(self):
+        """__dict__ 快照, 子类可以覆盖"""
+        return dict(zip(self.fields, self.fieldGetter(self)))
+
+    def setFields(self, d):
+        fieldSet = self.fieldSet
+        for name, value in d.items():
+            if name in fieldSet:
+                setattr(self, name, value)
+
+    __dict__ = property(lambda self: self.getFields(), lambda self, d: self.setFields(d))
+
+    def toDict(self):
+        """用于持久化的字段字典(写入数据库, 日志等)"""
+        return self.getFields()
+
+    @classmethod
+    def fromDict(cls, d):
+        """由持久化的字段字典还原数据对象"""
+        data = cls()
+        data.setFields(d)
+        return data
+
+    def __getstate__(self):
+        return self.__dict__
+
+    def __setstate__(self, state):
+        self.__init__()
+        self.__dict__ = state
+
+
+def compactClass(cls):
+    """类装饰器: 根据 fields 和 __slots__ 生成 __copy__ 等辅助属性"""
+    slotNames = []
+    for klass in reversed(cls.__mro__):
+        for name in klass.__dict__.get('__slots__', ()):
+            slotNames.append(name)
+
+    cls.slotNames = tuple(slotNames)
+    cls.fieldSet = frozenset(cls.fields + cls.lazyFields)
+    cls.fieldGetter = attrgetter(*cls.fields)
+    cls.__copy__ = compileCopy(cls)
+    return cls
+
+
+class CompactTimestampData(CompactData):
+    """
+    带时间戳的紧凑数据类, 与 base_class.TimestampData 相同:
+    timestampNs 为唯一的时间来源, datetime/date/time 首次读取时计算并缓存,
+    __dict__ 中只包含已经计算或赋值过的时间属性
+    """
+    __slots__ = ('timestampNs', '_datetime', '_date', '_time', 'instrumentId')
+
+    lazyFields = ('datetime', 'date', 'time')
+
+    def __init__(self):
+        super(CompactTimestampData, self).__init__()
+        self.timestampNs = 0            # epoch 纳秒时间戳
+        self.instrumentId = None        # 合约编号, 同 base_class.TickData
+        self._datetime = UNSET
+        self._date = UNSET
+        self._time = UNSET
+
+    def getFields(self):
+        d = dict(zip(self.fields, self.fieldGetter(self)))
+        if self._datetime is not UNSET:
+            d['datetime'] = self._datetime
+        if self._date is not UNSET:
+            d['date'] = self._date
+        if self._time is not UNSET:
+            d['time'] = self._time
+        return d
+
+    def setFields(self, d):
+        """datetime/date/time 直接写入缓存, 与 base_class 版本对 __dict__ 赋值相同, 不更新 timestampNs"""
+        fieldSet = self.fieldSet
+        lazyFields = self.lazyFields
+        for name, value in d.items():
+            if name in lazyFields:
+                setattr(self, '_' + name, value)
+            elif name in fieldSet:
+                setattr(self, name, value)
+
+    @property
+    def datetime(self):
+        dt = self._datetime
+        if dt is UNSET:
+            date = self._date
+            time = self._time
+            if self.timestampNs:
+                dt = nsToDatetime(self.timestampNs)
+            elif date is not UNSET and time is not UNSET and date and time:
+                dt = parseDateTime(date, time)
+            else:
+                dt = None
+            self._datetime = dt
+        return dt
+
+    @datetime.setter
+    def datetime(self, value):
+        self.setDatetime(value)
+
+    @property
+    def date(self):
+        date = self._date
+        if date is UNSET:
+            dt = self.datetime
+            date = '' if dt is None else '%04d%02d%02d' % (dt.year, dt.month, dt.day)
+            self._date = date
+        return date
+
+    @date.setter
+    def date(self, value):
+        self._date = value
+
+    @property
+    def time(self):
+        time = self._time
+        if time is UNSET:
+            dt = self.datetime
+            time = '' if dt is None else '%02d:%02d:%02d.%06d' % (
+                dt.hour, dt.minute, dt.second, dt.microsecond)
+            self._time = time
+        return time
+
+    @time.setter
+    def time(self, value):
+        self._time = value
+
+    def setTimestampNs(self, ns):
+        """更新时间戳并清除已缓存的 datetime/date/time"""
+        self.timestampNs = ns
+        self._datetime = UNSET
+        self._date = UNSET
+        self._time = UNSET
+
+    def setDatetime(self, dt):
+        """按 datetime 更新时间戳, 直接对 datetime 赋值时同样调用, 规则同 base_class.TimestampData"""
+        ns = self.timestampNs
+        if ns or not self._date:
+            self._date = UNSET
+        if ns or not self._time:
+            self._time = UNSET
+        self.timestampNs = datetimeToNs(dt) if dt is not None else 0
+        self._datetime = dt
+
+    def toDict(self):
+        """持久化时补全 datetime/date/time, 与原有数据库中的字段一致"""
+        d = self.getFields()
+        d['datetime'] = self.datetime
+        d['date'] = self.date
+        d['time'] = self.time
+        return d
+
+    @classmethod
+    def fromDict(cls, d):
+        """数据库中的数据没有 timestampNs 时由 datetime 计算"""
+        data = cls()
+        data.setFields(d)
+        if not data.timestampNs and data._datetime not in (UNSET, None):
+            data.timestampNs = datetimeToNs(data._datetime)
+        return data
+
+
+@compactClass
+class TickData(CompactTimestampData):
+    """Tick行情数据类"""
+
+    __slots__ = ('symbol', 'exchange', 'vtSymbol',
+                 'lastPrice', 'lastVolume', 'volume', 'openInterest',
+                 'openPrice', 'highPrice', 'lowPrice', 'preClosePrice',
+                 'upperLimit', 'lowerLimit',
+                 'depthPrices', 'depthVolumes')
+
+    fields = ('gatewayName', 'rawData', 'timestampNs', 'symbol', 'exchange', 'vtSymbol',
+              'lastPrice', 'lastVolume', 'volume', 'openInterest',
+              'openPrice', 'highPrice', 'lowPrice', 'preClosePrice',
+              'upperLimit', 'lowerLimit') + \
+        tuple(['bidPrice%d' % n for n in range(1, DEPTH_LEVELS + 1)]) + \
+        tuple(['askPrice%d' % n for n in range(1, DEPTH_LEVELS + 1)]) + \
+        tuple(['bidVolume%d' % n for n in range(1, DEPTH_LEVELS + 1)]) + \
+        tuple(['askVolume%d' % n for n in range(1, DEPTH_LEVELS + 1)])
+    copiedSlots = ('depthPrices', 'depthVolumes')
+
+    def __init__(self):
+        super(TickData, self).__init__()
+
+        # 代码相关
+        self.symbol = ''              # 合约代码
+        self.exchange = ''            # 交易所代码
+        self.vtSymbol = ''            # 合约在vt系统中的唯一代码，通常是 合约代码.交易所代码
+
+        # 成交数据
+        self.lastPrice = 0.0            # 最新成交价
+        self.lastVolume = 0             # 最新成交量
+        self.volume = 0                 # 今天总成交量
+        self.openInterest = 0           # 持仓量
+
+        # 常规行情
+        self.openPrice = 0.0            # 今日开盘价
+        self.highPrice = 0.0            # 今日最高价
+        self.lowPrice = 0.0             # 今日最低价
+        self.preClosePrice = 0.0
+
+        self.upperLimit = 0.0           # 涨停价
+        self.lowerLimit = 0.0           # 跌停价
+
+        # 五档行情, 买一至买五, 卖一至卖五
+        # 价格为浮点数组; 数量保留原始类型(期货为整数, 数字货币为浮点数)
+        self.depthPrices = array('d', [0.0] * DEPTH_LEVELS * 2)
+        self.depthVolumes = [0] * DEPTH_LEVELS * 2
+
+    createFromGateway = base_class.TickData.__dict__['createFromGateway']
+
+
+for n in range(DEPTH_LEVELS):
+    setattr(TickData, 'bidPrice%d' % (n + 1), priceProperty(BID_OFFSET + n))
+    setattr(TickData, 'askPrice%d' % (n + 1), priceProperty(ASK_OFFSET + n))
+    setattr(TickData, 'bidVolume%d' % (n + 1), volumeProperty(BID_OFFSET + n))
+    setattr(TickData, 'askVolume%d' % (n + 1), volumeProperty(ASK_OFFSET + n))
+
+
+@compactClass
+class BarData(CompactTimestampData):
+    """K线数据"""
+
+    __slots__ = ('vtSymbol', 'symbol', 'exchange',
+                 'open', 'high', 'low', 'close',
+                 'volume', 'openInterest', 'interval')
+
+    fields = ('gatewayName', 'rawData', 'timestampNs') + __slots__
+
+    def __init__(self):
+        super(BarData, self).__init__()
+
+        self.vtSymbol = ''        # vt系统代码
+        self.symbol = ''          # 代码
+        self.exchange = ''        # 交易所
+
+        self.open = 0.0             # OHLC
+        self.high = 0.0
+        self.low = 0.0
+        self.close = 0.0
+
+        self.volume = 0             # 成交量
+        self.openInterest = 0       # 持仓量
+        self.interval = ''       # K线周期
+
+
+@compactClass
+class TradeData(CompactData):
+    """
+    成交数据类
+    一般来说，一个OrderData可能对应多个TradeData：一个订单可能多次部分成交
+    """
+    instrumentId = instrumentIdProperty()     # 合约编号
+
+    __slots__ = ('symbol', 'exchange', 'vtSymbol',
+                 'tradeID', 'vtTradeID', 'orderID', 'vtOrderID',
+                 'direction', 'offset', 'price', 'volume', 'tradeTime')
+
+    fields = ('gatewayName', 'rawData') + __slots__
+
+    def __init__(self):
+        super(TradeData, self).__init__()
+
+        # 代码编号相关
+        self.symbol = ''              # 合约代码
+        self.exchange = ''            # 交易所代码
+        self.vtSymbol = ''            # 合约在vt系统中的唯一代码，通常是 合约代码.交易所代码
+
+        self.tradeID = ''  # 成交编号 gateway内部自己生成的编号
+        self.vtTradeID = ''           # 成交在vt系统中的唯一编号，通常是 Gateway名.成交编号
+
+        self.orderID = ''             # 订单编号
+        self.vtOrderID = ''           # 订单在vt系统中的唯一编号，通常是 Gateway名.订单编号
+
+        # 成交相关
+        self.direction = ''          # 成交方向
+        self.offset = ''             # 成交开平仓
+        self.price = 0.0                # 成交价格
+        self.volume = 0                 # 成交数量
+        self.tradeTime = ''           # 成交时间
+
+    createFromGateway = base_class.TradeData.__dict__['createFromGateway']
+    createFromOrderData = base_class.TradeData.__dict__['createFromOrderData']
+
+
+@compactClass
+class OrderData(CompactData):
+    """订单数据类"""
+    instrumentId = instrumentIdProperty()     # 合约编号
+
+    __slots__ = ('symbol', 'exchange', 'vtSymbol', 'orderID', 'vtOrderID',
+                 'direction', 'offset', 'price', 'totalVolume', 'tradedVolume', 'status',
+                 'orderTime', 'cancelTime', 'frontID', 'sessionID')
+
+    fields = ('gatewayName', 'rawData') + __slots__
+
+    def __init__(self):
+        super(OrderData, self).__init__()
+
+        # 代码编号相关
+        self.symbol = ''              # 合约代码
+        self.exchange = ''            # 交易所代码
+        self.vtSymbol = ''  # 索引，统一格式：f"{symbol}.{exchange}"
+
+        self.orderID = ''             # 订单编号 gateway内部自己生成的编号
+        self.vtOrderID = ''  # 索引，统一格式：f"{gatewayName}.{orderId}"
+
+        # 报单相关
+        self.direction = ''          # 报单方向
+        self.offset = ''             # 报单开平仓
+        self.price = 0.0                # 报单价格
+        self.totalVolume = 0            # 报单总数量
+        self.tradedVolume = 0           # 报单成交数量
+        self.status = OSTA.STATUS_UNKNOWN             # 报单状态
+
+        self.orderTime = ''           # 发单时间
+        self.cancelTime = ''          # 撤单时间
+
+        # CTP/LTS相关
+        self.frontID = 0                # 前置机编号
+        self.sessionID = 0              # 连接编号
+
+    createFromGateway = base_class.OrderData.__dict__['createFromGateway']
@@ -1,6 +1,7 @@
 # encoding: UTF-8
 
 import time
+from threading import Event as ReadyEvent
 
 from vnpy.vtConstant import C_EVENT
 from vnpy.base_class import Event
@@ -11,71 +12,50 @@ class BaseGateway(LoggingMixin):
     """
     交易接口
     在接口里 mainEngine 和 eventEngine 是可以相互替换的
+
+    登录完成且合约查询完毕后, 接口调用 onReady 通知主引擎可以初始化应用;
+    signalsReady 为 False 的接口不发出通知, 由主引擎在 connect 返回后等待固定时间视为就绪.
+
+    onReady 与合约信息一样以事件推送, 就绪事件排在之前推送的全部合约事件之后处理,
+    因此 waitReady 返回时 DataEngine 已经保存了全部合约.
     """
+    signalsReady = False
 
     def __init__(self, mainEngine, gatewayName):
         self.mainEngine = mainEngine
         self.gatewayName = gatewayName
+        self.readyEvent = ReadyEvent()
+        mainEngine.registerEvent(C_EVENT.EVENT_GATEWAY_READY + gatewayName, self.processReadyEvent)
 
     def onTick(self, tick):
-        """市场行情推送"""
-        # 通用事件
-        event1 = Event(type_=C_EVENT.EVENT_TICK)
-        event1.dict_['data'] = tick
-        self.mainEngine.putEvent(event1)
-
-        # 特定合约代码的事件
-        event2 = Event(type_=C_EVENT.EVENT_TICK+tick.vtSymbol)
-        event2.dict_['data'] = tick
-        self.mainEngine.putEvent(event2)
+        """市场行情推送, 同时分发给通用和特定合约代码的监听函数"""
+        event = Event(type_=C_EVENT.EVENT_TICK, key=tick.vtSymbol)
+        event.dict_['data'] = tick
+        self.mainEngine.putEvent(event)
 
     def onTrade(self, trade):
-        """成交信息推送"""
-        # 通用事件
-        event1 = Event(type_=C_EVENT.EVENT_TRADE)
-        event1.dict_['data'] = trade
-        self.mainEngine.putEvent(event1)
-
-        # 特定合约的成交事件
-        event2 = Event(type_=C_EVENT.EVENT_TRADE+trade.vtSymbol)
-        event2.dict_['data'] = trade
-        self.mainEngine.putEvent(event2)
+        """成交信息推送, 同时分发给通用和特定合约的监听函数"""
+        event = Event(type_=C_EVENT.EVENT_TRADE, key=trade.vtSymbol)
+        event.dict_['data'] = trade
+        self.mainEngine.putEvent(event)
 
     def onOrder(self, order):
-        """订单变化推送"""
-        # 通用事件
-        event1 = Event(type_=C_EVENT.EVENT_ORDER)
-        event1.dict_['data'] = order
-        self.mainEngine.putEvent(event1)
-
-        # 特定订单编号的事件
-        event2 = Event(type_=C_EVENT.EVENT_ORDER+order.vtOrderID)
-        event2.dict_['data'] = order
-        self.mainEngine.putEvent(event2)
+        """订单变化推送, 同时分发给通用和特定订单编号的监听函数"""
+        event = Event(type_=C_EVENT.EVENT_ORDER, key=order.vtOrderID)
+        event.dict_['data'] = order
+        self.mainEngine.putEvent(event)
 
     def onPosition(self, position):
-        """持仓信息推送"""
-        # 通用事件
-        event1 = Event(type_=C_EVENT.EVENT_POSITION)
-        event1.dict_['data'] = position
-        self.mainEngine.putEvent(event1)
-
-        # 特定合约代码的事件
-        event2 = Event(type_=C_EVENT.EVENT_POSITION+position.vtSymbol)
-        event2.dict_['data'] = position
-        self.mainEngine.putEvent(event2)
+        """持仓信息推送, 同时分发给通用和特定合约代码的监听函数"""
+        event = Event(type_=C_EVENT.EVENT_POSITION, key=position.vtSymbol)
+        event.dict_['data'] = position
+        self.mainEngine.putEvent(event)
 
     def onAccount(self, account):
-        """账户信息推送"""
-        # 通用事件
-        event1 = Event(type_=C_EVENT.EVENT_ACCOUNT)
-        event1.dict_['data'] = account
-        self.mainEngine.putEvent(event1)
-
-        # 特定合约代码的事件
-        event2 = Event(type_=C_EVENT.EVENT_ACCOUNT+account.vtAccountID)
-        event2.dict_['data'] = account
-        self.mainEngine.putEvent(event2)
+        """账户信息推送, 同时分发给通用和特定账户的监听函数"""
+        event = Event(type_=C_EVENT.EVENT_ACCOUNT, key=account.vtAccountID)
+        event.dict_['data'] = account
+        self.mainEngine.putEvent(event)
 
     def onError(self, error):
         self.log.info('Error ' + error)
@@ -93,6 +73,25 @@ class BaseGateway(LoggingMixin):
         event.dict_['data'] = history
         self.mainEngine.putEvent(event)
 
+    def onReady(self):
+        """登录及合约查询完成, 在最后一条合约信息推送之后调用"""
+        event = Event(type_=C_EVENT.EVENT_GATEWAY_READY, key=self.gatewayName)
+        event.dict_['data'] = self.gatewayName
+        self.mainEngine.putEvent(event)
+
+    def processReadyEvent(self, event):
+        """就绪事件处理时之前的合约事件均已处理完毕"""
+        if not self.readyEvent.is_set():
+            self.readyEvent.set()
+            self.log.info('接口 {gw} 就绪'.format(gw=self.gatewayName))
+
+    def isReady(self):
+        return self.readyEvent.is_set()
+
+    def waitReady(self, timeout=None):
+        """等待接口就绪, 超时返回 False"""
+        return self.readyEvent.wait(timeout)
+
     def connect(self):
         """连接"""
         pass
@@ -25,6 +25,7 @@ from vnpy.api.rest import RestClient, Request
 from vnpy.api.websocket import WebsocketClient
 from vnpy.trader.vtGateway import *
 from vnpy.trader.vtFunction import getJsonPath, getTempPath
+from vnpy.compact_class import TickData as CompactTickData
 
 
 REST_HOST = 'https://www.bitmex.com/api/v1'
@@ -414,7 +415,7 @@ class BitmexWebsocketApi(WebsocketClient):
     #----------------------------------------------------------------------
     def subscribeMarketData(self, symbol):
         """订阅行情"""
-        tick = VtTickData()
+        tick = CompactTickData()     # 每次推送都复制一份, 使用紧凑数据类
         tick.gatewayName = self.gatewayName
         tick.symbol = symbol
         tick.exchange = EXCHANGE_BITMEX
@@ -13,7 +13,6 @@ import json
 from copy import copy
 from datetime import datetime, timedelta
 
-from vnpy.vtConstant import C_EVENT
 from vnpy.vtConstant import C_EXCHANGE as CEXC
 from vnpy.vtConstant import C_DIRECTION as CDIR
 from vnpy.vtConstant import C_OFFSET as COFF
@@ -93,12 +92,17 @@ statusMapReverse = {v:k for k,v in statusMap.items()}
 # 全局字典, key:symbol, value:exchange
 symbolExchangeDict = {}
 
+# 全局字典, key:symbol, value:合约编号(见 vnpy.utility.instrumentRegistry)
+symbolIdDict = {}
+
 # 夜盘交易时间段分隔判断
 NIGHT_TRADING = datetime(1900, 1, 1, 20).time()
 
 
 class ctpGateway(BaseGateway):
-    """CTP接口"""
+    """CTP接口, 交易服务器登录后合约查询完成时就绪"""
+    signalsReady = True
+
     def __init__(self, mainEngine, gatewayName='CTP'):
         super(ctpGateway, self).__init__(mainEngine, gatewayName)
 
@@ -109,6 +113,8 @@ class ctpGateway(BaseGateway):
         self.tdConnected = False        # 交易API连接状态
 
         self.qryEnabled = False         # 循环查询
+        self.qryInterval = 3            # 循环查询间隔(秒)
+        self.qryTimerId = None          # 循环查询计时器编号
 
     def connect(self):
         setting = gatewayconfig['CTP']
@@ -155,6 +161,10 @@ class ctpGateway(BaseGateway):
         self.tdApi.qryPosition()
 
     def close(self):
+        if self.qryTimerId is not None:
+            self.mainEngine.cancelTimer(self.qryTimerId)
+            self.qryTimerId = None
+
         if self.mdConnected:
             self.mdApi.close()
         if self.tdConnected:
@@ -162,30 +172,22 @@ class ctpGateway(BaseGateway):
 
     def startQuery(self):
         """启动连续查询"""
-        if self.qryEnabled:
+        if self.qryEnabled and self.qryTimerId is None:
             # 需要循环的查询函数列表
             self.qryFunctionList = [self.qryAccount, self.qryPosition]
-            self.qryCount = 0           # 查询触发倒计时
-            self.qryTrigger = 2         # 查询触发点
             self.qryNextFunction = 0    # 上次运行的查询函数索引
-            self.mainEngine.registerEvent(C_EVENT.EVENT_TIMER, self.query)
+            self.qryTimerId = self.mainEngine.scheduleTimer(
+                self.qryInterval, self.query, interval=self.qryInterval)
 
     def query(self, event):
-        """注册到事件处理引擎上的查询函数"""
-        self.qryCount += 1
-
-        if self.qryCount > self.qryTrigger:
-            # 清空倒计时
-            self.qryCount = 0
-
-            # 执行查询函数
-            function = self.qryFunctionList[self.qryNextFunction]
-            function()
+        """注册到计时器上的查询函数, 每 qryInterval 秒轮流执行一个查询"""
+        function = self.qryFunctionList[self.qryNextFunction]
+        function()
 
-            # 计算下次查询函数的索引，如果超过了列表长度，则重新设为0
-            self.qryNextFunction += 1
-            if self.qryNextFunction == len(self.qryFunctionList):
-                self.qryNextFunction = 0
+        # 计算下次查询函数的索引，如果超过了列表长度，则重新设为0
+        self.qryNextFunction += 1
+        if self.qryNextFunction == len(self.qryFunctionList):
+            self.qryNextFunction = 0
 
     def setQryEnabled(self, qryEnabled):
         """设置是否要启动循环查询"""
@@ -280,6 +282,7 @@ class CtpMdApi(MdApi, LoggingMixin):
         tick.symbol = symbol
         tick.exchange = symbolExchangeDict[tick.symbol]
         tick.vtSymbol = tick.symbol #'.'.join([tick.symbol, tick.exchange])
+        tick.instrumentId = symbolIdDict[symbol]
 
         tick.lastPrice = data['LastPrice']
         tick.volume = data['Volume']
@@ -733,11 +736,14 @@ class CtpTdApi(TdApi, LoggingMixin):
         # 推送
         self.gateway.onContract(contract)
 
-        # 缓存合约代码和交易所映射
+        # 缓存合约代码和交易所映射, 合约编号须先于交易所写入(行情推送以交易所判断合约是否已获取)
+        symbolIdDict[contract.symbol] = contract.instrumentId
         symbolExchangeDict[contract.symbol] = contract.exchange
 
         if last:
             self.log.info('交易合约信息获取完成')
+            # 就绪事件排在上面的合约事件之后, 处理时全部合约已保存到 DataEngine
+            self.gateway.onReady()
 
     def onRspQryDepthMarketData(self, data, error, n, last):
         """"""
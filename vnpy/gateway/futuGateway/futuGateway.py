@@ -20,6 +20,7 @@ from futu import (OpenQuoteContext, OpenHKTradeContext, OpenUSTradeContext,
 from vnpy.trader.vtGateway import *
 from vnpy.trader.vtConstant import GATEWAYTYPE_INTERNATIONAL
 from vnpy.trader.vtFunction import getJsonPath
+from vnpy.compact_class import TickData as CompactTickData
 
 
 # 调用一次datetime，保证初始化
@@ -419,7 +420,7 @@ class FutuGateway(VtGateway):
     
             tick = self.tickDict.get(symbol, None)
             if not tick:
-                tick = VtTickData()
+                tick = CompactTickData()     # 每次推送都复制一份, 使用紧凑数据类
                 tick.symbol = symbol
                 tick.vtSymbol = tick.symbol
                 tick.gatewayName = self.gatewayName
@@ -451,22 +452,21 @@ class FutuGateway(VtGateway):
     
         tick = self.tickDict.get(symbol, None)
         if not tick:
-            tick = VtTickData()
+            tick = CompactTickData()     # 每次推送都复制一份, 使用紧凑数据类
             tick.symbol = symbol
             tick.vtSymbol = tick.symbol
             tick.gatewayName = self.gatewayName
             self.tickDict[symbol] = tick
         
-        d = tick.__dict__
         for i in range(5):
             bidData = data['Bid'][i]
             askData = data['Ask'][i]
             n = i + 1
             
-            d['bidPrice%s' %n] = bidData[0]
-            d['bidVolume%s' %n] = bidData[1]
-            d['askPrice%s' %n] = askData[0]
-            d['askVolume%s' %n] = askData[1]
+            setattr(tick, 'bidPrice%s' %n, bidData[0])
+            setattr(tick, 'bidVolume%s' %n, bidData[1])
+            setattr(tick, 'askPrice%s' %n, askData[0])
+            setattr(tick, 'askVolume%s' %n, askData[1])
         
         if tick.datetime:
             newTick = copy(tick)
@@ -20,6 +20,7 @@ from vnpy.api.rest import Request, RestClient
 from vnpy.api.websocket import WebsocketClient
 from vnpy.trader.vtGateway import *
 from vnpy.trader.vtFunction import getTempPath, getJsonPath
+from vnpy.compact_class import TickData as CompactTickData
 
 REST_HOST = 'https://api.huobipro.com'
 WEBSOCKET_MARKET_HOST = 'wss://api.huobi.pro/ws'       # 行情
@@ -799,7 +800,7 @@ class HuobiMarketWebsocketApi(HuobiWebsocketApiBase):
         """
         for symbol in self.symbols:
             # 创建Tick对象
-            tick = VtTickData()
+            tick = CompactTickData()     # 每次推送都复制一份, 使用紧凑数据类
             tick.gatewayName = self.gatewayName
             tick.symbol = symbol
             tick.exchange = EXCHANGE_HUOBI
@@ -841,9 +842,7 @@ class HuobiMarketWebsocketApi(HuobiWebsocketApiBase):
         if not tick:
             return
 
-        tick.datetime = datetime.fromtimestamp(data['ts']/1000)
-        tick.date = tick.datetime.strftime('%Y%m%d')
-        tick.time = tick.datetime.strftime('%H:%M:%S.%f')
+        tick.setTimestampNs(data['ts'] * 1000000)
 
         bids = data['tick']['bids']
         for n in range(5):
@@ -870,9 +869,7 @@ class HuobiMarketWebsocketApi(HuobiWebsocketApiBase):
         if not tick:
             return
 
-        tick.datetime = datetime.fromtimestamp(data['ts']/1000)
-        tick.date = tick.datetime.strftime('%Y%m%d')
-        tick.time = tick.datetime.strftime('%H:%M:%S.%f')
+        tick.setTimestampNs(data['ts'] * 1000000)
 
         t = data['tick']
         tick.openPrice = float(t['open'])
@@ -0,0 +1,260 @@
+# encoding: UTF-8
+
+import sys
+import json
+import asyncio
+import traceback
+from datetime import datetime
+
+import aiohttp
+from typing import Any, Callable, Optional
+
+from vnpy.utility.asyncEventEngine import submitCoroutine
+from .RestClient import Request, RequestStatus
+
+
+########################################################################
+class AsyncResponse(object):
+    """
+    已读取完毕的 HTTP 返回, 提供 Request.__str__ 等处用到的 requests.Response 属性
+    """
+
+    #----------------------------------------------------------------------
+    def __init__(self, status_code, text, headers):
+        self.status_code = status_code  # type: int
+        self.text = text  # type: str
+        self.headers = headers  # type: dict
+
+    #----------------------------------------------------------------------
+    def json(self):
+        return json.loads(self.text)
+
+
+########################################################################
+class AsyncRestClient(object):
+    """
+    基于 asyncio 的 HTTP 客户端, 用法与 RestClient 相同
+
+    请求在 init 时传入的事件循环(通常是 AsyncEventEngine.loop)中发出,
+    不创建线程池, 同时进行中的请求数由 start(n) 限制; 多个客户端可以共用一个事件循环.
+    sign, callback, onFailed, onError 均在事件循环中调用, 不能执行阻塞操作.
+
+    addRequest 可在任意线程中调用.
+    """
+
+    #----------------------------------------------------------------------
+    def __init__(self):
+        """
+        """
+        self.urlBase = None  # type: str
+        self.loop = None  # type: asyncio.AbstractEventLoop
+        self._active = False
+
+        self._session = None  # type: aiohttp.ClientSession
+        self._semaphore = None  # type: asyncio.Semaphore
+        self._concurrency = 3
+        self._tasks = set()
+
+    #----------------------------------------------------------------------
+    def init(self, urlBase, loop):
+        """
+        初始化
+        :param urlBase: 路径前缀。 例如'https://www.bitmex.com/api/v1/'
+        :param loop: 运行请求的事件循环
+        """
+        self.urlBase = urlBase
+        self.loop = loop
+
+    #----------------------------------------------------------------------
+    async def _createSession(self):
+        """"""
+        return aiohttp.ClientSession()
+
+    #----------------------------------------------------------------------
+    def start(self, n=3):
+        """启动, n 为同时进行中的请求数上限"""
+        if self._active:
+            return
+
+        self._active = True
+        self._concurrency = n
+
+    #----------------------------------------------------------------------
+    def stop(self):
+        """
+        停止运行，尚未发出的请求不再发出
+        """
+        self._active = False
+        submitCoroutine(self.loop, self._close())
+
+    #----------------------------------------------------------------------
+    async def _close(self):
+        await self._join()
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        self._semaphore = None
+
+    #----------------------------------------------------------------------
+    def join(self, timeout=None):
+        """
+        等待所有请求处理结束, 不能在事件循环所在线程中调用
+        """
+        submitCoroutine(self.loop, self._join()).result(timeout)
+
+    #----------------------------------------------------------------------
+    async def _join(self):
+        while self._tasks:
+            await asyncio.wait(list(self._tasks))
+
+    #----------------------------------------------------------------------
+    def _inLoop(self):
+        try:
+            return asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            return False
+
+    #----------------------------------------------------------------------
+    def addRequest(self,
+                   method,          # type: str
+                   path,            # type: str
+                   callback,        # type: Callable[[dict, Request], Any]
+                   params=None,     # type: dict
+                   data=None,       # type: dict
+                   headers=None,    # type: dict
+                   onFailed=None,   # type: Callable[[int, Request], Any]
+                   onError=None,    # type: Callable[[type, Exception, traceback, Request], Any]
+                   extra=None       # type: Any
+                   ):               # type: (...)->Request
+        """
+        发送一个请求, 参数与 RestClient.addRequest 相同
+        :return: Request
+        """
+        request = Request(method, path, params, data, headers, callback)
+        request.extra = extra
+        request.onFailed = onFailed
+        request.onError = onError
+
+        if self._inLoop():
+            self._addTask(request)
+        else:
+            self.loop.call_soon_threadsafe(self._addTask, request)
+        return request
+
+    #----------------------------------------------------------------------
+    def _addTask(self, request):
+        task = self.loop.create_task(self._processRequest(request))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    #----------------------------------------------------------------------
+    def sign(self, request):  # type: (Request)->Request
+        """
+        所有请求在发送之前都会经过这个函数
+        签名之类的前奏可以在这里面实现
+        @:return (request)
+        """
+        return request
+
+    #----------------------------------------------------------------------
+    def onFailed(self, httpStatusCode, request):  # type:(int, Request)->None
+        """
+        请求失败处理函数（HttpStatusCode!=2xx）.
+        默认行为是打印到stderr
+        """
+        sys.stderr.write(str(request))
+
+    #----------------------------------------------------------------------
+    def onError(self,
+                exceptionType,  # type: type
+                exceptionValue, # type: Exception
+                tb,
+                request         # type: Optional[Request]
+                ):
+        """
+        Python内部错误处理：默认行为是打印到stderr
+        与 RestClient 不同, 不交给 sys.excepthook, 以免影响共用事件循环的其他连接
+        """
+        sys.stderr.write(self.exceptionDetail(exceptionType, exceptionValue, tb, request))
+
+    #----------------------------------------------------------------------
+    def exceptionDetail(self,
+                        exceptionType,  # type: type
+                        exceptionValue, # type: Exception
+                        tb,
+                        request         # type: Optional[Request]
+                        ):
+        text = "[{}]: Unhandled AsyncRestClient Error:{}\n".format(
+            datetime.now().isoformat(),
+            exceptionType
+        )
+        text += "request:{}\n".format(request)
+        text += "Exception trace: \n"
+        text += "".join(traceback.format_exception(
+            exceptionType,
+            exceptionValue,
+            tb,
+        ))
+        return text
+
+    #----------------------------------------------------------------------
+    async def _processRequest(self, request):  # type: (Request)->None
+        """
+        用于内部：将请求发送出去
+        """
+        # noinspection PyBroadException
+        try:
+            # session 和 semaphore 需要在事件循环中创建
+            if self._semaphore is None:
+                self._semaphore = asyncio.Semaphore(self._concurrency)
+            if self._session is None:
+                self._session = await self._createSession()
+
+            async with self._semaphore:
+                if not self._active:
+                    return
+
+                request = self.sign(request)
+                url = self.makeFullUrl(request.path)
+
+                async with self._session.request(request.method,
+                                                 url,
+                                                 headers=request.headers,
+                                                 params=request.params,
+                                                 data=request.data) as response:
+                    text = await response.text()
+                    request.response = AsyncResponse(response.status, text,
+                                                     dict(response.headers))
+
+            httpStatusCode = request.response.status_code
+            if httpStatusCode // 100 == 2:                              # 2xx都算成功，尽管交易所都用200
+                jsonBody = request.response.json()
+                request.callback(jsonBody, request)
+                request.status = RequestStatus.success
+            else:
+                request.status = RequestStatus.failed
+
+                if request.onFailed:
+                    request.onFailed(httpStatusCode, request)
+                else:
+                    self.onFailed(httpStatusCode, request)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            request.status = RequestStatus.error
+            t, v, tb = sys.exc_info()
+            if request.onError:
+                request.onError(t, v, tb, request)
+            else:
+                self.onError(t, v, tb, request)
+
+    #----------------------------------------------------------------------
+    def makeFullUrl(self, path):
+        """
+        将相对路径补充成绝对路径：
+        eg: makeFullUrl('/get') == 'http://xxxxx/get'
+        :param path:
+        :return:
+        """
+        url = self.urlBase + path
+        return url
@@ -3,7 +3,7 @@
 
 import sys
 import traceback
-from Queue import Empty, Queue
+from queue import Empty, Queue
 from datetime import datetime
 from multiprocessing.dummy import Pool
 
@@ -245,7 +245,7 @@ class RestClient(object):
             request.response = response
     
             httpStatusCode = response.status_code
-            if httpStatusCode / 100 == 2:                               # 2xx都算成功，尽管交易所都用200
+            if httpStatusCode // 100 == 2:                               # 2xx都算成功，尽管交易所都用200
                 jsonBody = response.json()
                 request.callback(jsonBody, request)
                 request.status = RequestStatus.success
@@ -1 +1,2 @@
 from .RestClient import Request, RequestStatus, RestClient
+from .AsyncRestClient import AsyncRestClient, AsyncResponse
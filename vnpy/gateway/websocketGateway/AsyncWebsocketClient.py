@@ -0,0 +1,234 @@
+# encoding: UTF-8
+
+import sys
+import json
+import asyncio
+import traceback
+from datetime import datetime
+
+import aiohttp
+
+from vnpy.utility.asyncEventEngine import submitCoroutine
+
+
+########################################################################
+class AsyncWebsocketClient(object):
+    """
+    基于 asyncio 的 Websocket API
+
+    用法与 WebsocketClient 相同: init 之后调用 start 开始连接, stop 断开,
+    可覆盖 onConnected, onDisconnected, onPacket, onError 回调.
+
+    区别在于不创建任何线程, 连接的收发都运行在 init 时传入的事件循环中
+    (通常是 AsyncEventEngine.loop), 多个客户端可以共用一个事件循环;
+    回调函数也在该事件循环中调用, 不能在回调中执行阻塞操作.
+
+    sendPacket, sendText, sendBinary, start, stop 可在任意线程中调用.
+
+    关于ping：
+    连接成功后每 pingInterval 秒自动发送一个ping帧, 断线后每
+    reconnectInterval 秒重连一次.
+    """
+    pingInterval = 60
+    reconnectInterval = 5
+
+    #----------------------------------------------------------------------
+    def __init__(self):
+        """Constructor"""
+        self.host = None  # type: str
+        self.loop = None  # type: asyncio.AbstractEventLoop
+
+        self._ws = None  # type: aiohttp.ClientWebSocketResponse
+        self._session = None  # type: aiohttp.ClientSession
+        self._future = None
+        self._active = False
+
+        # for debugging:
+        self._lastSentText = None
+        self._lastReceivedText = None
+
+    #----------------------------------------------------------------------
+    def init(self, host, loop):
+        self.host = host
+        self.loop = loop
+
+    #----------------------------------------------------------------------
+    def start(self):
+        """
+        启动
+        :note 注意：启动之后不能立即发包，需要等待websocket连接成功。
+        websocket连接成功之后会响应onConnected函数
+        """
+        self._active = True
+        self._future = submitCoroutine(self.loop, self._run())
+
+    #----------------------------------------------------------------------
+    def stop(self):
+        """关闭, 断开当前连接且不再重连"""
+        self._active = False
+        submitCoroutine(self.loop, self._disconnect())
+
+    #----------------------------------------------------------------------
+    def join(self, timeout=None):
+        """
+        等待连接协程退出, 不能在事件循环所在线程中调用
+        正确调用方式：先stop()后join()
+        """
+        if self._future is not None:
+            self._future.result(timeout)
+
+    #----------------------------------------------------------------------
+    def sendPacket(self, dictObj):  # type: (dict)->None
+        """发出请求:相当于sendText(json.dumps(dictObj))"""
+        text = json.dumps(dictObj)
+        self._recordLastSentText(text)
+        return self.sendText(text)
+
+    #----------------------------------------------------------------------
+    def sendText(self, text):  # type: (str)->None
+        """发送文本数据"""
+        return submitCoroutine(self.loop, self._send(text, False))
+
+    #----------------------------------------------------------------------
+    def sendBinary(self, data):  # type: (bytes)->None
+        """发送字节数据"""
+        return submitCoroutine(self.loop, self._send(data, True))
+
+    #----------------------------------------------------------------------
+    async def _send(self, data, binary):
+        ws = self._ws
+        if ws is None or ws.closed:
+            raise ConnectionError('websocket is not connected')
+
+        if binary:
+            await ws.send_bytes(data)
+        else:
+            await ws.send_str(data)
+
+    #----------------------------------------------------------------------
+    async def _connect(self):
+        """"""
+        return await self._session.ws_connect(self.host, ssl=False,
+                                              heartbeat=self.pingInterval)
+
+    #----------------------------------------------------------------------
+    async def _disconnect(self):
+        """断开连接"""
+        ws = self._ws
+        if ws is not None and not ws.closed:
+            await ws.close()
+
+    #----------------------------------------------------------------------
+    async def _run(self):
+        """运行，直到stop()被调用"""
+        self._session = aiohttp.ClientSession()
+        try:
+            while self._active:
+                try:
+                    self._ws = await self._connect()
+                    self.onConnected()
+
+                    async for msg in self._ws:
+                        if msg.type in (aiohttp.WSMsgType.TEXT, aiohttp.WSMsgType.BINARY):
+                            self._recordLastReceivedText(msg.data)
+                            try:
+                                data = self.unpackData(msg.data)
+                            except ValueError as e:
+                                print('websocket unable to parse data: ' + str(msg.data))
+                                raise e
+                            self.onPacket(data)
+                        elif msg.type == aiohttp.WSMsgType.ERROR:
+                            break
+
+                    self._ws = None
+                    self.onDisconnected()
+                except asyncio.CancelledError:
+                    raise
+                except Exception:                              # 网络错误或onPacket内出错
+                    et, ev, tb = sys.exc_info()
+                    self.onError(et, ev, tb)
+                    await self._disconnect()
+                    self._ws = None
+
+                if self._active:
+                    await asyncio.sleep(self.reconnectInterval)
+        finally:
+            await self._session.close()
+            self._session = None
+
+    #----------------------------------------------------------------------
+    @staticmethod
+    def unpackData(data):
+        """
+        解密数据，默认使用json解密为dict
+        解密后的数据将会传入onPacket
+        如果需要使用不同的解密方式，就重载这个函数。
+        :param data 收到的数据，可能是text frame，也可能是binary frame, 目前并没有区分这两者
+        """
+        return json.loads(data)
+
+    #----------------------------------------------------------------------
+    @staticmethod
+    def onConnected():
+        """
+        连接成功回调
+        """
+        pass
+
+    #----------------------------------------------------------------------
+    @staticmethod
+    def onDisconnected():
+        """
+        连接断开回调
+        """
+        pass
+
+    #----------------------------------------------------------------------
+    @staticmethod
+    def onPacket(packet):
+        """
+        数据回调。
+        只有在数据为json包的时候才会触发这个回调
+        @:param data: dict
+        @:return:
+        """
+        pass
+
+    #----------------------------------------------------------------------
+    def onError(self, exceptionType, exceptionValue, tb):
+        """
+        Python错误回调, 默认行为是打印到stderr
+        与 WebsocketClient 不同, 不交给 sys.excepthook, 以免影响共用事件循环的其他连接
+        """
+        sys.stderr.write(self.exceptionDetail(exceptionType, exceptionValue, tb))
+
+    #----------------------------------------------------------------------
+    def exceptionDetail(self, exceptionType, exceptionValue, tb):
+        """打印详细的错误信息"""
+        text = "[{}]: Unhandled WebSocket Error:{}\n".format(
+            datetime.now().isoformat(),
+            exceptionType
+        )
+        text += "LastSentText:\n{}\n".format(self._lastSentText)
+        text += "LastReceivedText:\n{}\n".format(self._lastReceivedText)
+        text += "Exception trace: \n"
+        text += "".join(traceback.format_exception(
+            exceptionType,
+            exceptionValue,
+            tb,
+        ))
+        return text
+
+    #----------------------------------------------------------------------
+    def _recordLastSentText(self, text):
+        """
+        用于Debug： 记录最后一次发送出去的text
+        """
+        self._lastSentText = text[:1000]
+
+    #----------------------------------------------------------------------
+    def _recordLastReceivedText(self, text):
+        """
+        用于Debug： 记录最后一次收到的text
+        """
+        self._lastReceivedText = text[:1000]
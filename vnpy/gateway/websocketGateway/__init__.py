@@ -1 +1,2 @@
 from .WebsocketClient import WebsocketClient
+from .AsyncWebsocketClient import AsyncWebsocketClient
@@ -0,0 +1,304 @@
+# encoding: UTF-8
+
+import asyncio
+from itertools import count
+from functools import partial
+from collections import deque
+from threading import Thread, Lock, get_ident
+
+from vnpy.base_class import Event
+from vnpy.vtConstant import C_EVENT
+from vnpy.utility.logging_mixin import LoggingMixin
+from vnpy.utility.eventEngine import splitTopic
+from vnpy.utility.eventStats import handlerName
+
+
+def submitCoroutine(loop, coro):
+    """
+    把协程交给 loop 执行, 可在任意线程中调用
+    在 loop 所在线程中调用时返回 asyncio.Task, 否则返回 concurrent.futures.Future
+    """
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+
+    if running is loop:
+        return loop.create_task(coro)
+    return asyncio.run_coroutine_threadsafe(coro, loop)
+
+
+class AsyncEventEngine(LoggingMixin):
+    """
+    基于 asyncio 事件循环的事件驱动引擎
+
+    接口与 EventEngine2 相同(registerEvent/putEvent 等), 所有处理函数在同一个
+    事件循环中依次调用; 处理函数可以是普通函数, 也可以是 async 函数, 后者返回的
+    协程会作为任务加入事件循环, 不阻塞后续事件的分发.
+
+    AsyncWebsocketClient, AsyncRestClient 可以与引擎共用一个事件循环,
+    多个 gateway 的全部连接只占用这一个线程.
+
+    loop 为 None 时引擎在自己的线程中创建并运行事件循环; 传入外部事件循环时
+    由调用方负责运行该循环.
+
+    putEvent 可在任意线程中调用: 事件先写入 __pending, 只有在事件循环尚未
+    安排处理时才通过 call_soon_threadsafe 唤醒一次.
+
+    putDerivedEvent 与 EventEngine2 相同, 在事件循环中调用时立即分发.
+    """
+
+    # 派生事件同步分发的最大嵌套层数
+    maxDerivedDepth = 8
+
+    def __init__(self, SleepInterval=None, loop=None):
+        self.log.debug('AsyncEventEngine initing...')
+
+        self.__ownLoop = loop is None
+        self.__loop = loop if loop is not None else asyncio.new_event_loop()
+        self.__thread = None
+        self.__loopThreadId = None
+
+        self.__active = False
+
+        # 待分发事件及是否已安排分发
+        self.__pending = deque()
+        self.__scheduled = False
+        self.__derivedDepth = 0
+
+        # 计时器, 默认1秒
+        self.__timerSleep = 1 if SleepInterval is None else SleepInterval
+        self.__timerHandle = None
+
+        # 计时器编号与 asyncio.TimerHandle 的对应关系
+        self.__timerIds = count(1)
+        self.__timers = {}
+
+        # 与 EventEngine2 相同, 处理函数保存为不可变 tuple
+        self.__handlers = {}
+        self.__keyedHandlers = {}
+        self.__generalHandlers = ()
+        self.__handlerLock = Lock()
+
+    @property
+    def loop(self):
+        return self.__loop
+
+    def __runLoop(self):
+        asyncio.set_event_loop(self.__loop)
+        self.__loopThreadId = get_ident()
+        self.__loop.run_forever()
+
+    def __inLoop(self):
+        if self.__ownLoop:
+            return get_ident() == self.__loopThreadId
+        try:
+            return asyncio.get_running_loop() is self.__loop
+        except RuntimeError:
+            return False
+
+    def __callSoon(self, callback, *args):
+        """在事件循环中执行 callback, 可在任意线程中调用"""
+        if self.__inLoop():
+            self.__loop.call_soon(callback, *args)
+        else:
+            self.__loop.call_soon_threadsafe(callback, *args)
+
+    def __drain(self):
+        """在事件循环中分发全部待处理事件"""
+        self.__scheduled = False
+        pending = self.__pending
+        process = self.__process
+        while pending and self.__active:
+            process(pending.popleft())
+
+    def __process(self, event):
+        """处理事件"""
+        handlers = self.__handlers.get(event.type_, None)
+        if handlers:
+            for handler in handlers:
+                self.__call(handler, event)
+
+        if event.key is not None:
+            keyed = self.__keyedHandlers.get(event.type_, None)
+            if keyed:
+                handlers = keyed.get(event.key, None)
+                if handlers:
+                    for handler in handlers:
+                        self.__call(handler, event)
+
+        for handler in self.__generalHandlers:
+            self.__call(handler, event)
+
+    def __call(self, handler, event):
+        """调用处理函数, 出错时记录日志, 不影响其他处理函数和后续事件"""
+        try:
+            result = handler(event)
+        except Exception:
+            self.__onHandlerError(handler, event)
+            return
+
+        if asyncio.iscoroutine(result):
+            task = self.__loop.create_task(result)
+            task.add_done_callback(partial(self.__onTaskDone, handler, event))
+
+    def __onTaskDone(self, handler, event, task):
+        """async 处理函数结束时检查异常"""
+        if not task.cancelled() and task.exception() is not None:
+            self.log.error('Handler {hd} failed on {tp}'.format(
+                hd=handlerName(handler), tp=event.type_), exc_info=task.exception())
+
+    def __onHandlerError(self, handler, event):
+        """记录处理函数抛出的异常, 需在 except 块中调用"""
+        self.log.exception('Handler {hd} failed on {tp}'.format(
+            hd=handlerName(handler), tp=event.type_))
+
+    def __onTimer(self):
+        self.putEvent(Event(type_=C_EVENT.EVENT_TIMER))
+        self.__timerHandle = self.__loop.call_later(self.__timerSleep, self.__onTimer)
+
+    def __startTimer(self):
+        self.__timerHandle = self.__loop.call_soon(self.__onTimer)
+
+    def __stopTimers(self):
+        if self.__timerHandle is not None:
+            self.__timerHandle.cancel()
+            self.__timerHandle = None
+        for handle in self.__timers.values():
+            if handle is not None:
+                handle.cancel()
+        self.__timers.clear()
+
+    def start(self, timer=True):
+        """
+        引擎启动
+        timer：是否要启动计时器
+        """
+        self.log.debug('AsyncEventEngine start')
+        self.__active = True
+        if self.__ownLoop:
+            self.__thread = Thread(target=self.__runLoop, name='AsyncEventEngine')
+            self.__thread.start()
+
+        if timer:
+            self.__callSoon(self.__startTimer)
+        if self.__pending:
+            self.__scheduled = True
+            self.__callSoon(self.__drain)
+
+    def stop(self):
+        self.log.debug('AsyncEventEngine stop')
+        self.__active = False
+        if self.__loop.is_closed():
+            return
+
+        self.__callSoon(self.__stopTimers)
+        if self.__ownLoop and self.__thread is not None:
+            self.__loop.call_soon_threadsafe(self.__loop.stop)
+            self.__thread.join()
+            self.__thread = None
+            self.__loop.close()
+
+    def putEvent(self, event):
+        self.__pending.append(event)
+        if self.__active and not self.__scheduled:
+            self.__scheduled = True
+            self.__callSoon(self.__drain)
+
+    def putDerivedEvent(self, event):
+        """发布派生事件, 在事件循环中调用时立即分发, 否则与 putEvent 相同"""
+        if not self.__inLoop() or self.__derivedDepth >= self.maxDerivedDepth:
+            self.putEvent(event)
+            return
+
+        self.__derivedDepth += 1
+        try:
+            self.__process(event)
+        finally:
+            self.__derivedDepth -= 1
+
+    def scheduleTimer(self, delay, handler, interval=None):
+        """
+        注册计时器, 返回计时器编号, 参数与 EventEngine2.scheduleTimer 相同
+        handler 收到的事件 dict_['data'] 为计时器编号
+        """
+        timerId = next(self.__timerIds)
+
+        def onExpired():
+            if interval is None:
+                self.__timers.pop(timerId, None)
+            elif timerId in self.__timers:
+                self.__timers[timerId] = self.__loop.call_later(interval, onExpired)
+            else:
+                return
+
+            event = Event(type_=C_EVENT.EVENT_TIMER_EXPIRED)
+            event.dict_['data'] = timerId
+            self.__call(handler, event)
+
+        def schedule():
+            self.__timers[timerId] = self.__loop.call_later(delay, onExpired)
+
+        # 先占位, 保证返回后立即撤销也有效
+        self.__timers[timerId] = None
+        self.__callSoon(self.__scheduleIfPending, timerId, schedule)
+        return timerId
+
+    def __scheduleIfPending(self, timerId, schedule):
+        if timerId in self.__timers:
+            schedule()
+
+    def cancelTimer(self, timerId):
+        """撤销计时器, 返回是否撤销成功"""
+        if timerId not in self.__timers:
+            return False
+        handle = self.__timers.pop(timerId, None)
+        if handle is not None:
+            self.__callSoon(handle.cancel)
+        return True
+
+    def registerEvent(self, type_, handler):
+        with self.__handlerLock:
+            handlers = self.__handlers.get(type_, ())
+            if handler not in handlers:
+                self.__handlers[type_] = handlers + (handler,)
+                self.__rebuildKeyedHandlers()
+                self.log.debug('Register {hd} for {tp}'.format(
+                    hd=handler.__name__, tp=type_))
+
+    def unregisterEvent(self, type_, handler):
+        with self.__handlerLock:
+            handlers = self.__handlers.get(type_, ())
+            if handler in handlers:
+                handlers = tuple([h for h in handlers if h != handler])
+                self.log.debug('Unregister {hd} for {tp}'.format(
+                    hd=handler.__name__, tp=type_))
+
+                if handlers:
+                    self.__handlers[type_] = handlers
+                else:
+                    del self.__handlers[type_]
+                self.__rebuildKeyedHandlers()
+
+    def __rebuildKeyedHandlers(self):
+        """根据 __handlers 重建两级主题索引, 需在 __handlerLock 内调用"""
+        keyedHandlers = {}
+        for type_, handlers in self.__handlers.items():
+            topic = splitTopic(type_)
+            if topic:
+                prefix, key = topic
+                keyedHandlers.setdefault(prefix, {})[key] = handlers
+        self.__keyedHandlers = keyedHandlers
+
+    def registerGeneralHandler(self, handler):
+        with self.__handlerLock:
+            if handler not in self.__generalHandlers:
+                self.__generalHandlers = self.__generalHandlers + (handler,)
+                self.log.debug('Register General Handler {hd}'.format(hd=handler.__name__))
+
+    def unregisterGeneralHandler(self, handler):
+        with self.__handlerLock:
+            if handler in self.__generalHandlers:
+                self.__generalHandlers = tuple(
+                    [h for h in self.__generalHandlers if h != handler])
+                self.log.debug('Unregister General Handler {hd}'.format(hd=handler.__name__))
@@ -0,0 +1,148 @@
+# encoding: UTF-8
+
+"""
+合约信息的本地缓存
+
+以 SQLite 文件保存, 每个合约一行, ContractData 的字段各占一列:
+
+    cache = ContractCache(getTempPath('ContractCache.db'))
+    cache.upsert(contracts, '20191009')      # 只写入新增或变化的合约
+    cache.get('rb1910.SHFE')                 # 按 vtSymbol 或 symbol 读取单个合约
+    cache.getVersion('CTP')                  # ('20191009', 3), 各接口最近一次写入的交易日及版本号
+
+启动时不再读取全部合约, 使用到某个合约时才从文件中读取.
+"""
+
+import pickle
+import sqlite3
+from datetime import datetime
+from threading import Lock
+
+from vnpy.base_class import ContractData
+from vnpy.utility.logging_mixin import LoggingMixin
+
+
+# 缓存格式版本, 字段变化时修改, 打开旧格式的文件会重建
+CACHE_VERSION = 1
+
+# 按列保存的字段, 其他动态添加的字段保存在 extra 列中
+CONTRACT_FIELDS = tuple([name for name in ContractData().__dict__ if name != 'rawData'])
+
+
+class ContractCache(LoggingMixin):
+    """合约信息的 SQLite 缓存, 可以在多个线程中使用"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        # 缓存丢失时可以重新从接口查询, 不需要每次写入都同步到磁盘
+        self.conn.execute('PRAGMA synchronous = OFF')
+        self.createTables()
+
+    def createTables(self):
+        conn = self.conn
+        conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value)')
+        row = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        if row and row[0] != CACHE_VERSION:
+            self.log.debug('合约缓存格式 {old} 已过期, 重建'.format(old=row[0]))
+            conn.execute('DROP TABLE IF EXISTS contracts')
+            conn.execute('DROP TABLE IF EXISTS versions')
+
+        columns = ', '.join([name for name in CONTRACT_FIELDS if name != 'vtSymbol'])
+        conn.execute('CREATE TABLE IF NOT EXISTS contracts '
+                     '(vtSymbol TEXT PRIMARY KEY, %s, extra BLOB)' % columns)
+        conn.execute('CREATE INDEX IF NOT EXISTS contracts_symbol ON contracts (symbol)')
+        conn.execute('CREATE TABLE IF NOT EXISTS versions '
+                     '(gatewayName TEXT PRIMARY KEY, tradingDay TEXT, version INTEGER, '
+                     'updateTime TEXT)')
+        conn.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (CACHE_VERSION,))
+        conn.commit()
+
+        self.names = ('vtSymbol',) + tuple([name for name in CONTRACT_FIELDS
+                                            if name != 'vtSymbol'])
+        self.selectSql = 'SELECT %s, extra FROM contracts' % ', '.join(self.names)
+        self.upsertSql = 'INSERT OR REPLACE INTO contracts VALUES (%s)' % \
+            ', '.join(['?'] * (len(self.names) + 1))
+
+    #----------------------------------------------------------------------
+    def toRow(self, contract):
+        d = contract.__dict__
+        row = [d.get(name, '') for name in self.names]
+        extra = {k: v for k, v in d.items()
+                 if k not in self.names and k not in ('rawData', 'instrumentId')
+                 and not k.startswith('_')}
+        row.append(pickle.dumps(extra, pickle.HIGHEST_PROTOCOL) if extra else None)
+        return row
+
+    def fromRow(self, row):
+        contract = ContractData()
+        d = contract.__dict__
+        d.update(zip(self.names, row))
+        extra = row[-1]
+        if extra:
+            d.update(pickle.loads(extra))
+        return contract
+
+    def upsert(self, contracts, tradingDay):
+        """
+        写入(新增或覆盖)合约, 并把涉及的接口的版本号加一, 记录交易日
+        返回写入的合约数量
+        """
+        rows = []
+        gatewayNames = set()
+        for contract in contracts:
+            rows.append(self.toRow(contract))
+            gatewayNames.add(contract.gatewayName)
+        if not rows:
+            return 0
+
+        updateTime = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with self.lock:
+            conn = self.conn
+            conn.executemany(self.upsertSql, rows)
+            for gatewayName in gatewayNames:
+                row = conn.execute('SELECT version FROM versions WHERE gatewayName = ?',
+                                   (gatewayName,)).fetchone()
+                version = row[0] + 1 if row else 1
+                conn.execute('INSERT OR REPLACE INTO versions VALUES (?, ?, ?, ?)',
+                             (gatewayName, tradingDay, version, updateTime))
+            conn.commit()
+        return len(rows)
+
+    def get(self, vtSymbol):
+        """按 vtSymbol 读取合约, 找不到时按 symbol 读取, 都没有时返回 None"""
+        with self.lock:
+            row = self.conn.execute(self.selectSql + ' WHERE vtSymbol = ?',
+                                    (vtSymbol,)).fetchone()
+            if row is None:
+                row = self.conn.execute(self.selectSql + ' WHERE symbol = ? '
+                                        'ORDER BY rowid DESC LIMIT 1', (vtSymbol,)).fetchone()
+        if row is None:
+            return None
+        return self.fromRow(row)
+
+    def getAll(self, gatewayName=None):
+        """读取全部合约, 或某个接口的合约"""
+        with self.lock:
+            if gatewayName is None:
+                rows = self.conn.execute(self.selectSql).fetchall()
+            else:
+                rows = self.conn.execute(self.selectSql + ' WHERE gatewayName = ?',
+                                         (gatewayName,)).fetchall()
+        return [self.fromRow(row) for row in rows]
+
+    def getVersion(self, gatewayName):
+        """返回接口最近一次写入的 (交易日, 版本号), 没有时返回 ('', 0)"""
+        with self.lock:
+            row = self.conn.execute('SELECT tradingDay, version FROM versions '
+                                    'WHERE gatewayName = ?', (gatewayName,)).fetchone()
+        return tuple(row) if row else ('', 0)
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute('SELECT COUNT(*) FROM contracts').fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
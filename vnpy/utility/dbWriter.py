@@ -0,0 +1,209 @@
+# encoding: UTF-8
+
+"""
+数据库批量后台写入
+
+dbInsert/dbUpdate 只把数据放入按集合划分的缓冲区, 后台线程按数量或时间
+通过存储后端的 insertMany / replaceMany 批量写入, 调用方不再等待每条数据的网络往返:
+
+    writer = WriteBehindWriter(backend, batchSize=1000, flushInterval=1.0)
+    writer.insert(dbName, collectionName, d)
+    writer.replace(dbName, collectionName, d, flt, upsert=True)
+    writer.flush()      # 等待已缓冲的数据全部写入
+    writer.flush(dbName, collectionName)    # 只写入某个集合的缓冲
+    writer.close()      # 退出前调用, 保证写完
+
+每个集合的 insert/replace 保存在同一个有序列表中, 按调用的先后写入, 连续的同类操作合成一批.
+同一集合中相同过滤条件的 replace 在写入前合并: 旧的一条作废, 只在最新的位置写入.
+缓冲的数据条数达到 maxPending 时, insert/replace 阻塞直到后台写入跟上.
+"""
+
+from collections import OrderedDict
+from threading import Thread, Condition, Lock
+from time import perf_counter
+
+from vnpy.utility.logging_mixin import LoggingMixin
+
+
+class WriteBehindWriter(LoggingMixin):
+    """按集合缓冲的后台批量写入"""
+
+    def __init__(self, backend, batchSize=1000, flushInterval=1.0, maxPending=100000):
+        self.backend = backend                  # vnpy.utility.storage.StorageBackend
+        self.batchSize = batchSize
+        self.flushInterval = flushInterval
+        self.maxPending = maxPending
+
+        # (dbName, collectionName): [[操作, 数据]], 操作为 'insert'/'replace', 作废的为 None
+        self.opDict = OrderedDict()
+        # (dbName, collectionName): {过滤条件: 尚未写入的 replace 操作}
+        self.replaceIndex = {}
+        self.pending = 0                        # 已缓冲未写入的条数
+
+        self.condition = Condition()            # 保护缓冲区, 唤醒写入线程及被阻塞的调用方
+        # (dbName, collectionName): Lock, 保证同一集合的各批次按取出的先后写入,
+        # 需在 condition 之前获取
+        self.writeLocks = {}
+
+        # 运行统计
+        self.insertedCount = 0
+        self.replacedCount = 0
+        self.batchCount = 0
+        self.errorCount = 0
+        self.blockedCount = 0
+        self.writeSeconds = 0.0
+        self.maxPendingSeen = 0
+
+        self.active = True
+        self.thread = Thread(target=self.run, name='DbWriter')
+        self.thread.daemon = True
+        self.thread.start()
+
+    #----------------------------------------------------------------------
+    def insert(self, dbName, collectionName, d):
+        """缓冲一条插入, 复制字典以免调用方之后修改"""
+        with self.condition:
+            self.waitForSpace()
+            ops = self.getOps((dbName, collectionName))
+            ops.append(['insert', dict(d)])
+            self.added(len(ops))
+
+    def replace(self, dbName, collectionName, d, flt, upsert=False):
+        """缓冲一条替换, 相同过滤条件的旧替换被覆盖"""
+        key = repr(sorted(flt.items()))
+        with self.condition:
+            self.waitForSpace()
+            ops = self.getOps((dbName, collectionName))
+            index = self.replaceIndex[(dbName, collectionName)]
+            op = ['replace', (flt, dict(d), upsert)]
+            old = index.get(key)
+            index[key] = op
+            ops.append(op)
+            if old is None:
+                self.added(len(ops))
+            else:
+                old[0] = None
+
+    def getOps(self, name):
+        """集合的操作列表, 需在 condition 内调用"""
+        ops = self.opDict.get(name)
+        if ops is None:
+            ops = self.opDict[name] = []
+            self.replaceIndex[name] = {}
+        return ops
+
+    def waitForSpace(self):
+        if self.pending >= self.maxPending:
+            self.blockedCount += 1
+            self.log.warning('数据库写入积压 {n} 条, 等待写入'.format(n=self.pending))
+            self.condition.notify_all()
+            while self.pending >= self.maxPending and self.active:
+                self.condition.wait()
+
+    def added(self, bufferSize):
+        self.pending += 1
+        self.maxPendingSeen = max(self.maxPendingSeen, self.pending)
+        if bufferSize >= self.batchSize:
+            self.condition.notify_all()
+
+    #----------------------------------------------------------------------
+    def run(self):
+        while True:
+            with self.condition:
+                if self.active:
+                    self.condition.wait(self.flushInterval)
+                active = self.active
+            self.writeAll()
+            if not active:
+                break
+
+    def writeAll(self):
+        """取出全部缓冲并写入"""
+        with self.condition:
+            names = list(self.opDict.keys())
+        for name in names:
+            self.writeCollection(name)
+
+    def writeCollection(self, name):
+        """取出一个集合的缓冲, 按先后把连续的同类操作分批写入"""
+        with self.condition:
+            lock = self.writeLocks.get(name)
+            if lock is None:
+                lock = self.writeLocks[name] = Lock()
+
+        with lock:
+            with self.condition:
+                ops = self.opDict.pop(name, None)
+                self.replaceIndex.pop(name, None)
+            if not ops:
+                return
+
+            dbName, collectionName = name
+            method = None
+            batch = []
+            for kind, data in ops:
+                if kind is None:
+                    continue
+                if kind != method or len(batch) >= self.batchSize:
+                    if batch:
+                        self.write(dbName, collectionName, method + 'Many', batch)
+                    method = kind
+                    batch = []
+                batch.append(data)
+            if batch:
+                self.write(dbName, collectionName, method + 'Many', batch)
+
+    def write(self, dbName, collectionName, method, batch):
+        start = perf_counter()
+        try:
+            # 单条失败由后端记录日志并返回失败条数
+            self.errorCount += getattr(self.backend, method)(dbName, collectionName, batch)
+        except Exception as e:
+            # 连接中断等整批失败时丢弃该批数据, 写入线程继续运行
+            self.errorCount += len(batch)
+            self.log.error('{db}.{col} 批量写入 {n} 条失败: {msg}'.format(
+                db=dbName, col=collectionName, n=len(batch), msg=e))
+        self.writeSeconds += perf_counter() - start
+        self.batchCount += 1
+        if method == 'insertMany':
+            self.insertedCount += len(batch)
+        else:
+            self.replacedCount += len(batch)
+
+        with self.condition:
+            self.pending -= len(batch)
+            self.condition.notify_all()
+
+    #----------------------------------------------------------------------
+    def flush(self, dbName=None, collectionName=None):
+        """
+        在调用线程中写入缓冲, 返回时之前缓冲的数据都已写入
+        指定 dbName 和 collectionName 时只写入该集合, 不等待其他集合
+        """
+        if collectionName is None:
+            self.writeAll()
+        else:
+            self.writeCollection((dbName, collectionName))
+
+    def close(self):
+        """写完全部缓冲后停止写入线程"""
+        with self.condition:
+            self.active = False
+            self.condition.notify_all()
+        self.thread.join()
+        self.writeAll()
+
+    def getStats(self):
+        """运行统计, throughput 为写入耗时内平均每秒写入条数"""
+        written = self.insertedCount + self.replacedCount
+        return {
+            'pending': self.pending,
+            'maxPendingSeen': self.maxPendingSeen,
+            'inserted': self.insertedCount,
+            'replaced': self.replacedCount,
+            'batches': self.batchCount,
+            'errors': self.errorCount,
+            'blocked': self.blockedCount,
+            'writeSeconds': self.writeSeconds,
+            'throughput': written / self.writeSeconds if self.writeSeconds else 0.0,
+        }
@@ -0,0 +1,97 @@
+# encoding: UTF-8
+
+from threading import Thread, Condition
+
+from vnpy.utility.logging_mixin import LoggingMixin
+from vnpy.utility.eventStats import handlerName
+
+
+class ConflatingSubscriber(LoggingMixin):
+    """
+    合并推送的事件订阅者
+
+    事件处理线程只把事件放入 __pending, 同一键值尚未推送的旧事件直接被新事件覆盖;
+    订阅者自己的推送线程每次取走全部待推送事件后逐个调用处理函数.
+    处理较慢的订阅者(界面监控, RTD, WebTrader 等)只会看到每个合约的最新行情,
+    不会拖慢主事件队列, 也不影响其他订阅者收到完整的事件流.
+
+    变量说明
+    received: 收到的事件数量
+    delivered: 已推送给处理函数的事件数量
+    dropped: 被更新事件覆盖而丢弃的数量
+    """
+
+    def __init__(self, type_, handler, keyFunc):
+        self.type_ = type_
+        self.handler = handler
+        self.name = handlerName(handler)
+        self.__keyFunc = keyFunc
+
+        # key: 合并键值, value: 最新的待推送事件
+        self.__pending = {}
+        self.__condition = Condition()
+
+        self.__active = False
+        self.__thread = None
+
+        self.received = 0
+        self.delivered = 0
+        self.dropped = 0
+
+    def put(self, event):
+        """在事件处理线程中调用, 只做覆盖写入"""
+        key = self.__keyFunc(event)
+        with self.__condition:
+            self.received += 1
+            if key in self.__pending:
+                self.dropped += 1
+            self.__pending[key] = event
+            self.__condition.notify()
+
+    def __run(self):
+        handler = self.handler
+        condition = self.__condition
+        while self.__active:
+            with condition:
+                if not self.__pending:
+                    condition.wait(1)
+                pending = self.__pending
+                self.__pending = {}
+
+            for event in pending.values():
+                try:
+                    handler(event)
+                except Exception:
+                    # 处理函数出错时只记录日志, 推送线程继续运行
+                    self.log.exception('Conflated handler {hd} failed on {tp}'.format(
+                        hd=self.name, tp=event.type_))
+            self.delivered += len(pending)
+
+    def start(self):
+        if self.__active:
+            return
+        self.__active = True
+        self.__thread = Thread(target=self.__run,
+                               name='EventConflator-{n}'.format(n=self.name))
+        self.__thread.start()
+
+    def stop(self):
+        if not self.__active:
+            return
+        self.__active = False
+        with self.__condition:
+            self.__condition.notify()
+        self.__thread.join()
+
+    def getStats(self):
+        """返回只包含基础类型的统计字典"""
+        with self.__condition:
+            pending = len(self.__pending)
+        return {
+            'handler': self.name,
+            'eventType': self.type_,
+            'received': self.received,
+            'delivered': self.delivered,
+            'dropped': self.dropped,
+            'pending': pending
+        }
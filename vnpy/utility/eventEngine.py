@@ -1,15 +1,90 @@
 # encoding: UTF-8
 
-from time import sleep
+from time import time, perf_counter, monotonic, monotonic_ns
 from queue import Queue, Empty
-from threading import Thread
+from threading import Thread, Lock, Condition, local
+from functools import partial
 from collections import defaultdict
 
 from qtpy.QtCore import QTimer
 
 from vnpy.base_class import Event
-from vnpy.vtConstant import C_EVENT
+from vnpy.vtConstant import C_EVENT, C_OVERLOAD
 from vnpy.utility.logging_mixin import LoggingMixin
+from vnpy.utility.eventQueue import IngressRingQueue, PriorityRingQueue, BoundedEventQueue
+from vnpy.utility.eventStats import WorkerStats, mergeWorkerStats, handlerName
+from vnpy.utility.eventConflation import ConflatingSubscriber
+from vnpy.utility.timerWheel import TimerWheel
+
+# 分片模式下依次尝试作为路由键的数据属性
+ROUTING_KEY_ATTRS = ('vtSymbol', 'vtOrderID', 'vtAccountID')
+
+# 分片模式下固定路由到同一分片的事件类型: 接口就绪事件必须在该接口之前推送的
+# 全部合约事件处理完之后才处理
+FIXED_ROUTING_KEYS = {
+    C_EVENT.EVENT_CONTRACT: C_EVENT.EVENT_CONTRACT,
+    C_EVENT.EVENT_GATEWAY_READY: C_EVENT.EVENT_CONTRACT,
+}
+
+
+def eventRoutingKey(event):
+    """
+    事件的默认路由键
+    同一合约的行情, 委托, 成交落在同一分片, 保证 DataEngine 等按合约维护的
+    状态按顺序更新; 没有数据对象的事件(如计时器)按事件类型路由,
+    FIXED_ROUTING_KEYS 中的事件类型使用固定的路由键
+    """
+    key = FIXED_ROUTING_KEYS.get(event.type_, None)
+    if key is not None:
+        return key
+    data = event.dict_.get('data', None)
+    if data is not None:
+        for name in ROUTING_KEY_ATTRS:
+            key = getattr(data, name, None)
+            if key:
+                return key
+    return event.type_
+
+
+# 默认的优先级分类: (名称, 事件类型, 权重), 排在前面的优先处理,
+# 最后一类同时作为未列出事件类型(计时器, 日志等)的默认分类;
+# 合约与接口就绪事件必须在同一分类中, 保证就绪事件在合约之后处理
+DEFAULT_PRIORITY_CLASSES = (
+    ('order', (C_EVENT.EVENT_TRADE, C_EVENT.EVENT_ORDER), 8),
+    ('account', (C_EVENT.EVENT_ACCOUNT, C_EVENT.EVENT_POSITION), 4),
+    ('tick', (C_EVENT.EVENT_TICK,), 2),
+    ('other', (C_EVENT.EVENT_TIMER, C_EVENT.EVENT_CONTRACT, C_EVENT.EVENT_GATEWAY_READY), 1),
+)
+
+
+# 有界队列默认的过载策略, 未列出的事件类型阻塞生产线程;
+# 到期计时器由时间轮线程写入, 不能阻塞, 同一计时器尚未处理的到期事件合并为一个
+DEFAULT_OVERLOAD_POLICIES = {
+    C_EVENT.EVENT_TICK: C_OVERLOAD.OVERLOAD_CONFLATE,
+    C_EVENT.EVENT_TIMER: C_OVERLOAD.OVERLOAD_DROP_OLDEST,
+    C_EVENT.EVENT_TIMER_EXPIRED: C_OVERLOAD.OVERLOAD_CONFLATE,
+}
+
+
+def conflationKey(event):
+    """合并推送的默认键值, 优先使用事件子键(如 vtSymbol), 到期计时器按计时器合并"""
+    if event.key is not None:
+        return event.key
+    if event.type_ == C_EVENT.EVENT_TIMER_EXPIRED:
+        return event.dict_['data']
+    return eventRoutingKey(event)
+
+
+def splitTopic(type_):
+    """
+    拆分带子键的事件类型, 'eTick.rb1910' -> ('eTick.', 'rb1910')
+    不带子键的类型(如 'eTick.', 'eTimer')返回 None
+    """
+    index = type_.find('.') if isinstance(type_, str) else -1
+    if index < 0 or index == len(type_) - 1:
+        return None
+    return type_[:index + 1], type_[index + 1:]
+
 
 # message queue models
 
@@ -85,6 +160,12 @@ class EventEngine(LoggingMixin):
         if event.type_ in self.__handlers:
             [handler(event) for handler in self.__handlers[event.type_]]
 
+        # 带子键的事件同时分发给特定子键的监听函数
+        if event.key is not None:
+            keyedType = event.type_ + event.key
+            if keyedType in self.__handlers:
+                [handler(event) for handler in self.__handlers[keyedType]]
+
         if self.__generalHandlers:
             [handler(event) for handler in self.__generalHandlers]
 
@@ -148,59 +229,343 @@ class EventEngine(LoggingMixin):
 class EventEngine2(LoggingMixin):
     """
     计时器使用python线程的事件驱动引擎
+
+    workerCount 大于1时为分片模式: 事件按照路由键(默认依次取 vtSymbol,
+    vtOrderID, vtAccountID, 都没有则使用事件类型)哈希到对应的工作线程,
+    相同路由键的事件始终由同一个线程按顺序处理, 不同路由键之间并行处理.
+    分片模式要求所有处理函数都是分片安全的: 同一个处理函数会在多个线程中同时调用,
+    跨路由键共享的状态(账户, 持仓汇总, 数据快照, 交易多个合约的策略等)必须自行加锁,
+    或者把相关事件类型通过 FIXED_ROUTING_KEYS / routingKey 固定到同一分片.
+    MainEngine 中的 DataEngine 及各应用引擎按单线程处理设计, MainEngine 总是使用单线程;
+    分片模式供单独使用 EventEngine2 且处理函数满足上述要求的场景.
+
+    事件类型支持两级主题: gateway 只需推送一个 type_='eTick.', key=vtSymbol 的
+    事件, 引擎会同时分发给 'eTick.' 和 'eTick.rb1910' 的监听函数; 直接推送
+    'eTick.rb1910' 类型的事件仍然只分发给该类型的监听函数.
+
+    每个工作线程的事件队列为 IngressRingQueue, 各生产线程无锁写入各自的 ring,
+    工作线程批量取出后分发; 处理函数保存为不可变的 tuple, 仅在注册/注销时
+    重建, 分发过程中不产生额外的对象.
+
+    stats 为 True 时记录运行统计(队列深度, 各类事件的排队耗时, 各处理函数的
+    执行耗时直方图), 处理函数耗时超过 handlerBudget 秒时发出 EVENT_SLOW_HANDLER
+    报警事件; 未开启时分发路径与不统计完全相同.
+
+    priorityClasses 不为 None 时事件队列按优先级分道(PriorityRingQueue), 成交和委托
+    回报不必排在大量行情之后; 传入 True 使用 DEFAULT_PRIORITY_CLASSES.
+    同一分类内保持先后顺序, 加权轮转保证低优先级分类不会饿死.
+
+    maxQueueSize 不为 None 时每个工作线程的队列为有界队列(BoundedEventQueue),
+    队列满时按 overloadPolicies 中各事件类型的策略处理(默认 DEFAULT_OVERLOAD_POLICIES,
+    未列出的类型使用 defaultOverloadPolicy), 积压越过高/低水位时发出
+    EVENT_QUEUE_ALARM 事件; 有界模式不能与优先级分道同时使用.
+
+    计时器线程驱动一个毫秒精度的分层时间轮(TimerWheel), scheduleTimer 注册的
+    一次性或周期计时器到期时以 EVENT_TIMER_EXPIRED 事件交给处理线程, 在处理线程中
+    调用对应的函数; 原有的 EVENT_TIMER 也是时间轮上的一个周期计时器.
+
+    处理函数中用 putDerivedEvent 发布的派生事件(价差行情等)在当前处理线程中立即
+    分发, 不再经过队列; 嵌套超过 maxDerivedDepth 层时改为写入队列.
     """
 
-    def __init__(self, SleepInterval=None):
+    # 每个 ring 单次最多取出的事件数量
+    drainBatchSize = 256
+
+    # 时间轮刻度(秒)及空闲时计时器线程的最长休眠刻度数
+    timerResolution = 0.001
+    timerMaxSleepTicks = 1000
+
+    # 派生事件同步分发的最大嵌套层数
+    maxDerivedDepth = 8
+
+    def __init__(self, SleepInterval=None, workerCount=1, routingKey=None,
+                 stats=False, handlerBudget=None, alertInterval=1.0,
+                 depthSampleInterval=1.0, priorityClasses=None,
+                 maxQueueSize=None, overloadPolicies=None,
+                 defaultOverloadPolicy=C_OVERLOAD.OVERLOAD_BLOCK,
+                 highWatermark=None, lowWatermark=None):
         self.log.debug('EventEngine2 initing...')
-        self.__queue = Queue()
+
+        # 分片数量及路由函数
+        self.__workerCount = max(int(workerCount), 1)
+        if routingKey is None:
+            self.__routingKey = eventRoutingKey
+        else:
+            self.__routingKey = routingKey
+
+        # 优先级分类, 未开启时为 None
+        # __laneOf key: 事件类型, value: 车道序号, 未列出的类型首次出现时按前缀补充
+        self.__laneNames = None
+        self.__laneOf = {}
+        if priorityClasses is True:
+            priorityClasses = DEFAULT_PRIORITY_CLASSES
+        if priorityClasses:
+            self.__laneNames = [name for name, _, _ in priorityClasses]
+            for lane, (_, types, _) in enumerate(priorityClasses):
+                for type_ in types:
+                    self.__laneOf[type_] = lane
+
+        if maxQueueSize and self.__laneNames is not None:
+            raise ValueError('bounded queue cannot be combined with priority classes')
+        self.__bounded = bool(maxQueueSize)
+
+        # 每个工作线程各自一个事件队列
+        if self.__bounded:
+            if overloadPolicies is None:
+                overloadPolicies = DEFAULT_OVERLOAD_POLICIES
+            elif C_EVENT.EVENT_TIMER_EXPIRED not in overloadPolicies:
+                # 自定义策略中没有到期计时器时使用默认策略, 不阻塞时间轮线程
+                overloadPolicies = dict(overloadPolicies)
+                overloadPolicies[C_EVENT.EVENT_TIMER_EXPIRED] = \
+                    DEFAULT_OVERLOAD_POLICIES[C_EVENT.EVENT_TIMER_EXPIRED]
+            self.__queues = [
+                BoundedEventQueue(maxQueueSize, overloadPolicies, defaultOverloadPolicy,
+                                  conflationKey, highWatermark, lowWatermark,
+                                  partial(self.__onQueueAlarm, n))
+                for n in range(self.__workerCount)]
+        elif self.__laneNames is None:
+            self.__queues = [IngressRingQueue() for _ in range(self.__workerCount)]
+        else:
+            weights = [weight for _, _, weight in priorityClasses]
+            self.__queues = [PriorityRingQueue(weights) for _ in range(self.__workerCount)]
+        self.__queue = self.__queues[0]
 
         # 事件引擎开关
         self.__active = False
 
         # 事件处理线程
-        self.__thread = Thread(target = self.__run)
+        self.__threads = [
+            Thread(target=self.__run, args=(queue, n),
+                   name='EventEngine2-{n}'.format(n=n))
+            for n, queue in enumerate(self.__queues)]
 
-        # 计时器, 用于触发计时器事件, 默认1秒
-        self.__timer = Thread(target = self.__runTimer)
+        # 计时器线程及时间轮, EVENT_TIMER 的发送间隔默认1秒
+        self.__timer = Thread(target=self.__runTimer, name='EventEngine2-timer')
         self.__timerActive = False
+        self.__timerWheel = TimerWheel(self.__nowTick())
+        self.__timerCondition = Condition()
+        self.__timerBroadcastId = None
         if SleepInterval is None:
             self.__timerSleep = 1
         else:
             self.__timerSleep = SleepInterval
-        self.log.debug('Timer Interval {ti}s'.format(ti=self.__timerSleep))
+        self.log.debug('Timer Interval {ti}s, Workers {wc}'.format(
+            ti=self.__timerSleep, wc=self.__workerCount))
 
         # __handlers 保存对应的事件调用关系
         # key: 事件名
-        # value: 对 key 事件进行监听的函数列表
-        self.__handlers = defaultdict(list)
+        # value: 对 key 事件进行监听的函数 tuple
+        # 注册/注销时整体替换 tuple, 工作线程读取时无需加锁
+        self.__handlers = {}
 
-        # __generalHandlerss 所有事件均调用的函数列表
-        self.__generalHandlers = []
+        # __keyedHandlers 按两级主题索引的带子键监听函数, 由 __handlers 生成
+        # key: 事件类型前缀, 如 'eTick.'
+        # value: {子键: 监听函数 tuple}
+        self.__keyedHandlers = {}
 
-    def __run(self):
+        # __generalHandlerss 所有事件均调用的函数 tuple
+        self.__generalHandlers = ()
+
+        # 保护注册/注销时的重建过程
+        self.__handlerLock = Lock()
+
+        # 合并推送的订阅者
+        # key: (事件类型, 处理函数), value: ConflatingSubscriber
+        self.__conflated = {}
+
+        # 运行统计, 每个处理线程一份, 未开启时为 None
+        self.__stats = None
+        if stats:
+            self.__stats = [WorkerStats() for _ in range(self.__workerCount)]
+        self.__handlerBudget = handlerBudget            # 处理函数耗时预算(秒)
+        self.__alertInterval = alertInterval            # 同一函数报警的最小间隔(秒)
+        self.__depthSampleInterval = depthSampleInterval  # 队列深度采样间隔(秒)
+        self.__handlerNames = {}                        # 处理函数统计名称缓存
+
+        # putEvent 时是否记录 event.ingressNs, 由事件日志开启
+        self.__stampIngress = False
+
+        # 处理线程的分发函数及派生事件嵌套层数, 非处理线程中没有 process 属性
+        self.__local = local()
+
+        self.registerEvent(C_EVENT.EVENT_TIMER_EXPIRED, self.__processTimerExpired)
+
+    def __run(self, queue, n):
         """引擎运行"""
+        if self.__stats is not None:
+            self.__runWithStats(queue, self.__stats[n])
+            return
+
+        process = self.__process
+        self.__local.process = process
+        self.__local.depth = 0
+
+        batchSize = self.drainBatchSize
         while self.__active == True:
-            try:
-                # 获取事件的阻塞时间设为1秒
-                event = self.__queue.get(block = True, timeout = 1)
-                self.__process(event)
-            except Empty:
-                pass
+            # 队列为空时阻塞等待, 超时时间设为1秒
+            if not queue.drain(process, batchSize):
+                queue.wait(1)
+
+    def __runWithStats(self, queue, workerStats):
+        """开启统计时的引擎运行"""
+        def process(event):
+            self.__processWithStats(event, workerStats)
+
+        self.__local.process = process
+        self.__local.depth = 0
+
+        batchSize = self.drainBatchSize
+        interval = self.__depthSampleInterval
+        while self.__active == True:
+            if time() - workerStats.lastSampleTime >= interval:
+                workerStats.sampleDepth(queue.qsize())
+
+            if not queue.drain(process, batchSize):
+                queue.wait(1)
 
     def __process(self, event):
-        """处理事件"""
-        if event.type_ in self.__handlers:
-            [handler(event) for handler in self.__handlers[event.type_]]
+        """处理事件, 单个处理函数出错时记录日志, 不影响其他处理函数和后续事件"""
+        handlers = self.__handlers.get(event.type_, None)
+        if handlers:
+            for handler in handlers:
+                try:
+                    handler(event)
+                except Exception:
+                    self.__onHandlerError(handler, event)
+
+        if event.key is not None:
+            keyed = self.__keyedHandlers.get(event.type_, None)
+            if keyed:
+                handlers = keyed.get(event.key, None)
+                if handlers:
+                    for handler in handlers:
+                        try:
+                            handler(event)
+                        except Exception:
+                            self.__onHandlerError(handler, event)
+
+        for handler in self.__generalHandlers:
+            try:
+                handler(event)
+            except Exception:
+                self.__onHandlerError(handler, event)
+
+    def __onHandlerError(self, handler, event):
+        """记录处理函数抛出的异常, 需在 except 块中调用"""
+        self.log.exception('Handler {hd} failed on {tp}'.format(
+            hd=handlerName(handler), tp=event.type_))
+
+    def __processWithStats(self, event, workerStats):
+        """处理事件并记录耗时"""
+        putTime = getattr(event, 'putTime', None)
+        if putTime is not None:
+            elapsed = perf_counter() - putTime
+            workerStats.recordQueue(event.type_, elapsed)
+            if self.__laneNames is not None:
+                workerStats.recordLane(self.__laneNames[self.__eventLane(event)], elapsed)
+
+        handlers = self.__handlers.get(event.type_, None)
+        if handlers:
+            for handler in handlers:
+                self.__callWithStats(handler, event, workerStats)
+
+        if event.key is not None:
+            keyed = self.__keyedHandlers.get(event.type_, None)
+            if keyed:
+                handlers = keyed.get(event.key, None)
+                if handlers:
+                    for handler in handlers:
+                        self.__callWithStats(handler, event, workerStats)
+
+        for handler in self.__generalHandlers:
+            self.__callWithStats(handler, event, workerStats)
+
+    def __callWithStats(self, handler, event, workerStats):
+        """调用处理函数, 记录耗时并检查是否超出预算"""
+        start = perf_counter()
+        try:
+            handler(event)
+        except Exception:
+            self.__onHandlerError(handler, event)
+        elapsed = perf_counter() - start
 
-        if self.__generalHandlers:
-            [handler(event) for handler in self.__generalHandlers]
+        try:
+            name = self.__handlerNames[handler]
+        except KeyError:
+            name = handlerName(handler)
+            self.__handlerNames[handler] = name
+        workerStats.recordHandler(name, elapsed)
+
+        budget = self.__handlerBudget
+        if budget and elapsed > budget and workerStats.recordSlow(name, self.__alertInterval):
+            self.log.warning('Slow handler {hd}: {el:.6f}s > {bg}s on {tp}'.format(
+                hd=name, el=elapsed, bg=budget, tp=event.type_))
+
+            alert = Event(type_=C_EVENT.EVENT_SLOW_HANDLER)
+            alert.dict_['data'] = {
+                'handler': name,
+                'eventType': event.type_,
+                'elapsed': elapsed,
+                'budget': budget
+            }
+            self.putEvent(alert)
+
+    def __nowTick(self):
+        return int(monotonic() / self.timerResolution)
 
     def __runTimer(self):
-        """运行在计时器线程中的循环函数"""
+        """运行在计时器线程中的循环函数, 只在最近的计时器到期时醒来"""
+        wheel = self.__timerWheel
+        condition = self.__timerCondition
+        resolution = self.timerResolution
         while self.__timerActive:
-            event = Event(type_=C_EVENT.EVENT_TIMER)
+            for handle in wheel.advance(self.__nowTick()):
+                handle.callback(handle)
+
+            with condition:
+                ticks = wheel.nextTimeout(self.timerMaxSleepTicks)
+                if self.__timerActive:
+                    condition.wait((ticks + 1) * resolution)
+
+    def __putTimerBroadcast(self, handle):
+        self.putEvent(Event(type_=C_EVENT.EVENT_TIMER))
+
+    def __processTimerExpired(self, event):
+        """在处理线程中调用到期计时器对应的函数"""
+        if not event.dict_['data'].cancelled:
+            event.dict_['handler'](event)
+
+    def scheduleTimer(self, delay, handler, interval=None):
+        """
+        注册计时器, 返回计时器编号
+        delay: 首次到期前的秒数, 精度为 timerResolution
+        handler: 到期时在事件处理线程中调用, 参数为 EVENT_TIMER_EXPIRED 事件,
+                 event.dict_['data'] 为计时器对象, 其 timerId 可用于撤销
+        interval: 周期计时器的间隔秒数, 为 None 时只触发一次
+        """
+        def putExpired(handle):
+            event = Event(type_=C_EVENT.EVENT_TIMER_EXPIRED)
+            event.dict_['data'] = handle
+            event.dict_['handler'] = handler
             self.putEvent(event)
-            sleep(self.__timerSleep)
+
+        return self.__scheduleTimer(delay, putExpired, interval)
+
+    def __scheduleTimer(self, delay, callback, interval):
+        resolution = self.timerResolution
+        if interval is not None:
+            interval = max(int(round(interval / resolution)), 1)
+
+        with self.__timerCondition:
+            timerId = self.__timerWheel.schedule(
+                int(round(delay / resolution)), callback, interval)
+            # 新计时器可能早于计时器线程当前的休眠截止时间
+            self.__timerCondition.notify()
+        return timerId
+
+    def cancelTimer(self, timerId):
+        """撤销计时器, 返回是否撤销成功"""
+        return self.__timerWheel.cancel(timerId)
 
     def start(self, timer=True):
         """
@@ -209,52 +574,236 @@ class EventEngine2(LoggingMixin):
         """
         self.log.debug('EventEngine2 start')
         self.__active = True
-        self.__thread.start()
+        for thread in self.__threads:
+            thread.start()
+        for subscriber in list(self.__conflated.values()):
+            subscriber.start()
+
         if timer:
-            self.__timerActive = True
-            self.__timer.start()
+            self.__timerBroadcastId = self.__scheduleTimer(
+                0, self.__putTimerBroadcast, self.__timerSleep)
+        self.__timerActive = True
+        self.__timer.start()
 
     def stop(self):
         self.log.debug('EventEngine2 stop')
         self.__active = False
-        self.__timerActive = False
+
+        # 唤醒阻塞在有界队列上的生产线程
+        if self.__bounded:
+            for queue in self.__queues:
+                queue.stop()
+
+        with self.__timerCondition:
+            self.__timerActive = False
+            self.__timerCondition.notify()
         self.__timer.join()
 
+        if self.__timerBroadcastId is not None:
+            self.cancelTimer(self.__timerBroadcastId)
+            self.__timerBroadcastId = None
+
         # 等待事件处理线程退出
-        self.__thread.join()
+        for thread in self.__threads:
+            thread.join()
+
+        for subscriber in list(self.__conflated.values()):
+            subscriber.stop()
+
+    def __onQueueAlarm(self, n, level, size):
+        """有界队列越过高/低水位时发出报警事件"""
+        queue = self.__queues[n]
+        if level == 'high':
+            self.log.warning('Event queue {n} backlog {s} reached high watermark {h}'.format(
+                n=n, s=size, h=queue.highWatermark))
+        else:
+            self.log.info('Event queue {n} backlog {s} back to low watermark {l}'.format(
+                n=n, s=size, l=queue.lowWatermark))
+
+        alarm = Event(type_=C_EVENT.EVENT_QUEUE_ALARM)
+        alarm.dict_['data'] = {
+            'worker': n,
+            'level': level,
+            'size': size,
+            'maxSize': queue.maxSize
+        }
+        queue.putForced(alarm)
+
+    def __eventLane(self, event):
+        """事件所属的优先级车道, 带子键的旧式类型按前缀归类"""
+        type_ = event.type_
+        try:
+            return self.__laneOf[type_]
+        except KeyError:
+            topic = splitTopic(type_)
+            lane = self.__laneOf.get(topic[0], None) if topic else None
+            if lane is None:
+                lane = len(self.__laneNames) - 1
+            self.__laneOf[type_] = lane
+            return lane
+
+    def enableIngressStamp(self):
+        """putEvent 时在事件上记录进入队列的时间 ingressNs(monotonic_ns), 供事件日志使用"""
+        self.__stampIngress = True
 
     def putEvent(self, event):
-        self.__queue.put(event)
+        if self.__stats is not None:
+            event.putTime = perf_counter()
+        if self.__stampIngress:
+            event.ingressNs = monotonic_ns()
 
-    def registerEvent(self, type_, handler):
-        handlerList = self.__handlers[type_]
+        if self.__workerCount == 1:
+            queue = self.__queue
+        else:
+            key = self.__routingKey(event)
+            queue = self.__queues[hash(key) % self.__workerCount]
 
-        if handler not in handlerList:
-            handlerList.append(handler)
-            self.log.debug('Register {hd} for {tp}'.format(
-                hd=handler.__name__, tp=type_))
+        if self.__laneNames is None:
+            queue.put(event)
+        else:
+            queue.put(event, self.__eventLane(event))
 
-    def unregisterEvent(self, type_, handler):
+    def putDerivedEvent(self, event):
+        """
+        发布由当前事件派生的事件, 如价差行情, 按合约重发的数据
+        在处理函数中调用时立即在当前处理线程中分发(多分片时不再按 routingKey 路由),
+        省去一次排队; 不在处理线程中或嵌套超过 maxDerivedDepth 层时与 putEvent 相同
+        """
+        state = self.__local
+        process = getattr(state, 'process', None)
+        if process is None:
+            self.putEvent(event)
+            return
+
+        if state.depth >= self.maxDerivedDepth:
+            self.log.debug('Derived event {tp} exceeds depth {d}, queued'.format(
+                tp=event.type_, d=self.maxDerivedDepth))
+            self.putEvent(event)
+            return
+
+        state.depth += 1
         try:
-            self.__handlers[type_].remove(handler)
-            self.log.debug('Unregister {hd} for {tp}'.format(
-                hd=handler.__name__, tp=type_))
-        except ValueError:
-            pass
+            process(event)
+        finally:
+            state.depth -= 1
 
-        if len(self.__handlers[type_]) == 0:
-            del self.__handlers[type_]
+    @property
+    def workerCount(self):
+        return self.__workerCount
+
+    def getStats(self):
+        """
+        查询运行统计, 未开启统计时返回 None
+        返回值只包含基础类型, 可以直接通过 RPC 传输
+        """
+        if self.__stats is None:
+            return None
+
+        d = mergeWorkerStats(self.__stats)
+        d['workerCount'] = self.__workerCount
+        d['queueSize'] = sum([queue.qsize() for queue in self.__queues])
+        d['handlerBudget'] = self.__handlerBudget
+        if self.__laneNames is not None:
+            d['laneSize'] = {
+                name: sum([queue.lanes[lane].qsize() for queue in self.__queues])
+                for lane, name in enumerate(self.__laneNames)}
+        return d
+
+    def getOverloadStats(self):
+        """
+        查询有界队列的积压及各策略的计数, 未开启有界模式时返回 None
+        blocked/dropped/conflated/rejected 的 key 为事件类型
+        """
+        if not self.__bounded:
+            return None
+
+        d = {'size': 0, 'maxSize': 0, 'blocked': {}, 'dropped': {},
+             'conflated': {}, 'rejected': {}}
+        for queue in self.__queues:
+            qs = queue.getStats()
+            d['size'] += qs['size']
+            d['maxSize'] += qs['maxSize']
+            for name in ('blocked', 'dropped', 'conflated', 'rejected'):
+                for type_, count in qs[name].items():
+                    d[name][type_] = d[name].get(type_, 0) + count
+        return d
+
+    def registerEvent(self, type_, handler):
+        with self.__handlerLock:
+            handlers = self.__handlers.get(type_, ())
+            if handler not in handlers:
+                self.__handlers[type_] = handlers + (handler,)
+                self.__rebuildKeyedHandlers()
+                self.log.debug('Register {hd} for {tp}'.format(
+                    hd=handler.__name__, tp=type_))
+
+    def unregisterEvent(self, type_, handler):
+        with self.__handlerLock:
+            handlers = self.__handlers.get(type_, ())
+            if handler in handlers:
+                handlers = tuple([h for h in handlers if h != handler])
+                self.log.debug('Unregister {hd} for {tp}'.format(
+                    hd=handler.__name__, tp=type_))
+
+                if handlers:
+                    self.__handlers[type_] = handlers
+                else:
+                    del self.__handlers[type_]
+                self.__rebuildKeyedHandlers()
+
+    def registerConflatedEvent(self, type_, handler, keyFunc=None):
+        """
+        以合并推送方式注册处理函数
+        同一键值(默认为 vtSymbol)只保留最新的待推送事件, 处理函数在独立线程中调用,
+        适用于只关心最新状态的界面和推送服务; 策略, 行情记录等仍应使用 registerEvent
+        """
+        with self.__handlerLock:
+            if (type_, handler) in self.__conflated:
+                return
+            subscriber = ConflatingSubscriber(type_, handler, keyFunc or conflationKey)
+            self.__conflated[(type_, handler)] = subscriber
+
+        self.registerEvent(type_, subscriber.put)
+        if self.__active:
+            subscriber.start()
+        self.log.debug('Register conflated {hd} for {tp}'.format(
+            hd=subscriber.name, tp=type_))
+
+    def unregisterConflatedEvent(self, type_, handler):
+        with self.__handlerLock:
+            subscriber = self.__conflated.pop((type_, handler), None)
+        if subscriber is None:
+            return
+
+        self.unregisterEvent(type_, subscriber.put)
+        subscriber.stop()
+        self.log.debug('Unregister conflated {hd} for {tp}'.format(
+            hd=subscriber.name, tp=type_))
+
+    def getConflationStats(self):
+        """查询各合并推送订阅者的收到, 推送, 丢弃数量"""
+        return [subscriber.getStats() for subscriber in list(self.__conflated.values())]
+
+    def __rebuildKeyedHandlers(self):
+        """根据 __handlers 重建两级主题索引, 需在 __handlerLock 内调用"""
+        keyedHandlers = {}
+        for type_, handlers in self.__handlers.items():
+            topic = splitTopic(type_)
+            if topic:
+                prefix, key = topic
+                keyedHandlers.setdefault(prefix, {})[key] = handlers
+        self.__keyedHandlers = keyedHandlers
 
     def registerGeneralHandler(self, handler):
-        if handler not in self.__generalHandlers:
-            self.__generalHandlers.append(handler)
-            self.log.debug('Register General Handler {hd}'.format(hd=handler.__name__))
+        with self.__handlerLock:
+            if handler not in self.__generalHandlers:
+                self.__generalHandlers = self.__generalHandlers + (handler,)
+                self.log.debug('Register General Handler {hd}'.format(hd=handler.__name__))
 
     def unregisterGeneralHandler(self, handler):
-        # thread-safe way to remove element
-        try:
-            self.__generalHandlers.remove(handler)
-            self.log.debug('Unregister General Handler {hd}'.format(hd=handler.__name__))
-        except ValueError:
-            pass
+        with self.__handlerLock:
+            if handler in self.__generalHandlers:
+                self.__generalHandlers = tuple(
+                    [h for h in self.__generalHandlers if h != handler])
+                self.log.debug('Unregister General Handler {hd}'.format(hd=handler.__name__))
 
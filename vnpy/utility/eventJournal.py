@@ -0,0 +1,272 @@
+# encoding: UTF-8
+
+"""
+事件日志: 把事件引擎中的行情, 委托, 成交等事件以紧凑的二进制格式追加写入文件,
+用于事后按原始节奏重放, 离线复现处理函数卡顿时的负载.
+
+文件由若干帧组成, 每帧为 4 字节长度 + marshal 编码的内容:
+    头部帧: dict, 每次打开文件时写入, 包含 monotonic_ns 与墙上时间的对应关系
+    事件帧: (monotonic_ns, 事件类型, 子键, 数据类名, 数据字段 dict, datetime 字段名 tuple)
+进程重启后 monotonic_ns 的起点会变化, 因此重放时以最近的头部帧为基准.
+
+日志按交易时段分文件: 8点至20点为日盘, 20点至次日8点为夜盘(归入开始当天).
+"""
+
+import os
+import struct
+import marshal
+from time import time, sleep, monotonic_ns, perf_counter
+from datetime import datetime, timedelta
+from collections import deque
+from threading import Thread, Event as ThreadEvent
+
+from vnpy.vtConstant import C_EVENT
+from vnpy.base_class import (Event, TickData, OrderData, TradeData, PositionData,
+                             AccountData, ContractData)
+from vnpy.utility.logging_mixin import LoggingMixin
+
+
+JOURNAL_VERSION = 1
+
+# 默认记录的事件类型
+JOURNAL_EVENT_TYPES = (
+    C_EVENT.EVENT_TICK,
+    C_EVENT.EVENT_ORDER,
+    C_EVENT.EVENT_TRADE,
+    C_EVENT.EVENT_POSITION,
+    C_EVENT.EVENT_ACCOUNT,
+    C_EVENT.EVENT_CONTRACT,
+    C_EVENT.EVENT_TIMER,
+)
+
+# 重放时按类名还原的数据类
+DATA_CLASSES = {cls.__name__: cls for cls in (
+    TickData, OrderData, TradeData, PositionData, AccountData, ContractData)}
+
+# 交易时段分界(小时)
+DAY_SESSION_HOUR = 8
+NIGHT_SESSION_HOUR = 20
+
+# marshal 可直接编码的字段类型, 其他类型保存为 str
+PLAIN_TYPES = (str, int, float, bool, type(None))
+
+FRAME_HEADER = struct.Struct('<I')
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def sessionName(dt):
+    """交易时段名称, 如 '20191009-day', 夜盘归入开始当天, 如 '20191009-night'"""
+    if dt.hour >= NIGHT_SESSION_HOUR:
+        return dt.strftime('%Y%m%d') + '-night'
+    if dt.hour < DAY_SESSION_HOUR:
+        return (dt - timedelta(days=1)).strftime('%Y%m%d') + '-night'
+    return dt.strftime('%Y%m%d') + '-day'
+
+
+def snapshotEvent(event, ns):
+    """在处理线程中复制事件内容, 编码留给写入线程"""
+    data = event.dict_.get('data', None)
+    if data is None:
+        return ns, event.type_, event.key, None, None
+    return ns, event.type_, event.key, type(data).__name__, data.toDict()
+
+
+def encodeRecord(record):
+    """把 snapshotEvent 的结果编码为一帧"""
+    ns, type_, key, className, fields = record
+    dtNames = ()
+    if fields is not None:
+        fields.pop('rawData', None)
+        for name, value in fields.items():
+            if type(value) in PLAIN_TYPES:
+                continue
+            if isinstance(value, datetime):
+                fields[name] = (value - EPOCH) // MICROSECOND
+                dtNames += (name,)
+            else:
+                fields[name] = str(value)
+
+    payload = marshal.dumps((ns, type_, key, className, fields, dtNames))
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+
+def decodeEvent(frame):
+    """把事件帧还原为 (monotonic_ns, Event)"""
+    ns, type_, key, className, fields, dtNames = frame
+    event = Event(type_=type_, key=key)
+    if className is not None:
+        cls = DATA_CLASSES.get(className, None)
+        for name in dtNames:
+            fields[name] = EPOCH + timedelta(microseconds=fields[name])
+
+        if cls is None:
+            event.dict_['data'] = fields
+        else:
+            fields['rawData'] = None
+            event.dict_['data'] = cls.fromDict(fields)
+    return ns, event
+
+
+def readJournal(path):
+    """
+    依次读取日志文件中的帧, 头部帧返回 dict, 事件帧返回 (monotonic_ns, Event)
+    文件末尾不完整的帧(进程异常退出时)会被忽略
+    """
+    size = FRAME_HEADER.size
+    with open(path, 'rb') as f:
+        while True:
+            head = f.read(size)
+            if len(head) < size:
+                return
+            length, = FRAME_HEADER.unpack(head)
+            payload = f.read(length)
+            if len(payload) < length:
+                return
+
+            frame = marshal.loads(payload)
+            if type(frame) is dict:
+                yield frame
+            else:
+                yield decodeEvent(frame)
+
+
+class EventJournal(LoggingMixin):
+    """
+    事件日志写入器
+
+    register 之后作为普通处理函数监听 eventTypes 中的事件; 处理线程中只复制数据字段,
+    时间取事件进入队列时的 ingressNs(没有时为处理时的 monotonic_ns), 重放时按该时间间隔
+    还原事件到达的节奏, 不受处理积压的影响; 编码和写文件在单独的写入线程中每 flushInterval 秒进行一次,
+    分片模式下多个处理线程可以同时写入.
+    文件名为 '<prefix>_<交易时段>.vnj', 写入线程发现交易时段变化时切换到新文件.
+    """
+
+    def __init__(self, folder, prefix='journal', eventTypes=JOURNAL_EVENT_TYPES,
+                 flushInterval=0.1):
+        self.folder = os.path.expanduser(folder)
+        self.prefix = prefix
+        self.eventTypes = tuple(eventTypes)
+        self.flushInterval = flushInterval
+
+        self.path = None
+        self.recordCount = 0
+
+        self.__session = None
+        self.__file = None
+        self.__pending = deque()
+        self.__active = True
+        self.__wakeup = ThreadEvent()
+
+        if not os.path.isdir(self.folder):
+            os.makedirs(self.folder)
+
+        self.__thread = Thread(target=self.__run, name='EventJournal')
+        self.__thread.start()
+
+    def register(self, eventEngine):
+        eventEngine.enableIngressStamp()
+        for eventType in self.eventTypes:
+            eventEngine.registerEvent(eventType, self.onEvent)
+
+    def unregister(self, eventEngine):
+        for eventType in self.eventTypes:
+            eventEngine.unregisterEvent(eventType, self.onEvent)
+
+    def onEvent(self, event):
+        ns = getattr(event, 'ingressNs', 0) or monotonic_ns()
+        self.__pending.append(snapshotEvent(event, ns))
+
+    def __run(self):
+        while self.__active:
+            self.__wakeup.wait(self.flushInterval)
+            self.__flush()
+        self.__flush()
+
+    def __flush(self):
+        pending = self.__pending
+        if not pending:
+            return
+
+        session = sessionName(datetime.now())
+        if session != self.__session:
+            self.__rotate(session)
+
+        frames = []
+        while pending:
+            frames.append(encodeRecord(pending.popleft()))
+        self.__file.write(b''.join(frames))
+        self.__file.flush()
+        self.recordCount += len(frames)
+
+    def __rotate(self, session):
+        """切换到交易时段对应的文件, 同一时段重启时追加写入"""
+        if self.__file is not None:
+            self.__file.close()
+
+        self.__session = session
+        self.path = os.path.join(self.folder, '{p}_{s}.vnj'.format(p=self.prefix, s=session))
+        self.__file = open(self.path, 'ab')
+
+        header = {
+            'version': JOURNAL_VERSION,
+            'session': session,
+            'monotonicNs': monotonic_ns(),
+            'time': time(),
+        }
+        payload = marshal.dumps(header)
+        self.__file.write(FRAME_HEADER.pack(len(payload)) + payload)
+        self.log.info('Event journal {path} opened'.format(path=self.path))
+
+    def close(self):
+        """写完所有待写入的事件后关闭文件"""
+        self.__active = False
+        self.__wakeup.set()
+        self.__thread.join()
+        if self.__file is not None:
+            self.__file.close()
+            self.__file = None
+
+
+class JournalReplayer(LoggingMixin):
+    """
+    把日志中的事件依次 putEvent 到目标(MainEngine 或事件引擎)
+
+    speed 为 1 时按原始间隔重放, 为 N 时按 N 倍速, 为 None 或 0 时不等待, 尽快重放.
+    目标的事件引擎应以 start(timer=False) 启动, EVENT_TIMER 由日志重放.
+    """
+
+    def __init__(self, target, speed=1.0):
+        self.target = target
+        self.speed = speed
+        self.replayCount = 0
+
+    def replay(self, paths):
+        """依次重放多个日志文件, 返回重放的事件数量"""
+        if isinstance(paths, str):
+            paths = [paths]
+
+        putEvent = self.target.putEvent
+        speed = self.speed
+        for path in paths:
+            self.log.info('Replaying event journal {path}'.format(path=path))
+            baseNs = None
+            baseTime = None
+            for frame in readJournal(path):
+                if type(frame) is dict:
+                    # 新的一段(进程重启), 与上一段之间不等待
+                    baseNs = None
+                    continue
+
+                ns, event = frame
+                if speed:
+                    if baseNs is None:
+                        baseNs = ns
+                        baseTime = perf_counter()
+                    delay = (ns - baseNs) / 1e9 / speed - (perf_counter() - baseTime)
+                    if delay > 0:
+                        sleep(delay)
+
+                putEvent(event)
+                self.replayCount += 1
+        return self.replayCount
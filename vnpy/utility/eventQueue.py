@@ -0,0 +1,373 @@
+# encoding: UTF-8
+
+from collections import deque
+from threading import Lock, Condition, Event as ThreadEvent, get_ident, local, current_thread
+
+from vnpy.vtConstant import C_OVERLOAD
+
+
+class IngressRingQueue(object):
+    """
+    多生产者单消费者的事件队列
+
+    每个生产线程(gateway 回调线程, 计时器线程等)写入自己独占的 deque,
+    CPython 中 deque 的 append/popleft 是原子操作, 因此生产端不需要加锁;
+    消费线程通过 drain 按批次依次取空各个 ring.
+
+    顺序只在同一生产者内保证: 同一线程写入的事件按写入先后处理, 不同线程写入的事件
+    之间没有全局顺序, 先写入的事件可能晚于其他线程后写入的事件被处理.
+    需要跨线程保持先后的事件应由同一线程写入.
+
+    ring 通过 threading.local 与生产线程绑定, 线程 ident 被复用时新线程也会得到新的 ring;
+    新生产者加入时回收已退出线程的空 ring, ring 数量不随线程的创建退出无限增长.
+    非 threading 创建的线程(如 C 扩展的回调线程)无法判断是否退出, 其 ring 不回收.
+
+    方法说明
+    put: 生产端写入事件
+    drain: 消费端批量取出事件并逐个交给处理函数, 返回处理数量
+    wait: 消费端在队列为空时阻塞等待, 直到有新事件或超时
+    qsize: 当前积压的事件数量
+    ringCount: 当前的 ring 数量
+    """
+
+    def __init__(self, wakeup=None):
+        # 当前生产线程的 ring
+        self.__local = local()
+        # (生产线程, ring) 列表, 用于回收已退出线程的 ring
+        self.__owners = []
+        # 供消费端遍历的 ring 快照, 仅在新增或回收 ring 时重建
+        self.__ringTuple = ()
+        self.__lock = Lock()
+
+        # 消费端休眠时由生产端唤醒, 多个队列可以共用一个唤醒标志
+        self.__wakeup = wakeup if wakeup is not None else ThreadEvent()
+
+    def __addRing(self):
+        """为新的生产线程创建 ring, 同时回收已退出线程的空 ring"""
+        ring = deque()
+        with self.__lock:
+            # 线程退出后不会再写入, 先确认退出再检查为空, 回收时不会丢失事件
+            owners = [(thread, r) for thread, r in self.__owners if thread.is_alive() or r]
+            owners.append((current_thread(), ring))
+            self.__owners = owners
+            self.__ringTuple = tuple([r for _, r in owners])
+        self.__local.ring = ring
+        return ring
+
+    def put(self, event):
+        try:
+            ring = self.__local.ring
+        except AttributeError:
+            ring = self.__addRing()
+
+        ring.append(event)
+
+        # 只有消费端已休眠时才需要付出唤醒的加锁开销
+        if not self.__wakeup.is_set():
+            self.__wakeup.set()
+
+    def drain(self, process, maxCount):
+        """每个 ring 最多取出 maxCount 个事件交给 process 处理"""
+        count = 0
+        for ring in self.__ringTuple:
+            n = len(ring)
+            if not n:
+                continue
+            if n > maxCount:
+                n = maxCount
+
+            popleft = ring.popleft
+            for _ in range(n):
+                process(popleft())
+            count += n
+        return count
+
+    def wait(self, timeout):
+        self.__wakeup.clear()
+
+        # 清除标志后再检查一次, 避免错过清除前刚写入的事件
+        if self.qsize():
+            return
+        self.__wakeup.wait(timeout)
+
+    def qsize(self):
+        return sum([len(ring) for ring in self.__ringTuple])
+
+    def ringCount(self):
+        """当前的 ring 数量"""
+        return len(self.__ringTuple)
+
+
+class PriorityRingQueue(object):
+    """
+    按优先级分道的事件队列
+
+    每个优先级一条车道, 车道内部为 IngressRingQueue, 同一生产者写入同一车道的事件保持先后顺序,
+    不同车道之间不保证顺序;
+    所有车道共用一个唤醒标志. drain 按加权轮转从高到低依次取出各车道的事件,
+    车道 i 每轮每个 ring 最多取出 maxCount * weights[i] / weights[0] 个(至少1个),
+    因此高优先级事件最多等待一轮即被处理, 低优先级车道也不会饿死.
+
+    方法与 IngressRingQueue 相同, put 需额外指定车道序号.
+    """
+
+    def __init__(self, weights):
+        self.__wakeup = ThreadEvent()
+        self.lanes = [IngressRingQueue(self.__wakeup) for _ in weights]
+        self.__weights = list(weights)
+        self.__quotaCache = {}
+
+    def __quotas(self, maxCount):
+        try:
+            return self.__quotaCache[maxCount]
+        except KeyError:
+            top = max(self.__weights)
+            quotas = list(zip(self.lanes, [max(maxCount * w // top, 1) for w in self.__weights]))
+            self.__quotaCache[maxCount] = quotas
+            return quotas
+
+    def put(self, event, lane):
+        self.lanes[lane].put(event)
+
+    def drain(self, process, maxCount):
+        count = 0
+        for lane, quota in self.__quotas(maxCount):
+            count += lane.drain(process, quota)
+        return count
+
+    def wait(self, timeout):
+        self.__wakeup.clear()
+
+        # 清除标志后再检查一次, 避免错过清除前刚写入的事件
+        if self.qsize():
+            return
+        self.__wakeup.wait(timeout)
+
+    def qsize(self):
+        return sum([lane.qsize() for lane in self.lanes])
+
+
+class BoundedEventQueue(object):
+    """
+    有界事件队列
+
+    积压的事件数达到 maxSize 后按事件类型的策略处理新事件(C_OVERLOAD):
+    BLOCK: 阻塞生产线程直到有空位(处理线程自己写入的事件不阻塞, 避免死锁)
+    DROP_OLDEST: 丢弃队列中同类型最早的事件后写入, 队列中没有同类型事件时丢弃新事件
+    CONFLATE: 同类型同键值已有待处理事件时直接替换其内容; 没有可替换的事件时丢弃同类型
+              最早的事件后写入, 队列中没有同类型事件时丢弃新事件
+    REJECT: 丢弃新事件
+    除 BLOCK 在处理线程自己写入时以外, 积压的事件数不超过 maxSize(putForced 写入的除外).
+
+    需要被丢弃或替换的类型在队列中保存为单元素 list, 丢弃时置为 None, 处理时跳过.
+    积压达到 highWatermark 时调用 onAlarm('high', size), 之后回落到 lowWatermark
+    时调用 onAlarm('low', size); onAlarm 在锁外调用, 可以通过 putForced 写入报警事件.
+
+    方法与 IngressRingQueue 相同, 另有 putForced(不受容量限制写入), stop(唤醒所有
+    阻塞的生产线程) 和 getStats.
+    """
+
+    def __init__(self, maxSize, policies=None, defaultPolicy=C_OVERLOAD.OVERLOAD_BLOCK,
+                 keyFunc=None, highWatermark=None, lowWatermark=None, onAlarm=None):
+        self.maxSize = maxSize
+        self.__policies = dict(policies or {})
+        self.__defaultPolicy = defaultPolicy
+        self.__policyCache = {}
+        self.__keyFunc = keyFunc
+
+        self.highWatermark = highWatermark if highWatermark is not None else int(maxSize * 0.8)
+        self.lowWatermark = lowWatermark if lowWatermark is not None else maxSize // 2
+        self.__onAlarm = onAlarm
+        self.__alarmed = False
+
+        self.__queue = deque()
+        self.__size = 0                 # 有效事件数, 不含已丢弃的占位
+        self.__lock = Lock()
+        self.__notFull = Condition(self.__lock)
+        self.__wakeup = ThreadEvent()
+        self.__active = True
+        self.__consumer = None          # 处理线程 ident
+
+        # DROP_OLDEST/CONFLATE: key: 事件类型, value: 该类型尚未处理的占位 deque
+        self.__slotsByType = {}
+        # CONFLATE: key: (事件类型, 键值), value: 最新的占位
+        self.__slotsByKey = {}
+
+        # 各类型的计数
+        self.blocked = {}
+        self.dropped = {}
+        self.conflated = {}
+        self.rejected = {}
+
+    def __policy(self, type_):
+        """事件类型对应的策略, 'eTick.rb1910' 之类的旧式类型按前缀 'eTick.' 查找"""
+        try:
+            return self.__policyCache[type_]
+        except KeyError:
+            policy = self.__policies.get(type_, None)
+            if policy is None and isinstance(type_, str) and '.' in type_:
+                policy = self.__policies.get(type_[:type_.index('.') + 1], None)
+            if policy is None:
+                policy = self.__defaultPolicy
+            self.__policyCache[type_] = policy
+            return policy
+
+    @staticmethod
+    def __count(counter, type_):
+        counter[type_] = counter.get(type_, 0) + 1
+
+    def put(self, event):
+        """写入事件, 返回是否被接受"""
+        type_ = event.type_
+        policy = self.__policy(type_)
+        key = self.__keyFunc(event) if policy == C_OVERLOAD.OVERLOAD_CONFLATE else None
+        alarm = None
+
+        with self.__lock:
+            if self.__size >= self.maxSize:
+                if policy == C_OVERLOAD.OVERLOAD_REJECT:
+                    self.__count(self.rejected, type_)
+                    return False
+
+                elif policy == C_OVERLOAD.OVERLOAD_BLOCK:
+                    if get_ident() != self.__consumer:
+                        self.__count(self.blocked, type_)
+                        while self.__active and self.__size >= self.maxSize:
+                            self.__notFull.wait(1)
+
+                elif policy == C_OVERLOAD.OVERLOAD_DROP_OLDEST:
+                    if not self.__dropOldest(type_):
+                        # 队列中没有同类型事件时丢弃新事件, 不超出容量
+                        self.__count(self.rejected, type_)
+                        return False
+
+                elif policy == C_OVERLOAD.OVERLOAD_CONFLATE:
+                    slot = self.__slotsByKey.get((type_, key), None)
+                    if slot is not None:
+                        slot[0] = event
+                        self.__count(self.conflated, type_)
+                        return True
+                    if not self.__dropOldest(type_):
+                        self.__count(self.rejected, type_)
+                        return False
+
+            self.__append(event, policy, key)
+            if not self.__alarmed and self.__size >= self.highWatermark:
+                self.__alarmed = True
+                alarm = ('high', self.__size)
+
+        if not self.__wakeup.is_set():
+            self.__wakeup.set()
+        if alarm and self.__onAlarm:
+            self.__onAlarm(*alarm)
+        return True
+
+    def __dropOldest(self, type_):
+        """丢弃同类型最早的待处理事件, 没有时返回 False, 需在锁内调用"""
+        slots = self.__slotsByType.get(type_, None)
+        if not slots:
+            return False
+
+        slot = slots.popleft()
+        event = slot[0]
+        slot[0] = None
+        if self.__policy(type_) == C_OVERLOAD.OVERLOAD_CONFLATE:
+            key = (type_, self.__keyFunc(event))
+            if self.__slotsByKey.get(key, None) is slot:
+                del self.__slotsByKey[key]
+        self.__size -= 1
+        self.__count(self.dropped, type_)
+        return True
+
+    def __append(self, event, policy, key=None):
+        """写入队列, 需在锁内调用"""
+        if policy == C_OVERLOAD.OVERLOAD_DROP_OLDEST or policy == C_OVERLOAD.OVERLOAD_CONFLATE:
+            slot = [event]
+            slots = self.__slotsByType.get(event.type_, None)
+            if slots is None:
+                slots = deque()
+                self.__slotsByType[event.type_] = slots
+            slots.append(slot)
+            if policy == C_OVERLOAD.OVERLOAD_CONFLATE:
+                self.__slotsByKey[(event.type_, key)] = slot
+            self.__queue.append(slot)
+        else:
+            self.__queue.append(event)
+        self.__size += 1
+
+    def putForced(self, event):
+        """不受容量和策略限制地写入, 用于报警等内部事件"""
+        with self.__lock:
+            self.__queue.append(event)
+            self.__size += 1
+        self.__wakeup.set()
+
+    def __take(self, item):
+        """取出一个队列元素对应的事件, 已丢弃的占位返回 None, 需在锁内调用"""
+        if type(item) is not list:
+            return item
+
+        event = item[0]
+        if event is None:
+            return None
+
+        self.__slotsByType[event.type_].popleft()
+        if self.__policy(event.type_) == C_OVERLOAD.OVERLOAD_CONFLATE:
+            key = (event.type_, self.__keyFunc(event))
+            if self.__slotsByKey.get(key, None) is item:
+                del self.__slotsByKey[key]
+        return event
+
+    def drain(self, process, maxCount):
+        """最多取出 maxCount 个事件交给 process 处理"""
+        self.__consumer = get_ident()
+        events = []
+        alarm = None
+        with self.__lock:
+            queue = self.__queue
+            while queue and len(events) < maxCount:
+                event = self.__take(queue.popleft())
+                if event is not None:
+                    events.append(event)
+
+            if events:
+                self.__size -= len(events)
+                self.__notFull.notify_all()
+                if self.__alarmed and self.__size <= self.lowWatermark:
+                    self.__alarmed = False
+                    alarm = ('low', self.__size)
+
+        if alarm and self.__onAlarm:
+            self.__onAlarm(*alarm)
+
+        for event in events:
+            process(event)
+        return len(events)
+
+    def wait(self, timeout):
+        self.__wakeup.clear()
+
+        # 清除标志后再检查一次, 避免错过清除前刚写入的事件
+        if self.qsize():
+            return
+        self.__wakeup.wait(timeout)
+
+    def qsize(self):
+        return self.__size
+
+    def stop(self):
+        """停止时唤醒所有阻塞的生产线程"""
+        with self.__lock:
+            self.__active = False
+            self.__notFull.notify_all()
+
+    def getStats(self):
+        with self.__lock:
+            return {
+                'size': self.__size,
+                'maxSize': self.maxSize,
+                'blocked': dict(self.blocked),
+                'dropped': dict(self.dropped),
+                'conflated': dict(self.conflated),
+                'rejected': dict(self.rejected)
+            }
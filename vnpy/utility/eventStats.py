@@ -0,0 +1,163 @@
+# encoding: UTF-8
+
+from time import time
+from collections import deque
+
+
+class LatencyHistogram(object):
+    """
+    耗时直方图
+    按微秒取以2为底的对数分桶, 第 i 个桶统计 [2^(i-1), 2^i) 微秒的样本,
+    第0个桶统计不足1微秒的样本
+    """
+    BUCKET_COUNT = 32
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0        # 总耗时(秒)
+        self.max = 0.0          # 最大耗时(秒)
+        self.buckets = [0] * self.BUCKET_COUNT
+
+    def record(self, elapsed):
+        """记录一次耗时, elapsed 单位为秒"""
+        self.count += 1
+        self.total += elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+
+        index = int(elapsed * 1000000).bit_length()
+        if index >= self.BUCKET_COUNT:
+            index = self.BUCKET_COUNT - 1
+        self.buckets[index] += 1
+
+    def merge(self, other):
+        """合并另一个直方图的数据"""
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        for i, n in enumerate(other.buckets):
+            self.buckets[i] += n
+
+    def percentile(self, q):
+        """估算分位数, 返回所在桶的上界(秒)"""
+        if not self.count:
+            return 0.0
+
+        target = q * self.count
+        cumulative = 0
+        for i, n in enumerate(self.buckets):
+            cumulative += n
+            if cumulative >= target:
+                return min((1 << i) / 1000000.0, self.max)
+        return self.max
+
+    def toDict(self):
+        """转换为可以直接序列化的字典"""
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else 0.0,
+            'max': self.max,
+            'p50': self.percentile(0.5),
+            'p90': self.percentile(0.9),
+            'p99': self.percentile(0.99),
+            'buckets': list(self.buckets)
+        }
+
+
+class WorkerStats(object):
+    """
+    单个事件处理线程的统计数据
+    每个线程只写自己的 WorkerStats, 因此记录时无需加锁
+    """
+
+    def __init__(self, depthSampleSize=600):
+        self.depthSamples = deque(maxlen=depthSampleSize)  # (时间戳, 队列深度)
+        self.lastSampleTime = 0.0
+        self.queueLatency = {}      # key: 事件类型, value: LatencyHistogram
+        self.handlerLatency = {}    # key: 处理函数名称, value: LatencyHistogram
+        self.laneLatency = {}       # key: 优先级分类名称, value: LatencyHistogram
+        self.slowCount = {}         # key: 处理函数名称, value: 超时次数
+        self.lastAlertTime = {}     # key: 处理函数名称, value: 上次报警时间
+
+    def sampleDepth(self, depth):
+        now = time()
+        self.lastSampleTime = now
+        self.depthSamples.append((now, depth))
+
+    def recordQueue(self, type_, elapsed):
+        try:
+            histogram = self.queueLatency[type_]
+        except KeyError:
+            histogram = LatencyHistogram()
+            self.queueLatency[type_] = histogram
+        histogram.record(elapsed)
+
+    def recordLane(self, name, elapsed):
+        try:
+            histogram = self.laneLatency[name]
+        except KeyError:
+            histogram = LatencyHistogram()
+            self.laneLatency[name] = histogram
+        histogram.record(elapsed)
+
+    def recordHandler(self, name, elapsed):
+        try:
+            histogram = self.handlerLatency[name]
+        except KeyError:
+            histogram = LatencyHistogram()
+            self.handlerLatency[name] = histogram
+        histogram.record(elapsed)
+
+    def recordSlow(self, name, alertInterval):
+        """记录一次超时, 返回是否需要发出报警(同一函数的报警按 alertInterval 限频)"""
+        self.slowCount[name] = self.slowCount.get(name, 0) + 1
+
+        now = time()
+        if now - self.lastAlertTime.get(name, 0.0) < alertInterval:
+            return False
+        self.lastAlertTime[name] = now
+        return True
+
+
+def mergeWorkerStats(workerStatsList):
+    """合并所有线程的统计数据, 返回可以直接序列化(RPC/json)的字典"""
+    queueLatency = {}
+    handlerLatency = {}
+    laneLatency = {}
+    slowCount = {}
+    queueDepth = {}
+
+    for n, ws in enumerate(workerStatsList):
+        # 拷贝一份再遍历, 避免与处理线程的写入冲突
+        queueDepth[n] = list(ws.depthSamples)
+
+        for merged, source in ((queueLatency, ws.queueLatency),
+                               (handlerLatency, ws.handlerLatency),
+                               (laneLatency, ws.laneLatency)):
+            for key, histogram in list(source.items()):
+                if key not in merged:
+                    merged[key] = LatencyHistogram()
+                merged[key].merge(histogram)
+
+        for name, count in list(ws.slowCount.items()):
+            slowCount[name] = slowCount.get(name, 0) + count
+
+    return {
+        'queueDepth': queueDepth,
+        'queueLatency': {k: v.toDict() for k, v in queueLatency.items()},
+        'handlerLatency': {k: v.toDict() for k, v in handlerLatency.items()},
+        'laneLatency': {k: v.toDict() for k, v in laneLatency.items()},
+        'slowHandlerCount': slowCount
+    }
+
+
+def handlerName(handler):
+    """处理函数的统计名称: 模块名.限定名"""
+    name = getattr(handler, '__qualname__', None)
+    if name is None:
+        return repr(handler)
+
+    module = getattr(handler, '__module__', None)
+    if module:
+        return '.'.join([module, name])
+    return name
@@ -0,0 +1,152 @@
+# encoding: UTF-8
+
+"""
+进程内的合约编号表
+
+每个 vtSymbol 在首次出现时(通常是收到 ContractData 时)分配一个从 0 开始连续的整数编号,
+引擎的热点路径用编号作为列表下标代替以 vtSymbol 为键的字典:
+
+    iid = instrumentRegistry.register(contract.vtSymbol)
+    table = InstrumentTable()
+    table[tick.instrumentId] = tick
+    table.get(iid)
+
+热点路径中 InstrumentTable.items 的长度始终不小于已分配的编号数, 取得编号后可以
+直接按下标读取, 不必经过 get 的边界检查:
+
+    iid = tick.instrumentId
+    if iid is not None:
+        value = table.items[iid]
+
+仍按 vtSymbol 访问的代码使用 table.view(), 得到随表更新的只读映射.
+
+编号只在当前进程内有效, 不要保存到数据库或文件中.
+"""
+
+from collections.abc import Mapping
+from threading import Lock
+from weakref import WeakSet
+
+
+class InstrumentRegistry(object):
+    """vtSymbol 与整数编号的双向映射, 编号只增不减"""
+
+    def __init__(self):
+        self.idDict = {}            # vtSymbol: 编号
+        self.symbolList = []        # 编号: vtSymbol
+        self.tableSet = WeakSet()   # 使用该编号表的 InstrumentTable, 分配编号时同步扩展
+        self.lock = Lock()
+
+    def register(self, vtSymbol):
+        """返回 vtSymbol 的编号, 首次出现时分配新编号"""
+        iid = self.idDict.get(vtSymbol)
+        if iid is None:
+            # 只有分配新编号时需要加锁, 查询直接读字典
+            with self.lock:
+                iid = self.idDict.get(vtSymbol)
+                if iid is None:
+                    iid = len(self.symbolList)
+                    self.symbolList.append(vtSymbol)
+                    # 先扩展各表再公开编号, 取得编号的线程总能直接按下标读取
+                    for table in list(self.tableSet):
+                        table.reserve(iid + 1)
+                    self.idDict[vtSymbol] = iid
+        return iid
+
+    def getId(self, vtSymbol):
+        """查询编号, 未注册时返回 None"""
+        return self.idDict.get(vtSymbol)
+
+    def getSymbol(self, iid):
+        return self.symbolList[iid]
+
+    def __len__(self):
+        return len(self.symbolList)
+
+    def __contains__(self, vtSymbol):
+        return vtSymbol in self.idDict
+
+
+# 进程内唯一的编号表
+instrumentRegistry = InstrumentRegistry()
+
+
+class InstrumentTable(object):
+    """
+    以合约编号为下标的列表, 写入时按需扩展, 未写入的位置为 None
+
+    toDict 返回以 vtSymbol 为键的字典副本; view 返回以 vtSymbol 为键的只读映射,
+    随表更新, 写入时抛出 TypeError.
+    """
+
+    def __init__(self, registry=instrumentRegistry):
+        self.registry = registry
+        self.items = []
+        with registry.lock:
+            self.reserve(len(registry))
+            registry.tableSet.add(self)
+
+    def reserve(self, size):
+        """扩展到至少 size 个位置"""
+        items = self.items
+        if size > len(items):
+            items.extend([None] * (size - len(items)))
+
+    def get(self, iid, default=None):
+        items = self.items
+        if iid is not None and 0 <= iid < len(items):
+            value = items[iid]
+            if value is not None:
+                return value
+        return default
+
+    def __setitem__(self, iid, value):
+        items = self.items
+        if iid >= len(items):
+            items.extend([None] * (iid + 1 - len(items)))
+        items[iid] = value
+
+    def __delitem__(self, iid):
+        if 0 <= iid < len(self.items):
+            self.items[iid] = None
+
+    def __contains__(self, iid):
+        return self.get(iid) is not None
+
+    def values(self):
+        return [value for value in self.items if value is not None]
+
+    def view(self):
+        return InstrumentTableView(self)
+
+    def toDict(self):
+        symbolList = self.registry.symbolList
+        return {symbolList[iid]: value for iid, value in enumerate(self.items)
+                if value is not None}
+
+    def __len__(self):
+        return len(self.values())
+
+
+class InstrumentTableView(Mapping):
+    """InstrumentTable 以 vtSymbol 为键的只读映射, 读取时直接查表, 不复制"""
+
+    def __init__(self, table):
+        self.table = table
+
+    def __getitem__(self, vtSymbol):
+        value = self.table.get(self.table.registry.getId(vtSymbol))
+        if value is None:
+            raise KeyError(vtSymbol)
+        return value
+
+    def __contains__(self, vtSymbol):
+        return self.table.get(self.table.registry.getId(vtSymbol)) is not None
+
+    def __iter__(self):
+        symbolList = self.table.registry.symbolList
+        return iter([symbolList[iid] for iid, value in enumerate(self.table.items)
+                     if value is not None])
+
+    def __len__(self):
+        return len(self.table)
@@ -0,0 +1,305 @@
+# encoding: UTF-8
+
+"""
+委托和成交的分层存储
+
+内存中保存活动委托和最近完成的记录, 并按合约, 接口, 策略(委托还有状态)建立索引;
+超出上限的已完成记录转存到本地 SQLite 文件, 仍可按编号或索引字段查询:
+
+    store = OrderStore(maxFinished=10000, path=getTempPath('OrderStore.db'))
+    store.update(order)
+    store.query(vtSymbol='rb1910.SHFE', status=OSTA.STATUS_NOTTRADED)
+    store.get(vtOrderID)                                    # 内存中没有时查询文件
+    store.query(strategyName='atr', includeSpilled=True)    # 包括已转存的记录
+
+SQLite 文件只作为本次运行的缓存, 打开时会清空.
+委托转存后其 vtOrderID:策略名 映射随之删除, 策略名保存在转存的行中;
+此后到达的成交由 TradeStore 经 OrderStore.getSpilledStrategyName 查询.
+WorkingOrderIndex 只保存活动委托, 按接口, 合约, 策略计数, 供风控检查使用.
+"""
+
+import pickle
+import sqlite3
+from threading import Lock
+
+from vnpy.vtConstant import C_ORDER_STATUS as OSTA
+from vnpy.utility.logging_mixin import LoggingMixin
+
+
+class RecordStore(LoggingMixin):
+    """
+    按编号保存数据对象的基础类
+
+    idAttr 为编号字段, indexNames 为建立索引的字段. strategyName 不是数据对象的字段,
+    由发单时记录的 vtOrderID:策略名 映射得到.
+    """
+    idAttr = ''
+    indexNames = ()
+    tableName = ''
+
+    def __init__(self, maxFinished=0, path='', strategyDict=None):
+        self.maxFinished = maxFinished          # 内存中保留的已完成记录数, 0 为全部保留
+        self.spillBatch = max(1, maxFinished // 10)
+        self.strategyDict = strategyDict if strategyDict is not None else {}
+
+        self.dataDict = {}                      # 编号: 数据对象, 活动及最近完成的记录
+        self.keyDict = {}                       # 编号: 各索引字段的值
+        self.indexDict = {name: {} for name in self.indexNames}    # 字段: {值: {编号: None}}
+        self.finishedDict = {}                  # 已完成的编号, 按完成的先后排列
+        self.spilledCount = 0
+        self.lock = Lock()
+
+        self.conn = None
+        if maxFinished and path:
+            self.openFile(path)
+
+    #----------------------------------------------------------------------
+    def isFinished(self, data):
+        return True
+
+    def getStrategyName(self, vtOrderID):
+        return self.strategyDict.get(vtOrderID, '')
+
+    def getKeys(self, data):
+        """各索引字段的值"""
+        strategyName = self.getStrategyName(data.vtOrderID)
+        return tuple([strategyName if name == 'strategyName' else getattr(data, name)
+                      for name in self.indexNames])
+
+    def addIndex(self, dataId, keys):
+        for name, value in zip(self.indexNames, keys):
+            index = self.indexDict[name]
+            ids = index.get(value)
+            if ids is None:
+                ids = index[value] = {}
+            ids[dataId] = None
+
+    def removeIndex(self, dataId, keys):
+        for name, value in zip(self.indexNames, keys):
+            index = self.indexDict[name]
+            ids = index[value]
+            del ids[dataId]
+            if not ids:
+                del index[value]
+
+    def update(self, data):
+        """新增或更新一条记录"""
+        dataId = getattr(data, self.idAttr)
+        keys = self.getKeys(data)
+
+        with self.lock:
+            oldKeys = self.keyDict.get(dataId)
+            if oldKeys != keys:
+                if oldKeys is not None:
+                    self.removeIndex(dataId, oldKeys)
+                self.addIndex(dataId, keys)
+                self.keyDict[dataId] = keys
+            self.dataDict[dataId] = data
+
+            if self.isFinished(data):
+                self.finishedDict[dataId] = None
+            elif dataId in self.finishedDict:
+                del self.finishedDict[dataId]
+
+            if self.conn is not None and len(self.finishedDict) > self.maxFinished:
+                self.spill()
+
+    def remove(self, dataId):
+        """从内存中删除一条记录"""
+        with self.lock:
+            if self.dataDict.pop(dataId, None) is None:
+                return
+            self.removeIndex(dataId, self.keyDict.pop(dataId))
+            self.finishedDict.pop(dataId, None)
+
+    def setStrategyName(self, vtOrderID, strategyName):
+        """记录委托所属的策略, 委托已经在存储中时更新其索引"""
+        self.strategyDict[vtOrderID] = strategyName
+        data = self.dataDict.get(vtOrderID)
+        if data is not None and self.idAttr == 'vtOrderID':
+            self.update(data)
+
+    #----------------------------------------------------------------------
+    def get(self, dataId):
+        """按编号查询, 内存中没有时查询已转存的记录"""
+        data = self.dataDict.get(dataId)
+        if data is None and self.conn is not None:
+            with self.lock:
+                row = self.conn.execute(
+                    'SELECT data FROM %s WHERE id = ?' % self.tableName, (dataId,)).fetchone()
+            if row:
+                data = self.loadData(row[0])
+        return data
+
+    def values(self):
+        """内存中的全部记录"""
+        with self.lock:
+            return list(self.dataDict.values())
+
+    def query(self, includeSpilled=False, **conditions):
+        """
+        按索引字段查询, 如 query(vtSymbol='rb1910.SHFE', status=STATUS_NOTTRADED),
+        includeSpilled 为 True 时包括已转存的记录(排在内存中的记录之前)
+        """
+        self.checkConditions(conditions)
+
+        result = []
+        with self.lock:
+            if includeSpilled and self.conn is not None:
+                sql = 'SELECT data FROM %s' % self.tableName
+                if conditions:
+                    sql += ' WHERE ' + ' AND '.join(['%s = ?' % name for name in conditions])
+                rows = self.conn.execute(sql + ' ORDER BY rowid', tuple(conditions.values()))
+                result = [self.loadData(data) for data, in rows]
+
+            if not conditions:
+                result.extend(self.dataDict.values())
+                return result
+
+            # 从最小的索引集合出发, 再检查其余条件
+            candidates = []
+            for name, value in conditions.items():
+                candidates.append(self.indexDict[name].get(value, {}))
+            ids = min(candidates, key=len)
+
+            positions = [self.indexNames.index(name) for name in conditions]
+            values = list(conditions.values())
+            dataDict = self.dataDict
+            keyDict = self.keyDict
+            for dataId in ids:
+                keys = keyDict[dataId]
+                if all([keys[i] == v for i, v in zip(positions, values)]):
+                    result.append(dataDict[dataId])
+        return result
+
+    def count(self, **conditions):
+        """内存中符合条件的记录数, 只有一个条件时为 O(1)"""
+        self.checkConditions(conditions)
+        if not conditions:
+            return len(self.dataDict)
+        if len(conditions) == 1:
+            (name, value), = conditions.items()
+            return len(self.indexDict[name].get(value, ()))
+        return len(self.query(**conditions))
+
+    def checkConditions(self, conditions):
+        for name in conditions:
+            if name not in self.indexDict:
+                raise ValueError('{name} 不是索引字段, 可选: {names}'.format(
+                    name=name, names=', '.join(self.indexNames)))
+
+    def __len__(self):
+        return len(self.dataDict)
+
+    #----------------------------------------------------------------------
+    def openFile(self, path):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('DROP TABLE IF EXISTS %s' % self.tableName)
+        columns = ''.join([', %s' % name for name in self.indexNames])
+        self.conn.execute('CREATE TABLE %s (id TEXT PRIMARY KEY%s, data BLOB)'
+                          % (self.tableName, columns))
+        for name in self.indexNames:
+            self.conn.execute('CREATE INDEX %s_%s ON %s (%s)'
+                              % (self.tableName, name, self.tableName, name))
+        self.conn.commit()
+
+    def dumpData(self, data):
+        d = data.toDict()
+        d['rawData'] = None
+        return pickle.dumps((data.__class__, d), pickle.HIGHEST_PROTOCOL)
+
+    def loadData(self, blob):
+        cls, d = pickle.loads(blob)
+        return cls.fromDict(d)
+
+    def spill(self):
+        """把最早完成的一批记录转存到文件, 调用时已持有锁"""
+        finishedDict = self.finishedDict
+        count = len(finishedDict) - self.maxFinished + self.spillBatch - 1
+        ids = []
+        for dataId in finishedDict:
+            ids.append(dataId)
+            if len(ids) >= count:
+                break
+
+        rows = []
+        for dataId in ids:
+            del finishedDict[dataId]
+            data = self.dataDict.pop(dataId)
+            keys = self.keyDict.pop(dataId)
+            self.removeIndex(dataId, keys)
+            self.onSpill(dataId)
+            rows.append((dataId,) + keys + (self.dumpData(data),))
+
+        placeholders = ', '.join(['?'] * (len(self.indexNames) + 2))
+        self.conn.executemany('INSERT OR REPLACE INTO %s VALUES (%s)'
+                              % (self.tableName, placeholders), rows)
+        self.conn.commit()
+        self.spilledCount += len(rows)
+        self.log.debug('{name} 转存 {n} 条记录, 累计 {total} 条'.format(
+            name=self.tableName, n=len(rows), total=self.spilledCount))
+
+    def onSpill(self, dataId):
+        pass
+
+    def close(self):
+        if self.conn is not None:
+            with self.lock:
+                self.conn.close()
+                self.conn = None
+
+
+class OrderStore(RecordStore):
+    """委托存储, 完成(全部成交, 撤销, 拒单)的委托超过上限后转存"""
+    idAttr = 'vtOrderID'
+    indexNames = ('vtSymbol', 'gatewayName', 'strategyName', 'status')
+    tableName = 'orders'
+
+    FinishedStatus = frozenset([OSTA.STATUS_ALLTRADED, OSTA.STATUS_REJECTED, OSTA.STATUS_CANCELLED])
+
+    def isFinished(self, order):
+        return order.status in self.FinishedStatus
+
+    def onSpill(self, vtOrderID):
+        # 策略名已随转存的行写入文件
+        self.strategyDict.pop(vtOrderID, None)
+
+    def getSpilledStrategyName(self, vtOrderID):
+        """已转存委托的策略名, 委托在内存中或不存在时返回空字符串"""
+        if self.conn is None or vtOrderID in self.dataDict:
+            return ''
+        with self.lock:
+            row = self.conn.execute('SELECT strategyName FROM %s WHERE id = ?' % self.tableName,
+                                    (vtOrderID,)).fetchone()
+        return row[0] if row else ''
+
+
+class TradeStore(RecordStore):
+    """
+    成交存储, 超过上限后转存最早的成交
+    委托已经转存(映射已删除)后到达的成交, 由 orderStore 查询策略名
+    """
+    idAttr = 'vtTradeID'
+    indexNames = ('vtSymbol', 'gatewayName', 'strategyName', 'vtOrderID')
+    tableName = 'trades'
+
+    def __init__(self, maxFinished=0, path='', strategyDict=None, orderStore=None):
+        super(TradeStore, self).__init__(maxFinished, path, strategyDict)
+        self.orderStore = orderStore
+
+    def getStrategyName(self, vtOrderID):
+        strategyName = self.strategyDict.get(vtOrderID)
+        if strategyName is None:
+            if self.orderStore is None:
+                return ''
+            strategyName = self.orderStore.getSpilledStrategyName(vtOrderID)
+        return strategyName
+
+
+class WorkingOrderIndex(RecordStore):
+    """活动委托, 委托完成后即删除, 按接口, 合约, 策略维护计数"""
+    idAttr = 'vtOrderID'
+    indexNames = ('gatewayName', 'vtSymbol', 'strategyName')
+
+    def isFinished(self, order):
+        return False
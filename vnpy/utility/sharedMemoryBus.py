@@ -0,0 +1,358 @@
+# encoding: UTF-8
+
+"""
+基于共享内存环形缓冲区的跨进程事件总线
+
+gateway 所在进程通过 SharedMemoryPublisher 把行情, 委托, 成交写入一块共享内存,
+其他进程中的应用通过 SharedMemoryEventEngine 挂载同一块共享内存, 得到与
+EventEngine2 完全相同的 registerEvent/putEvent 接口; 数据只写入一次,
+各消费进程直接在共享内存上按固定结构解码, 互不影响.
+
+环形缓冲区为单生产者多消费者结构, 每个槽位以序号作为 seqlock:
+写入前置为 2n+1, 写完置为 2n+2; 读取前后序号一致且等于 2n+2 才认为数据有效.
+消费者落后超过一整圈时跳过被覆盖的记录, 并计入 lost.
+
+需要 Python 3.8 及以上版本(multiprocessing.shared_memory).
+"""
+
+import struct
+from operator import attrgetter
+from time import sleep, monotonic_ns
+from datetime import datetime, timedelta
+from threading import Thread, Lock
+from multiprocessing import shared_memory
+
+from vnpy.vtConstant import C_EVENT
+from vnpy.base_class import Event, TickData, OrderData, TradeData
+from vnpy.utility.logging_mixin import LoggingMixin
+from vnpy.utility.eventEngine import EventEngine2
+
+
+# 记录类型
+RECORD_TICK = 1
+RECORD_ORDER = 2
+RECORD_TRADE = 3
+
+# 各类记录的字段及 struct 格式, 字符串按 utf-8 编码后截断到固定长度
+# 数量字段统一用 double 保存, 部分接口(如数字货币)的成交量和委托量为小数
+TICK_FIELDS = [
+    ('gatewayName', '16s'), ('symbol', '32s'), ('exchange', '16s'), ('vtSymbol', '48s'),
+    ('lastPrice', 'd'), ('lastVolume', 'd'), ('volume', 'd'), ('openInterest', 'd'),
+    ('time', '16s'), ('date', '16s'), ('datetime', 'q'), ('timestampNs', 'q'),
+    ('openPrice', 'd'), ('highPrice', 'd'), ('lowPrice', 'd'), ('preClosePrice', 'd'),
+    ('upperLimit', 'd'), ('lowerLimit', 'd'),
+    ('bidPrice1', 'd'), ('bidPrice2', 'd'), ('bidPrice3', 'd'), ('bidPrice4', 'd'), ('bidPrice5', 'd'),
+    ('askPrice1', 'd'), ('askPrice2', 'd'), ('askPrice3', 'd'), ('askPrice4', 'd'), ('askPrice5', 'd'),
+    ('bidVolume1', 'd'), ('bidVolume2', 'd'), ('bidVolume3', 'd'), ('bidVolume4', 'd'), ('bidVolume5', 'd'),
+    ('askVolume1', 'd'), ('askVolume2', 'd'), ('askVolume3', 'd'), ('askVolume4', 'd'), ('askVolume5', 'd'),
+]
+
+ORDER_FIELDS = [
+    ('gatewayName', '16s'), ('symbol', '32s'), ('exchange', '16s'), ('vtSymbol', '48s'),
+    ('orderID', '32s'), ('vtOrderID', '48s'),
+    ('direction', '16s'), ('offset', '16s'), ('price', 'd'),
+    ('totalVolume', 'd'), ('tradedVolume', 'd'), ('status', '16s'),
+    ('orderTime', '16s'), ('cancelTime', '16s'), ('frontID', 'q'), ('sessionID', 'q'),
+]
+
+TRADE_FIELDS = [
+    ('gatewayName', '16s'), ('symbol', '32s'), ('exchange', '16s'), ('vtSymbol', '48s'),
+    ('tradeID', '32s'), ('vtTradeID', '48s'), ('orderID', '32s'), ('vtOrderID', '48s'),
+    ('direction', '16s'), ('offset', '16s'), ('price', 'd'), ('volume', 'd'),
+    ('tradeTime', '16s'),
+]
+
+# datetime 以距 EPOCH 的微秒数保存, None 保存为 NULL_DATETIME
+EPOCH = datetime(1970, 1, 1)
+NULL_DATETIME = -(1 << 63)
+MICROSECOND = timedelta(microseconds=1)
+
+
+class RecordLayout(object):
+    """一类记录的固定结构及编解码"""
+
+    def __init__(self, recordType, eventType, dataClass, fields, keyAttr):
+        self.recordType = recordType
+        self.eventType = eventType
+        self.dataClass = dataClass
+        self.keyAttr = keyAttr
+        self.names = tuple([name for name, _ in fields])
+        self.struct = struct.Struct('<' + ''.join([fmt for _, fmt in fields]))
+
+        # 一次取出全部字段, 只对字符串和 datetime 字段做转换
+        self.getter = attrgetter(*self.names)
+        self.textIndexes = [i for i, (_, fmt) in enumerate(fields) if fmt.endswith('s')]
+        self.datetimeIndexes = [i for i, (name, _) in enumerate(fields) if name == 'datetime']
+        self.numberFormats = [(i, fmt) for i, (name, fmt) in enumerate(fields)
+                              if fmt in ('d', 'q') and name != 'datetime']
+
+    def pack_into(self, buf, offset, data):
+        values = list(self.getter(data))
+        for i in self.textIndexes:
+            values[i] = str(values[i]).encode('utf-8')
+        for i in self.datetimeIndexes:
+            value = values[i]
+            if value is None:
+                values[i] = NULL_DATETIME
+            else:
+                # 带时区的时间按其本地时间保存, 与系统中其他不带时区的时间一致
+                if value.tzinfo is not None:
+                    value = value.replace(tzinfo=None)
+                values[i] = (value - EPOCH) // MICROSECOND
+        try:
+            self.struct.pack_into(buf, offset, *values)
+        except struct.error:
+            # 数值字段类型不符(None, 字符串等)时逐个转换后重试, 仍然失败则抛出 ValueError
+            self.struct.pack_into(buf, offset, *self.coerce(values))
+
+    def coerce(self, values):
+        """把数值字段转换为 struct 需要的类型, None 视为 0"""
+        for i, fmt in self.numberFormats:
+            value = values[i]
+            if value is None or value == '':
+                value = 0
+            values[i] = float(value) if fmt == 'd' else int(value)
+        return values
+
+    def unpack_from(self, buf, offset):
+        values = list(self.struct.unpack_from(buf, offset))
+        for i in self.textIndexes:
+            values[i] = values[i].rstrip(b'\0').decode('utf-8', 'ignore')
+        for i in self.datetimeIndexes:
+            value = values[i]
+            values[i] = None if value == NULL_DATETIME else EPOCH + timedelta(microseconds=value)
+
+        # 所有字段都会被覆盖, 跳过 __init__ 中的默认赋值
+        data = self.dataClass.__new__(self.dataClass)
+        d = data.__dict__
+        d['rawData'] = None
+        d.update(zip(self.names, values))
+        return data
+
+
+LAYOUTS = {
+    RECORD_TICK: RecordLayout(RECORD_TICK, C_EVENT.EVENT_TICK, TickData, TICK_FIELDS, 'vtSymbol'),
+    RECORD_ORDER: RecordLayout(RECORD_ORDER, C_EVENT.EVENT_ORDER, OrderData, ORDER_FIELDS, 'vtOrderID'),
+    RECORD_TRADE: RecordLayout(RECORD_TRADE, C_EVENT.EVENT_TRADE, TradeData, TRADE_FIELDS, 'vtSymbol'),
+}
+EVENT_LAYOUTS = {layout.eventType: layout for layout in LAYOUTS.values()}
+
+
+class SharedMemoryRing(object):
+    """
+    单生产者多消费者的共享内存环形缓冲区
+
+    头部(64字节): magic, capacity, slotSize, writeSeq
+    槽位: seq(Q), publishNs(q), recordType(B), 填充, 记录内容
+
+    create=True 时创建共享内存并作为唯一的写入方, 否则按名称挂载为读取方,
+    每个读取方各自维护读取位置.
+    """
+    MAGIC = 0x766E5242      # 'vnRB'
+    HEADER = struct.Struct('<III4xQ')
+    HEADER_SIZE = 64
+    WRITE_SEQ_OFFSET = 16
+    SEQ = struct.Struct('<Q')
+    SLOT_HEADER = struct.Struct('<QqB7x')
+
+    def __init__(self, name, capacity=65536, create=False):
+        recordSize = max([layout.struct.size for layout in LAYOUTS.values()])
+        # 槽位按8字节对齐
+        slotSize = (self.SLOT_HEADER.size + recordSize + 7) // 8 * 8
+
+        if create:
+            self.shm = shared_memory.SharedMemory(
+                name=name, create=True, size=self.HEADER_SIZE + capacity * slotSize)
+            self.HEADER.pack_into(self.shm.buf, 0, self.MAGIC, capacity, slotSize, 0)
+        else:
+            self.shm = attachSharedMemory(name)
+            magic, capacity, slotSize, _ = self.HEADER.unpack_from(self.shm.buf, 0)
+            if magic != self.MAGIC:
+                raise ValueError('shared memory {n} is not an event ring'.format(n=name))
+
+        self.name = name
+        self.owner = create
+        self.capacity = capacity
+        self.slotSize = slotSize
+        self.buf = self.shm.buf
+
+        self.writeSeq = 0       # 写入方: 下一条记录的序号
+        self.readSeq = self.__loadWriteSeq() if not create else 0   # 读取方: 从挂载时刻开始读
+        self.lost = 0           # 读取方: 被覆盖而丢失的记录数
+
+    def __loadWriteSeq(self):
+        return self.SEQ.unpack_from(self.buf, self.WRITE_SEQ_OFFSET)[0]
+
+    def __slotOffset(self, seq):
+        return self.HEADER_SIZE + (seq % self.capacity) * self.slotSize
+
+    def publish(self, recordType, data):
+        """写入一条记录, 只能由创建方调用"""
+        buf = self.buf
+        n = self.writeSeq
+        offset = self.__slotOffset(n)
+
+        self.SEQ.pack_into(buf, offset, 2 * n + 1)
+        LAYOUTS[recordType].pack_into(buf, offset + self.SLOT_HEADER.size, data)
+        self.SLOT_HEADER.pack_into(buf, offset, 2 * n + 2, monotonic_ns(), recordType)
+
+        self.writeSeq = n + 1
+        self.SEQ.pack_into(buf, self.WRITE_SEQ_OFFSET, n + 1)
+
+    def poll(self, maxCount):
+        """读取最多 maxCount 条新记录, 返回 [(recordType, publishNs, data)]"""
+        records = []
+        buf = self.buf
+        slotHeader = self.SLOT_HEADER
+        writeSeq = self.__loadWriteSeq()
+
+        while self.readSeq < writeSeq and len(records) < maxCount:
+            n = self.readSeq
+            if writeSeq - n > self.capacity:
+                # 落后超过一整圈, 跳到仍然有效的最早记录
+                self.lost += writeSeq - self.capacity - n
+                self.readSeq = writeSeq - self.capacity
+                continue
+
+            offset = self.__slotOffset(n)
+            seq, publishNs, recordType = slotHeader.unpack_from(buf, offset)
+            if seq != 2 * n + 2:
+                # 读取过程中该槽位已被新记录覆盖
+                writeSeq = self.__loadWriteSeq()
+                if writeSeq - n > self.capacity:
+                    continue
+                break
+
+            data = LAYOUTS[recordType].unpack_from(buf, offset + slotHeader.size)
+            if self.SEQ.unpack_from(buf, offset)[0] != seq:
+                writeSeq = self.__loadWriteSeq()
+                continue
+
+            records.append((recordType, publishNs, data))
+            self.readSeq = n + 1
+
+        return records
+
+    def close(self):
+        self.buf = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+_attachLock = Lock()
+
+
+def attachSharedMemory(name):
+    """
+    挂载已存在的共享内存
+    读取方不应登记到 resource_tracker, 否则退出时会把写入方创建的共享内存一并删除
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        pass
+
+    # Python 3.13 以前没有 track 参数, 挂载期间临时跳过登记;
+    # 不能挂载后再 unregister, 同一 resource_tracker 下会把写入方的登记也一并移除
+    from multiprocessing import resource_tracker
+    with _attachLock:
+        register = resource_tracker.register
+        resource_tracker.register = lambda name, rtype: None
+        try:
+            return shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+
+
+class SharedMemoryPublisher(LoggingMixin):
+    """
+    把本进程事件引擎中的行情, 委托, 成交事件写入共享内存环形缓冲区
+
+    分片模式下多个处理线程可能同时写入, 因此写入时加锁, 单线程时锁无竞争.
+    """
+
+    def __init__(self, name, capacity=65536):
+        self.ring = SharedMemoryRing(name, capacity, create=True)
+        self.__lock = Lock()
+        self.dropped = 0        # 无法编码而丢弃的记录数
+        self.log.debug('Shared memory bus {n} created, capacity {c}'.format(
+            n=name, c=capacity))
+
+    def register(self, eventEngine):
+        for eventType in EVENT_LAYOUTS:
+            eventEngine.registerEvent(eventType, self.onEvent)
+
+    def unregister(self, eventEngine):
+        for eventType in EVENT_LAYOUTS:
+            eventEngine.unregisterEvent(eventType, self.onEvent)
+
+    def onEvent(self, event):
+        layout = EVENT_LAYOUTS[event.type_]
+        data = event.dict_['data']
+        try:
+            with self.__lock:
+                self.ring.publish(layout.recordType, data)
+        except (struct.error, ValueError, TypeError, AttributeError, OverflowError):
+            # 无法编码的数据只丢弃这一条, 不能让异常中断事件引擎的处理线程
+            self.dropped += 1
+            self.log.exception('Shared memory bus dropped {t} {k}'.format(
+                t=event.type_, k=getattr(data, layout.keyAttr, None)))
+
+    def close(self):
+        self.ring.close()
+
+
+class SharedMemoryEventEngine(EventEngine2):
+    """
+    挂载共享内存事件总线的事件引擎, 用于 gateway 以外的进程
+
+    除 EventEngine2 原有的功能外, 读取线程轮询共享内存中的新记录, 解码后以
+    与 gateway 相同的事件类型和子键 putEvent, 因此应用可以直接 registerEvent.
+    没有新记录时休眠时间从 pollInterval 逐步增加到 maxPollInterval.
+    """
+
+    def __init__(self, name, SleepInterval=None, pollInterval=0.0001,
+                 maxPollInterval=0.002, pollBatchSize=256, **kwargs):
+        super(SharedMemoryEventEngine, self).__init__(SleepInterval, **kwargs)
+        self.ring = SharedMemoryRing(name)
+        self.pollInterval = pollInterval
+        self.maxPollInterval = maxPollInterval
+        self.pollBatchSize = pollBatchSize
+
+        self.__readerActive = False
+        self.__reader = Thread(target=self.__runReader, name='SharedMemoryReader')
+
+    def __runReader(self):
+        ring = self.ring
+        putEvent = self.putEvent
+        interval = self.pollInterval
+        while self.__readerActive:
+            records = ring.poll(self.pollBatchSize)
+            if not records:
+                sleep(interval)
+                interval = min(interval * 2, self.maxPollInterval)
+                continue
+            interval = self.pollInterval
+
+            for recordType, publishNs, data in records:
+                layout = LAYOUTS[recordType]
+                event = Event(type_=layout.eventType, key=getattr(data, layout.keyAttr))
+                event.dict_['data'] = data
+                event.dict_['publishNs'] = publishNs
+                putEvent(event)
+
+    def start(self, timer=True):
+        super(SharedMemoryEventEngine, self).start(timer)
+        self.__readerActive = True
+        self.__reader.start()
+
+    def stop(self):
+        self.__readerActive = False
+        self.__reader.join()
+        super(SharedMemoryEventEngine, self).stop()
+        self.ring.close()
+
+    def getLostCount(self):
+        """被覆盖而未能读取的记录数"""
+        return self.ring.lost
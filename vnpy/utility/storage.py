@@ -0,0 +1,524 @@
+# encoding: UTF-8
+
+"""
+数据存储后端
+
+引擎通过统一的接口读写行情(K线, Tick), 策略同步数据和配置, 具体使用哪个后端由
+vtcmd.ini 的 dbBackend 选择:
+
+    backend = createBackend()               # mongo 或 sqlite
+    if backend.connect():
+        backend.saveHistory(C_DB.MINUTE_DB_NAME, 'rb1910', bars)
+        backend.loadHistory(C_DB.MINUTE_DB_NAME, 'rb1910', start, end)
+        backend.query(dbName, collectionName, {'name': 'atr'})
+        for d in backend.queryIter(dbName, collectionName, flt, 'datetime',
+                                   projection=['datetime', 'close'], batchSize=1000):
+            ...                             # 按批从数据库读取, 不一次载入全部结果
+
+通用方法沿用 MongoDB 的库名, 集合名及过滤条件的写法, 原有的 dbQuery/dbUpdate 调用无需修改.
+SqliteBackend 不依赖数据库服务, 每个库一个文件, 每个集合一张表, 按 datetime 建立索引,
+适合按合约和时间段读取行情; 策略同步数据及配置按 INDEX_FIELDS 中的字段建立索引.
+过滤条件只支持顶层字段的相等及 $gt/$gte/$lt/$lte/$ne/$in.
+"""
+
+import os
+import pickle
+import sqlite3
+from datetime import datetime, timedelta
+from threading import Lock
+
+from pymongo import MongoClient, ReplaceOne, UpdateOne, ASCENDING, DESCENDING
+from pymongo.errors import ConnectionFailure, BulkWriteError
+
+from vnpy.config import globalSetting
+from vnpy.vtConstant import C_MONGO_DB_NAME as C_DB
+from vnpy.utility.file import getTempPath
+from vnpy.utility.logging_mixin import LoggingMixin
+
+
+def makeTimeFilter(start=None, end=None):
+    """start <= datetime < end 的过滤条件, start/end 为 None 时不限"""
+    condition = {}
+    if start is not None:
+        condition['$gte'] = start
+    if end is not None:
+        condition['$lt'] = end
+    return {'datetime': condition} if condition else {}
+
+
+class StorageBackend(LoggingMixin):
+    """
+    存储后端接口
+
+    子类实现 connect/insertMany/replaceMany/query/queryIter/delete/close, 其余方法由这些方法组合而成.
+    insertMany/replaceMany 返回写入失败的条数, 单条失败不抛出异常.
+    """
+    name = ''
+
+    def connect(self):
+        """连接或打开存储, 成功返回 True"""
+        raise NotImplementedError
+
+    def insertMany(self, dbName, collectionName, docs):
+        raise NotImplementedError
+
+    def replaceMany(self, dbName, collectionName, requests):
+        """requests 为 (过滤条件, 数据, upsert) 的列表, 按先后执行, 某条失败时不再执行之后的请求"""
+        raise NotImplementedError
+
+    def query(self, dbName, collectionName, flt, sortKey='', sortDirection=ASCENDING):
+        """返回符合条件的数据字典列表"""
+        raise NotImplementedError
+
+    def queryIter(self, dbName, collectionName, flt, sortKey='', sortDirection=ASCENDING,
+                  projection=None, batchSize=1000):
+        """
+        逐条返回符合条件的数据字典, 每次从数据库读取 batchSize 条,
+        projection 为需要的字段名列表, None 时返回全部字段
+        """
+        raise NotImplementedError
+
+    def delete(self, dbName, collectionName, flt):
+        """删除符合条件的第一条数据"""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    #----------------------------------------------------------------------
+    def insert(self, dbName, collectionName, d):
+        return self.insertMany(dbName, collectionName, [d])
+
+    def replace(self, dbName, collectionName, d, flt, upsert=False):
+        return self.replaceMany(dbName, collectionName, [(flt, d, upsert)])
+
+    def loadHistory(self, dbName, symbol, start=None, end=None):
+        """读取 [start, end) 时间段内的行情, 按时间排序, start/end 为 None 时不限"""
+        return self.query(dbName, symbol, makeTimeFilter(start, end), 'datetime')
+
+    def iterHistory(self, dbName, symbol, start=None, end=None, projection=None, batchSize=1000):
+        """与 loadHistory 相同, 按批读取并逐条返回"""
+        return self.queryIter(dbName, symbol, makeTimeFilter(start, end), 'datetime',
+                              projection=projection, batchSize=batchSize)
+
+    def saveHistory(self, dbName, symbol, docs):
+        """按 datetime 写入(覆盖)行情"""
+        return self.replaceMany(dbName, symbol,
+                                [({'datetime': d['datetime']}, d, True) for d in docs])
+
+    def loadSyncData(self, className, name, vtSymbol):
+        """读取策略同步数据, 没有时返回 None"""
+        l = self.query(C_DB.POSITION_DB_NAME, className, {'name': name, 'vtSymbol': vtSymbol})
+        return l[0] if l else None
+
+    def saveSyncData(self, className, d):
+        """保存策略同步数据, d 中须包含 name 和 vtSymbol"""
+        flt = {'name': d['name'], 'vtSymbol': d['vtSymbol']}
+        return self.replace(C_DB.POSITION_DB_NAME, className, d, flt, True)
+
+    def loadSettings(self, collectionName, sortKey=''):
+        return self.query(C_DB.SETTING_DB_NAME, collectionName, {}, sortKey)
+
+    def saveSetting(self, collectionName, d, flt):
+        return self.replace(C_DB.SETTING_DB_NAME, collectionName, d, flt, True)
+
+
+class MongoBackend(StorageBackend):
+    """MongoDB 存储"""
+    name = 'mongo'
+
+    def __init__(self, host='', port=0):
+        self.host = host or globalSetting.get('mongoHost', 'localhost')
+        self.port = int(port or globalSetting.get('mongoPort', 27017))
+        self.client = None
+        self.indexedSet = set()     # 已建立 datetime 索引的 (库名, 集合名)
+
+    def connect(self):
+        try:
+            self.client = MongoClient(self.host, self.port, serverSelectionTimeoutMS=10)
+            # 调用server_info查询服务器状态，防止服务器异常并未连接成功
+            self.client.server_info()
+            return True
+        except ConnectionFailure:
+            self.client = None
+            return False
+
+    def getCollection(self, dbName, collectionName):
+        return self.client[dbName][collectionName]
+
+    def bulkWrite(self, method, dbName, collectionName, batch, ordered=False):
+        """
+        批量写入, 返回失败条数
+        ordered 为 True 时按先后执行, 出错后不再执行之后的操作, 这些操作也计为失败
+        """
+        try:
+            getattr(self.getCollection(dbName, collectionName), method)(batch, ordered=ordered)
+        except BulkWriteError as e:
+            errors = e.details.get('writeErrors', [])
+            failed = len(errors)
+            if ordered and errors:
+                failed = len(batch) - errors[0].get('index', 0)
+            self.log.error('{db}.{col} 批量写入 {n} 条, 失败 {e} 条: {msg}'.format(
+                db=dbName, col=collectionName, n=len(batch), e=failed,
+                msg=errors[0].get('errmsg', '') if errors else ''))
+            return failed
+        return 0
+
+    def insertMany(self, dbName, collectionName, docs):
+        if not docs:
+            return 0
+        # insert_many 会在数据中加入 _id, 复制后再写入
+        return self.bulkWrite('insert_many', dbName, collectionName, [dict(d) for d in docs])
+
+    def replaceMany(self, dbName, collectionName, requests):
+        if not requests:
+            return 0
+        ops = [ReplaceOne(flt, d, upsert=upsert) for flt, d, upsert in requests]
+        return self.bulkWrite('bulk_write', dbName, collectionName, ops, ordered=True)
+
+    def query(self, dbName, collectionName, flt, sortKey='', sortDirection=ASCENDING):
+        cursor = self.getCollection(dbName, collectionName).find(flt)
+        if sortKey:
+            cursor = cursor.sort(sortKey, sortDirection)
+        return list(cursor)
+
+    def queryIter(self, dbName, collectionName, flt, sortKey='', sortDirection=ASCENDING,
+                  projection=None, batchSize=1000):
+        if projection is not None:
+            projection = dict.fromkeys(projection, True)
+            projection['_id'] = False
+        cursor = self.getCollection(dbName, collectionName).find(
+            flt, projection, batch_size=batchSize)
+        if sortKey:
+            cursor = cursor.sort(sortKey, sortDirection)
+        return cursor
+
+    def delete(self, dbName, collectionName, flt):
+        self.getCollection(dbName, collectionName).delete_one(flt)
+
+    def saveHistory(self, dbName, symbol, docs):
+        if (dbName, symbol) not in self.indexedSet:
+            self.getCollection(dbName, symbol).create_index([('datetime', ASCENDING)], unique=True)
+            self.indexedSet.add((dbName, symbol))
+        if not docs:
+            return 0
+        # 沿用原有的 $set 写法, 保留数据库中已有的其他字段
+        ops = [UpdateOne({'datetime': d['datetime']}, {'$set': d}, upsert=True) for d in docs]
+        return self.bulkWrite('bulk_write', dbName, symbol, ops)
+
+    def close(self):
+        if self.client is not None:
+            self.client.close()
+            self.client = None
+
+
+#----------------------------------------------------------------------
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def toTimeKey(value):
+    """datetime 转换为整数(微秒)保存在索引列, 其他类型不建立索引"""
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.replace(tzinfo=None) - value.utcoffset()
+        return (value - EPOCH) // MICROSECOND
+    return None
+
+
+def matchValue(value, condition):
+    if isinstance(condition, dict) and condition and all([k.startswith('$') for k in condition]):
+        for op, target in condition.items():
+            try:
+                if op == '$gte':
+                    ok = value is not None and value >= target
+                elif op == '$gt':
+                    ok = value is not None and value > target
+                elif op == '$lte':
+                    ok = value is not None and value <= target
+                elif op == '$lt':
+                    ok = value is not None and value < target
+                elif op == '$ne':
+                    ok = value != target
+                elif op == '$in':
+                    ok = value in target
+                else:
+                    raise ValueError('不支持的查询条件: {op}'.format(op=op))
+            except TypeError:
+                ok = False
+            if not ok:
+                return False
+        return True
+    return value == condition
+
+
+def matchFilter(d, flt):
+    """数据是否符合 MongoDB 风格的过滤条件"""
+    for key, condition in flt.items():
+        if not matchValue(d.get(key), condition):
+            return False
+    return True
+
+
+class SqliteBackend(StorageBackend):
+    """
+    本地 SQLite 存储, 每个库一个文件, 每个集合一张表
+
+    表中 t 列为 datetime 的整数形式并建立索引, 按时间段的查询只读取范围内的行;
+    INDEX_FIELDS 中的字段为字符串时另存一列并建立部分索引(只包含非空值, 行情数据不产生
+    索引项), 按这些字段相等的查询, 替换和删除不需要扫描全表;
+    数据以 pickle 保存在 doc 列, 字段类型(如 datetime)读取后保持不变.
+    """
+    name = 'sqlite'
+
+    # 建立索引的字段: 策略同步数据的 name, 算法交易配置的 settingName/algoName
+    INDEX_FIELDS = ('name', 'settingName', 'algoName')
+    COLUMNS = ('t', 'doc') + tuple(['k_' + field for field in INDEX_FIELDS])
+
+    def __init__(self, folder=''):
+        self.folder = os.path.expanduser(folder or globalSetting.get('sqliteFolder', '')
+                                         or getTempPath('database'))
+        self.connDict = {}          # 库名: 连接
+        self.tableSet = set()       # 已建立的 (库名, 集合名)
+        self.lock = Lock()
+
+    def connect(self):
+        try:
+            if not os.path.isdir(self.folder):
+                os.makedirs(self.folder)
+            return True
+        except OSError:
+            self.log.error('无法创建数据目录 {folder}'.format(folder=self.folder))
+            return False
+
+    def getConnection(self, dbName):
+        conn = self.connDict.get(dbName)
+        if conn is None:
+            path = os.path.join(self.folder, dbName + '.db')
+            conn = sqlite3.connect(path, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('PRAGMA synchronous = NORMAL')
+            self.connDict[dbName] = conn
+        return conn
+
+    def getTable(self, dbName, collectionName):
+        """返回连接及转义后的表名, 表不存在时创建"""
+        conn = self.getConnection(dbName)
+        table = '"%s"' % collectionName.replace('"', '""')
+        if (dbName, collectionName) not in self.tableSet:
+            keyColumns = ['k_' + field for field in self.INDEX_FIELDS]
+            conn.execute('CREATE TABLE IF NOT EXISTS %s (t INTEGER, doc BLOB, %s)' % (
+                table, ', '.join([column + ' TEXT' for column in keyColumns])))
+            self.addKeyColumns(conn, table, keyColumns)
+
+            name = collectionName.replace('"', '""')
+            conn.execute('CREATE INDEX IF NOT EXISTS "%s_t" ON %s (t)' % (name, table))
+            for column in keyColumns:
+                conn.execute('CREATE INDEX IF NOT EXISTS "%s_%s" ON %s (%s) WHERE %s IS NOT NULL'
+                             % (name, column, table, column, column))
+            conn.commit()
+            self.tableSet.add((dbName, collectionName))
+        return conn, table
+
+    def addKeyColumns(self, conn, table, keyColumns):
+        """旧版本只有 t, doc 两列的表, 增加索引字段列并按已有数据填写"""
+        existing = set([row[1] for row in conn.execute('PRAGMA table_info(%s)' % table)])
+        missing = [column for column in keyColumns if column not in existing]
+        if not missing:
+            return
+        for column in missing:
+            conn.execute('ALTER TABLE %s ADD COLUMN %s TEXT' % (table, column))
+        sql = 'UPDATE %s SET %s WHERE rowid = ?' % (
+            table, ', '.join([column + ' = ?' for column in keyColumns]))
+        rows = conn.execute('SELECT rowid, doc FROM %s' % table).fetchall()
+        for rowid, blob in rows:
+            conn.execute(sql, self.keyValues(pickle.loads(blob)) + (rowid,))
+
+    def keyValues(self, d):
+        """INDEX_FIELDS 各字段的索引值, 不是字符串时为 None"""
+        values = []
+        for field in self.INDEX_FIELDS:
+            value = d.get(field)
+            values.append(value if isinstance(value, str) else None)
+        return tuple(values)
+
+    def encode(self, d):
+        """返回与 COLUMNS 对应的各列的值"""
+        d = {k: v for k, v in d.items() if k != '_id'}
+        return ((toTimeKey(d.get('datetime')), pickle.dumps(d, pickle.HIGHEST_PROTOCOL))
+                + self.keyValues(d))
+
+    def insertSql(self, table):
+        return 'INSERT INTO %s (%s) VALUES (%s)' % (
+            table, ', '.join(self.COLUMNS), ', '.join(['?'] * len(self.COLUMNS)))
+
+    def updateSql(self, table, where):
+        return 'UPDATE %s SET %s WHERE %s = ?' % (
+            table, ', '.join([column + ' = ?' for column in self.COLUMNS]), where)
+
+    def makeSelect(self, table, flt, order=False):
+        """返回查询语句及参数, datetime 条件通过索引缩小范围, 其他条件读取后检查"""
+        sql = 'SELECT rowid, doc FROM %s' % table
+        clauses = []
+        params = []
+        condition = flt.get('datetime')
+        if isinstance(condition, dict):
+            for op, sign in (('$gte', '>='), ('$gt', '>'), ('$lte', '<='), ('$lt', '<')):
+                key = toTimeKey(condition.get(op))
+                if key is not None:
+                    clauses.append('t %s ?' % sign)
+                    params.append(key)
+        elif condition is not None:
+            key = toTimeKey(condition)
+            if key is not None:
+                clauses.append('t = ?')
+                params.append(key)
+        for field in self.INDEX_FIELDS:
+            value = flt.get(field)
+            if isinstance(value, str):
+                clauses.append('k_%s = ?' % field)
+                params.append(value)
+        if clauses:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+        if order:
+            sql += ' ORDER BY t, rowid'
+        return sql, params
+
+    def select(self, conn, table, flt, order=False):
+        """返回 (rowid, 数据) 列表"""
+        sql, params = self.makeSelect(table, flt, order)
+        result = []
+        for rowid, blob in conn.execute(sql, params):
+            d = pickle.loads(blob)
+            if matchFilter(d, flt):
+                result.append((rowid, d))
+        return result
+
+    #----------------------------------------------------------------------
+    def insertMany(self, dbName, collectionName, docs):
+        if not docs:
+            return 0
+        with self.lock:
+            conn, table = self.getTable(dbName, collectionName)
+            conn.executemany(self.insertSql(table), [self.encode(d) for d in docs])
+            conn.commit()
+        return 0
+
+    def replaceMany(self, dbName, collectionName, requests):
+        if not requests:
+            return 0
+        with self.lock:
+            conn, table = self.getTable(dbName, collectionName)
+            updateSql = self.updateSql(table, 'rowid')
+            insertSql = self.insertSql(table)
+            for flt, d, upsert in requests:
+                rows = self.select(conn, table, flt)
+                if rows:
+                    conn.execute(updateSql, self.encode(d) + (rows[0][0],))
+                elif upsert:
+                    conn.execute(insertSql, self.encode(d))
+            conn.commit()
+        return 0
+
+    def saveHistory(self, dbName, symbol, docs):
+        """按索引列覆盖同一时间的行情, 不需要读取原有数据"""
+        if not docs:
+            return 0
+        with self.lock:
+            conn, table = self.getTable(dbName, symbol)
+            updateSql = self.updateSql(table, 't')
+            insertSql = self.insertSql(table)
+            for d in docs:
+                values = self.encode(d)
+                if values[0] is None:
+                    raise ValueError('行情数据缺少 datetime: {d}'.format(d=d))
+                if not conn.execute(updateSql, values + (values[0],)).rowcount:
+                    conn.execute(insertSql, values)
+            conn.commit()
+        return 0
+
+    def query(self, dbName, collectionName, flt, sortKey='', sortDirection=ASCENDING):
+        with self.lock:
+            conn, table = self.getTable(dbName, collectionName)
+            rows = self.select(conn, table, flt, order=(sortKey == 'datetime'))
+        l = [d for rowid, d in rows]
+        if sortKey == 'datetime':
+            if sortDirection == DESCENDING:
+                l.reverse()
+        elif sortKey:
+            l.sort(key=lambda d: d.get(sortKey), reverse=(sortDirection == DESCENDING))
+        return l
+
+    def queryIter(self, dbName, collectionName, flt, sortKey='', sortDirection=ASCENDING,
+                  projection=None, batchSize=1000):
+        if sortKey and sortKey != 'datetime':
+            # 其他字段排序需要读取全部结果
+            records = self.query(dbName, collectionName, flt, sortKey, sortDirection)
+        else:
+            records = self.iterRows(dbName, collectionName, flt, bool(sortKey),
+                                    sortDirection == DESCENDING, batchSize)
+        if projection is None:
+            return records
+        return ({k: d[k] for k in projection if k in d} for d in records)
+
+    def iterRows(self, dbName, collectionName, flt, order, reverse, batchSize):
+        with self.lock:
+            conn, table = self.getTable(dbName, collectionName)
+            path = os.path.join(self.folder, dbName + '.db')
+        sql, params = self.makeSelect(table, flt, order)
+        if reverse:
+            sql = sql.replace('ORDER BY t, rowid', 'ORDER BY t DESC, rowid DESC')
+
+        # 使用单独的只读连接, 读取过程中不阻塞其他线程的写入
+        reader = sqlite3.connect(path, check_same_thread=False)
+        try:
+            cursor = reader.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(batchSize)
+                if not rows:
+                    break
+                for rowid, blob in rows:
+                    d = pickle.loads(blob)
+                    if matchFilter(d, flt):
+                        yield d
+        finally:
+            reader.close()
+
+    def delete(self, dbName, collectionName, flt):
+        with self.lock:
+            conn, table = self.getTable(dbName, collectionName)
+            rows = self.select(conn, table, flt)
+            if rows:
+                conn.execute('DELETE FROM %s WHERE rowid = ?' % table, (rows[0][0],))
+                conn.commit()
+
+    def close(self):
+        with self.lock:
+            for conn in self.connDict.values():
+                conn.close()
+            self.connDict.clear()
+            self.tableSet.clear()
+
+
+BACKEND_CLASSES = {
+    MongoBackend.name: MongoBackend,
+    SqliteBackend.name: SqliteBackend,
+}
+
+
+def createBackend(name=''):
+    """按名称(默认为 vtcmd.ini 的 dbBackend)创建存储后端, 尚未连接"""
+    name = name or globalSetting.get('dbBackend', 'mongo')
+    try:
+        return BACKEND_CLASSES[name]()
+    except KeyError:
+        raise ValueError('未知的存储后端 {name}, 可选: {names}'.format(
+            name=name, names=', '.join(sorted(BACKEND_CLASSES))))
+
+
+def openBackend(name=''):
+    """创建并连接存储后端, 连接失败时抛出 IOError"""
+    backend = createBackend(name)
+    if not backend.connect():
+        raise IOError('数据库({name})连接失败'.format(name=backend.name))
+    return backend
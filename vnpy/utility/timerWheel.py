@@ -0,0 +1,190 @@
+# encoding: UTF-8
+
+from itertools import count
+from threading import Lock
+
+
+class TimerHandle(object):
+    """
+    计时器对象
+
+    变量说明
+    timerId: 计时器编号, 用于撤销
+    expire: 到期的刻度
+    interval: 周期计时器的间隔刻度, 一次性计时器为 None
+    callback: 到期时调用的函数, 参数为 TimerHandle
+    cancelled: 是否已撤销
+    """
+    __slots__ = ('timerId', 'expire', 'interval', 'callback', 'cancelled')
+
+    def __init__(self, timerId, expire, interval, callback):
+        self.timerId = timerId
+        self.expire = expire
+        self.interval = interval
+        self.callback = callback
+        self.cancelled = False
+
+
+class TimerWheel(object):
+    """
+    分层时间轮
+
+    第0层 256 个槽, 每槽 1 个刻度; 之后每层 64 个槽, 每槽为下一层整层的跨度,
+    4 层共覆盖 2^26 个刻度(毫秒精度下约 18.6 小时), 更远的计时器放在最高层,
+    轮转到时重新计算位置. 新增, 撤销均为 O(1), 撤销采用标记方式, 到期时跳过.
+
+    时间轮本身不创建线程, 由调用方按 nextTimeout 的提示定期调用 advance 推进,
+    advance 返回本次到期的计时器, 周期计时器会自动重新加入.
+
+    所有刻度均为整数, 刻度与实际时间的换算由调用方负责.
+    """
+    LEVEL_BITS = (8, 6, 6, 6)
+
+    def __init__(self, currentTick=0):
+        self.__lock = Lock()
+        self.__ids = count(1)
+
+        self.__currentTick = currentTick
+        self.__timers = {}      # key: timerId, value: TimerHandle
+
+        # 每层的位移, 槽数掩码, 槽列表
+        self.__shifts = []
+        self.__masks = []
+        self.__levels = []
+        shift = 0
+        for bits in self.LEVEL_BITS:
+            self.__shifts.append(shift)
+            self.__masks.append((1 << bits) - 1)
+            self.__levels.append([[] for _ in range(1 << bits)])
+            shift += bits
+        self.__span = 1 << shift
+
+    @property
+    def currentTick(self):
+        return self.__currentTick
+
+    def __len__(self):
+        return len(self.__timers)
+
+    def __place(self, handle):
+        """按剩余刻度把计时器放入对应层的槽, 需在锁内调用"""
+        expire = handle.expire
+        delta = expire - self.__currentTick
+        if delta < 0:
+            expire = self.__currentTick
+            delta = 0
+        elif delta >= self.__span:
+            expire = self.__currentTick + self.__span - 1
+            delta = self.__span - 1
+
+        for level, shift in enumerate(self.__shifts):
+            if delta < (self.__masks[level] + 1) << shift:
+                break
+        slot = (expire >> self.__shifts[level]) & self.__masks[level]
+        self.__levels[level][slot].append(handle)
+
+    def schedule(self, delay, callback, interval=None):
+        """
+        新增计时器, 返回计时器编号
+        delay: 首次到期前的刻度数, 至少为 1
+        interval: 周期计时器的间隔刻度数, 为 None 时只触发一次
+        """
+        if interval is not None and interval < 1:
+            raise ValueError('interval must be at least 1 tick')
+
+        with self.__lock:
+            timerId = next(self.__ids)
+            handle = TimerHandle(timerId, self.__currentTick + max(int(delay), 1),
+                                 interval, callback)
+            self.__timers[timerId] = handle
+            self.__place(handle)
+        return timerId
+
+    def cancel(self, timerId):
+        """撤销计时器, 返回是否撤销成功"""
+        with self.__lock:
+            handle = self.__timers.pop(timerId, None)
+            if handle is None:
+                return False
+            handle.cancelled = True
+            return True
+
+    def __cascade(self, level):
+        """把第 level 层当前槽中的计时器重新分配到低层, 需在锁内调用"""
+        slot = (self.__currentTick >> self.__shifts[level]) & self.__masks[level]
+        handles = self.__levels[level][slot]
+        if not handles:
+            return
+        self.__levels[level][slot] = []
+        for handle in handles:
+            if not handle.cancelled:
+                self.__place(handle)
+
+    def advance(self, nowTick):
+        """推进到 nowTick, 返回期间到期的计时器列表(按到期先后)"""
+        expired = []
+        with self.__lock:
+            if not self.__timers:
+                # 没有有效计时器时直接跳到 nowTick, 槽中残留的已撤销计时器到时跳过即可
+                if self.__currentTick <= nowTick:
+                    self.__currentTick = nowTick + 1
+                return expired
+
+            wheel = self.__levels[0]
+            mask = self.__masks[0]
+            while self.__currentTick <= nowTick:
+                tick = self.__currentTick
+                slot = tick & mask
+
+                # 低层转完一圈时, 从高层搬下一个槽
+                if slot == 0:
+                    level = 1
+                    while level < len(self.__levels):
+                        self.__cascade(level)
+                        if (tick >> self.__shifts[level]) & self.__masks[level]:
+                            break
+                        level += 1
+
+                handles = wheel[slot]
+                if handles:
+                    wheel[slot] = []
+                    for handle in handles:
+                        if handle.cancelled:
+                            continue
+                        if handle.expire > tick:
+                            # 超出总跨度的计时器尚未真正到期
+                            self.__place(handle)
+                            continue
+
+                        expired.append(handle)
+                        if handle.interval is None:
+                            del self.__timers[handle.timerId]
+                        else:
+                            # 落后超过一个周期时从当前时刻重新计算, 避免集中补发
+                            handle.expire += handle.interval
+                            if handle.expire <= nowTick:
+                                handle.expire = nowTick + handle.interval
+                            self.__place(handle)
+
+                self.__currentTick = tick + 1
+        return expired
+
+    def nextTimeout(self, maxTicks):
+        """
+        距下一个可能到期的刻度数, 不超过 maxTicks
+        只检查第0层, 第0层为空时返回到本圈结束(需要从高层搬移)的刻度数
+        """
+        with self.__lock:
+            if not self.__timers:
+                return maxTicks
+
+            wheel = self.__levels[0]
+            mask = self.__masks[0]
+            tick = self.__currentTick
+            if not tick & mask:
+                return 0
+            limit = min(maxTicks, mask + 1 - (tick & mask))
+            for n in range(limit):
+                if wheel[(tick + n) & mask]:
+                    return n
+            return limit
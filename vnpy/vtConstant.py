@@ -22,6 +22,10 @@ class C_EVENT:
     EVENT_CONTRACT = 'eContract.'           # 合约基础信息回报事件
     EVENT_ERROR = 'eError.'                 # 错误回报事件
     EVENT_HISTORY = 'eHistory.'             # K线数据查询回报事件
+    EVENT_SLOW_HANDLER = 'eSlowHandler'     # 事件处理函数耗时超出预算报警
+    EVENT_TIMER_EXPIRED = 'eTimerExpired'   # 时间轮计时器到期事件
+    EVENT_QUEUE_ALARM = 'eQueueAlarm'       # 事件队列积压高/低水位报警
+    EVENT_GATEWAY_READY = 'eGatewayReady.'  # 接口就绪事件, 可后接接口名称
 
 class C_DIRECTION:
     # 方向常量
@@ -135,6 +139,13 @@ class C_GATEWAYTYPE:
     GATEWAYTYPE_BTC = 'btc'                         # 比特币
     GATEWAYTYPE_DATA = 'data'                       # 数据（非交易）
 
+class C_OVERLOAD:
+    # 有界事件队列已满时的处理策略
+    OVERLOAD_BLOCK = 'block'                # 阻塞生产线程直到队列有空位
+    OVERLOAD_DROP_OLDEST = 'dropOldest'     # 丢弃同类型中最早的事件
+    OVERLOAD_CONFLATE = 'conflate'          # 同类型同子键的待处理事件只保留最新
+    OVERLOAD_REJECT = 'reject'              # 丢弃新事件并计数
+
 class C_INTERVAL:
     # K线周期类型
     INTERVAL_1M = '1分钟'
@@ -2,9 +2,11 @@
 
 from __future__ import division
 
-import shelve
 import json
+from collections import namedtuple
 from copy import copy
+from datetime import datetime
+from types import MappingProxyType
 
 from vnpy.vtConstant import C_EVENT
 from vnpy.vtConstant import C_EXCHANGE as CEXC
@@ -12,13 +14,29 @@ from vnpy.vtConstant import C_DIRECTION as CDIR
 from vnpy.vtConstant import C_OFFSET as COFF
 from vnpy.vtConstant import C_ORDER_STATUS as OSTA
 from vnpy.config import globalSetting
+from vnpy.base_class import OrderData
 from vnpy.utility.file import getTempPath
 from vnpy.utility.logging_mixin import LoggingMixin
+from vnpy.utility.instrumentRegistry import instrumentRegistry, InstrumentTable
+from vnpy.utility.orderStore import OrderStore, TradeStore, WorkingOrderIndex
+from vnpy.utility.contractCache import ContractCache
+
+
+# DataEngine 某一时刻的只读快照, 各部分为 MappingProxyType:
+# positions    vtPositionName:PositionData
+# accounts     vtAccountID:AccountData
+# workingOrders vtOrderID:OrderData
+# ticks        vtSymbol:TickData
+# 快照中的数据对象与 DataEngine 共用, 读取方不能修改
+DataSnapshot = namedtuple('DataSnapshot', ['version', 'datetime', 'positions', 'accounts',
+                                           'workingOrders', 'ticks'])
+
+EMPTY_MAPPING = MappingProxyType({})
 
 
 class DataEngine(LoggingMixin):
     """数据引擎"""
-    contractFilePath = getTempPath('ContractData.vt')
+    contractCachePath = getTempPath('ContractCache.db')
     contractJSONFilePath = getTempPath('ContractData.json')
 
     FinishedStatus = [OSTA.STATUS_ALLTRADED, OSTA.STATUS_REJECTED, OSTA.STATUS_CANCELLED]
@@ -27,20 +45,42 @@ class DataEngine(LoggingMixin):
         self.log.debug('DataEngine initing...')
         self.mainEngine = mainEngine
 
-        self.tickDict = {}
+        # 最新行情, 以合约编号为下标, 见 vnpy.utility.instrumentRegistry
+        self.tickTable = InstrumentTable()
+        self.tickView = self.tickTable.view()
+        # 合约按需从本地缓存读取, 本次收到的合约在 saveContracts 时增量写入缓存
         self.contractDict = {}
-        self.orderDict = {}
-        self.workingOrderDict = {}  # 可撤销委托
-        self.tradeDict = {}
+        self.contractCache = ContractCache(self.contractCachePath)
+        self.dirtyContractDict = {}
+        self.allContractsLoaded = False
+        # 委托和成交存储, 已完成的记录超过上限后转存到临时目录下的 SQLite 文件
+        maxFinished = globalSetting.getint('orderStoreMaxFinished', 0)
+        self.orderStrategyDict = {}     # vtOrderID: 发单的策略名称
+        self.orderStore = OrderStore(maxFinished, getTempPath('OrderStore.db'),
+                                     self.orderStrategyDict)
+        self.tradeStore = TradeStore(maxFinished, getTempPath('TradeStore.db'),
+                                     self.orderStrategyDict, self.orderStore)
+        # 可撤销委托, 按接口, 合约, 策略计数
+        self.workingOrderIndex = WorkingOrderIndex(strategyDict=self.orderStrategyDict)
         self.accountDict = {}
         self.positionDict = {}
 
-        # 持仓细节相关 vtSymbol:PositionDetail
-        self.detailDict = {}
+        # 持仓细节相关 合约编号:PositionDetail
+        self.detailTable = InstrumentTable()
+        self.detailView = self.detailTable.view()
         # 平今手续费惩罚的产品代码列表
         self.tdPenaltyList = globalSetting['tdPenalty']
 
-        self.loadContracts()
+        # 只读快照, 每隔 snapshotInterval 秒发布一次, 只复制有变化的部分
+        self.snapshotInterval = globalSetting.getfloat('dataSnapshotInterval', 1)
+        self.snapshotTimerId = None
+        self.snapshotDirty = set()
+        # 上次发布后有新行情的合约编号, 发布时只更新这些合约
+        self.dirtyTickIds = set()
+        self.snapshotTicks = {}
+        self.snapshot = DataSnapshot(0, datetime.now(), EMPTY_MAPPING, EMPTY_MAPPING,
+                                     EMPTY_MAPPING, EMPTY_MAPPING)
+
         self.registerEvent()
 
     def registerEvent(self):
@@ -50,20 +90,32 @@ class DataEngine(LoggingMixin):
         self.mainEngine.registerEvent(C_EVENT.EVENT_TRADE, self.UpdateTradeDictFromEvent)
         self.mainEngine.registerEvent(C_EVENT.EVENT_POSITION, self.UpdatePositionDictFromEvent)
         self.mainEngine.registerEvent(C_EVENT.EVENT_ACCOUNT, self.UpdateAccountDictFromEvent)
+        if self.snapshotInterval > 0:
+            self.snapshotTimerId = self.mainEngine.scheduleTimer(
+                self.snapshotInterval, self.processSnapshotTimer, interval=self.snapshotInterval)
 
     def UpdateTickDictFromEvent(self, event):
         # TickData
         tick = event.dict_['data']
-        self.tickDict[tick.vtSymbol] = tick
+        iid = tick.instrumentId
+        if iid is None:
+            # gateway 没有写入合约编号时查询并写入, 供之后的处理函数使用;
+            # 尚未收到合约信息的行情在该合约的第一笔行情时分配编号
+            iid = tick.instrumentId = instrumentRegistry.register(tick.vtSymbol)
+        self.tickTable.items[iid] = tick
+        self.dirtyTickIds.add(iid)
 
     def UpdateContractDictFromEvent(self, event):
         # ContractData
         # 使用常规代码(不包括交易所)可能导致重复
         contract = event.dict_['data']
+        # 收到合约信息时分配合约编号
+        iid = contract.instrumentId
         self.contractDict[contract.vtSymbol] = contract
         self.contractDict[contract.symbol] = contract
-        self.log.debug('Contract: {con}, {com}'.format(
-            con=contract.vtSymbol, com=contract.symbol
+        self.dirtyContractDict[contract.vtSymbol] = contract
+        self.log.debug('Contract: {con}, {com}, id: {iid}'.format(
+            con=contract.vtSymbol, com=contract.symbol, iid=iid
         ))
 
     def UpdateOrderDictFromEvent(self, event):
@@ -72,16 +124,16 @@ class DataEngine(LoggingMixin):
         self.log.debug('Order:{oid}; vtSym:{sym}; Dir:{dir}; Pri:{pri}; Vol:{vol}'.format(
             oid=order.vtOrderID, sym=order.vtSymbol, dir=order.direction,
             pri=order.price, vol=order.totalVolume))
-        self.orderDict[order.vtOrderID] = order
+        self.orderStore.update(order)
         # 移除交易完成订单
         if order.status in self.FinishedStatus:
-            if order.vtOrderID in self.workingOrderDict:
-                del self.workingOrderDict[order.vtOrderID]
+            self.workingOrderIndex.remove(order.vtOrderID)
         else:
-            self.workingOrderDict[order.vtOrderID] = order
+            self.workingOrderIndex.update(order)
+        self.snapshotDirty.add('workingOrders')
 
         # 更新到持仓细节中
-        detail = self.getPositionDetail(order.vtSymbol)
+        detail = self.getPositionDetailById(order.instrumentId)
         detail.updateOrder(order)
 
     def UpdateTradeDictFromEvent(self, event):
@@ -90,9 +142,9 @@ class DataEngine(LoggingMixin):
         self.log.debug('Trade:{tid}; Order:{oid}; vtSym:{sym}; Dir:{dir}; Pri:{pri}; Vol:{vol}'.format(
             tid=trade.vtTradeID, oid=trade.vtOrderID, sym=trade.vtSymbol,
             dir=trade.direction, pri=trade.price, vol=trade.volume))
-        self.tradeDict[trade.vtTradeID] = trade
+        self.tradeStore.update(trade)
         # 更新到持仓细节中
-        detail = self.getPositionDetail(trade.vtSymbol)
+        detail = self.getPositionDetailById(trade.instrumentId)
         detail.updateTrade(trade)
 
     def UpdatePositionDictFromEvent(self, event):
@@ -102,13 +154,15 @@ class DataEngine(LoggingMixin):
             sym=pos.vtSymbol, dir=pos.direction, pri=pos.price, vol=pos.position,
             pro=pos.positionProfit))
         self.positionDict[pos.vtPositionName] = pos
-        detail = self.getPositionDetail(pos.vtSymbol)
+        self.snapshotDirty.add('positions')
+        detail = self.getPositionDetailById(pos.instrumentId)
         detail.updatePosition(pos)
 
     def UpdateAccountDictFromEvent(self, event):
         # AccountData
         acc = event.dict_['data']
         self.accountDict[acc.vtAccountID] = acc
+        self.snapshotDirty.add('accounts')
         self.log.debug(
             ' '.join(['Acc:{acc};', '静金:{pre}', '动金:{bal};', '可用:{ava};', '手续费:{com};',
                       '占用:{mar};','平盈:{cls};', '持盈:{pos};']).format(
@@ -117,59 +171,176 @@ class DataEngine(LoggingMixin):
                           com=round(acc.commission,2),mar=round(acc.margin,2),
                           cls=round(acc.closeProfit,2), pos=round(acc.positionProfit,2)))
 
+    def processSnapshotTimer(self, event):
+        """快照计时器到期, 每 snapshotInterval 秒调用一次"""
+        self.publishSnapshot()
+
+    def publishSnapshot(self):
+        """
+        发布新的快照, 只复制上次发布后有变化的部分, 其余部分沿用上一个快照
+        没有任何变化时不发布, 返回当前快照
+        """
+        # 先换出变化标记再复制, 复制期间的更新会留到下一次发布
+        dirty = self.snapshotDirty
+        dirtyTickIds = self.dirtyTickIds
+        if not dirty and not dirtyTickIds:
+            return self.snapshot
+        self.snapshotDirty = set()
+        self.dirtyTickIds = set()
+
+        old = self.snapshot
+        positions = old.positions
+        if 'positions' in dirty:
+            positions = MappingProxyType(dict(self.positionDict))
+        accounts = old.accounts
+        if 'accounts' in dirty:
+            accounts = MappingProxyType(dict(self.accountDict))
+        workingOrders = old.workingOrders
+        if 'workingOrders' in dirty:
+            workingOrders = MappingProxyType(dict(self.workingOrderIndex.dataDict))
+        ticks = old.ticks
+        if dirtyTickIds:
+            # 复制上一个快照的字典(C 层面的整体复制), 只逐个更新有新行情的合约
+            tickDict = self.snapshotTicks.copy()
+            symbolList = self.tickTable.registry.symbolList
+            items = self.tickTable.items
+            for iid in dirtyTickIds:
+                tick = items[iid]
+                if tick is None:
+                    tickDict.pop(symbolList[iid], None)
+                else:
+                    tickDict[symbolList[iid]] = tick
+            self.snapshotTicks = tickDict
+            ticks = MappingProxyType(tickDict)
+
+        # 替换引用是原子操作, 读取方不需要加锁
+        self.snapshot = DataSnapshot(old.version + 1, datetime.now(), positions, accounts,
+                                     workingOrders, ticks)
+        return self.snapshot
+
+    def getSnapshot(self):
+        """最近发布的只读快照, 可以在任意线程中调用"""
+        return self.snapshot
+
+    @property
+    def tickDict(self):
+        """vtSymbol:TickData 的只读映射, 兼容按字符串读取的代码, 写入时抛出 TypeError"""
+        return self.tickView
+
+    @property
+    def detailDict(self):
+        """vtSymbol:PositionDetail 的只读映射, 兼容按字符串读取的代码, 写入时抛出 TypeError"""
+        return self.detailView
+
     def getTick(self, vtSymbol):
-        try:
-            return self.tickDict[vtSymbol]
-        except KeyError:
-            return None
+        return self.tickTable.get(instrumentRegistry.getId(vtSymbol))
+
+    def getTickById(self, instrumentId):
+        return self.tickTable.get(instrumentId)
 
     def getContract(self, vtSymbol):
         self.log.debug('查询合约 {sm}'.format(sm=vtSymbol))
-        try:
-            return self.contractDict[vtSymbol]
-        except KeyError:
-            return None
+        contract = self.contractDict.get(vtSymbol)
+        if contract is None:
+            contract = self.contractCache.get(vtSymbol)
+            if contract is not None:
+                self.cacheContract(contract)
+        return contract
+
+    def cacheContract(self, contract):
+        """从缓存读取的合约放入 contractDict, 不覆盖本次收到的合约"""
+        self.contractDict.setdefault(contract.vtSymbol, contract)
+        self.contractDict.setdefault(contract.symbol, contract)
 
     def getAllContracts(self):
         self.log.debug('查询所有合约')
+        if not self.allContractsLoaded:
+            self.loadContracts()
         return self.contractDict.values()
 
+    def getContractVersion(self, gatewayName):
+        """接口合约最近一次保存时的 (交易日, 版本号)"""
+        return self.contractCache.getVersion(gatewayName)
+
     def saveContracts(self):
-        self.log.debug('保存 {num} 个合约到硬盘'.format(num=len(self.contractDict)))
-        with shelve.open(self.contractFilePath) as f:
-            f['data'] = self.contractDict
+        """把本次收到的合约增量写入缓存"""
+        contracts = list(self.dirtyContractDict.values())
+        self.dirtyContractDict.clear()
+        count = self.contractCache.upsert(contracts, datetime.now().strftime('%Y%m%d'))
+        self.log.debug('保存 {num} 个合约到硬盘'.format(num=count))
 
-        with open(self.contractJSONFilePath, 'w+') as f:
+    def loadContracts(self):
+        self.log.debug('从硬盘读取合约')
+        for contract in self.contractCache.getAll():
+            self.cacheContract(contract)
+        self.allContractsLoaded = True
+
+    def exportContracts(self, path=None):
+        """把全部合约导出为 JSON 文件, 便于查看"""
+        contracts = {c.vtSymbol: c for c in self.getAllContracts()}
+        with open(path or self.contractJSONFilePath, 'w+') as f:
             f.write(json.dumps(
-                [{k: v.__dict__} for k,v in self.contractDict.items()]
+                [{k: v.toDict()} for k,v in contracts.items()]
                 ,indent=4, sort_keys=False))
 
-    def loadContracts(self):
-        self.log.debug('从硬盘读取合约')
-        with shelve.open(self.contractFilePath) as f:
-            if 'data' in f:
-                d = f['data']
-                for key, value in d.items():
-                    self.contractDict[key] = value
+    @property
+    def workingOrderDict(self):
+        """可撤销委托 vtOrderID:OrderData"""
+        return self.workingOrderIndex.dataDict
+
+    @property
+    def orderDict(self):
+        """内存中的委托 vtOrderID:OrderData, 不包括已转存的委托"""
+        return self.orderStore.dataDict
+
+    @property
+    def tradeDict(self):
+        """内存中的成交 vtTradeID:TradeData, 不包括已转存的成交"""
+        return self.tradeStore.dataDict
 
     def getOrder(self, vtOrderID):
         self.log.debug('查询委托')
-        try:
-            return self.orderDict[vtOrderID]
-        except KeyError:
-            return None
+        return self.orderStore.get(vtOrderID)
 
     def getAllWorkingOrders(self):
         self.log.debug('查询所有活动委托（返回列表）')
-        return self.workingOrderDict.values()
+        return self.workingOrderIndex.values()
+
+    def getWorkingOrderCount(self, **conditions):
+        """
+        活动委托数量, 可按 gatewayName, vtSymbol, strategyName 过滤,
+        如 getWorkingOrderCount(vtSymbol='rb1910.SHFE'), 单个条件时为 O(1)
+        """
+        return self.workingOrderIndex.count(**conditions)
+
+    def getWorkingOrders(self, **conditions):
+        """按 gatewayName, vtSymbol, strategyName 查询活动委托"""
+        return self.workingOrderIndex.query(**conditions)
 
     def getAllOrders(self):
         self.log.debug('获取所有委托单')
-        return self.orderDict.values()
+        return self.orderStore.values()
 
     def getAllTrades(self):
         self.log.debug('获取所有已成交单')
-        return self.tradeDict.values()
+        return self.tradeStore.values()
+
+    def queryOrders(self, includeSpilled=False, **conditions):
+        """按 vtSymbol, gatewayName, strategyName, status 查询委托"""
+        return self.orderStore.query(includeSpilled, **conditions)
+
+    def queryTrades(self, includeSpilled=False, **conditions):
+        """按 vtSymbol, gatewayName, strategyName, vtOrderID 查询成交"""
+        return self.tradeStore.query(includeSpilled, **conditions)
+
+    def close(self):
+        if self.snapshotTimerId is not None:
+            self.mainEngine.cancelTimer(self.snapshotTimerId)
+            self.snapshotTimerId = None
+        self.saveContracts()
+        self.contractCache.close()
+        self.orderStore.close()
+        self.tradeStore.close()
 
     def getAllPositions(self):
         self.log.debug('获取所有持仓')
@@ -180,14 +351,18 @@ class DataEngine(LoggingMixin):
         return self.accountDict.values()
 
     def getPositionDetail(self, vtSymbol):
-        if vtSymbol in self.detailDict:
-            detail = self.detailDict[vtSymbol]
-            self.log.debug('查询 {sm} 持仓'.format(sm=vtSymbol))
+        return self.getPositionDetailById(instrumentRegistry.register(vtSymbol))
+
+    def getPositionDetailById(self, instrumentId):
+        detail = self.detailTable.get(instrumentId)
+        if detail is not None:
+            self.log.debug('查询 {sm} 持仓'.format(sm=detail.vtSymbol))
         else:
+            vtSymbol = instrumentRegistry.getSymbol(instrumentId)
             self.log.debug('加入 {sm} 持仓'.format(sm=vtSymbol))
             contract = self.getContract(vtSymbol)
             detail = PositionDetail(vtSymbol, contract)
-            self.detailDict[vtSymbol] = detail
+            self.detailTable[instrumentId] = detail
 
             if contract:
                 detail.exchange = contract.exchange
@@ -204,24 +379,110 @@ class DataEngine(LoggingMixin):
 
     def getAllPositionDetails(self):
         self.log.debug('查询所有本地持仓缓存细节')
-        return self.detailDict.values()
+        return self.detailTable.values()
 
     def updateOrderReq(self, req, vtOrderID):
         self.log.debug('委托请求更新')
         vtSymbol = req.vtSymbol
 
+        if vtOrderID and req.strategyName:
+            self.orderStore.setStrategyName(vtOrderID, req.strategyName)
+            self.workingOrderIndex.setStrategyName(vtOrderID, req.strategyName)
+
         detail = self.getPositionDetail(vtSymbol)
         detail.updateOrderReq(req, vtOrderID)
 
     def convertOrderReq(self, req):
         self.log.debug('根据规则转换委托请求')
-        detail = self.detailDict.get(req.vtSymbol, None)
+        detail = self.detailTable.get(instrumentRegistry.getId(req.vtSymbol))
         if not detail:
             return [req]
         else:
             return detail.convertOrderReq(req)
 
 
+class FrozenCounter(object):
+    """
+    一个方向持仓的冻结量, 由反方向平仓委托的剩余量增量维护
+
+    与逐笔遍历活动委托的结果相同: 按委托到达的顺序, 平今和平昨委托直接累加,
+    每遇到一笔平仓委托, 今仓冻结超过今仓的部分转为昨仓冻结. 因此只需要记录
+    最后一笔平仓委托之后的平今剩余量, 其余部分可以合并计算.
+    """
+
+    def __init__(self):
+        self.tdVolume = 0           # 平今委托剩余量
+        self.ydVolume = 0           # 平昨委托剩余量
+        self.closeVolume = 0        # 平仓委托剩余量
+        self.afterCloseVolume = 0   # 最后一笔平仓委托之后的平今委托剩余量
+        self.lastCloseSeq = -1      # 最后一笔平仓委托的序号, 没有时为 -1
+        self.maxSeq = -1
+
+        self.entryDict = {}         # vtOrderID: [offset, 序号, 剩余量]
+
+    def addVolume(self, offset, seq, volume):
+        if offset is COFF.OFFSET_CLOSETODAY:
+            self.tdVolume += volume
+            if seq > self.lastCloseSeq:
+                self.afterCloseVolume += volume
+        elif offset is COFF.OFFSET_CLOSEYESTERDAY:
+            self.ydVolume += volume
+        else:
+            self.closeVolume += volume
+
+    def update(self, vtOrderID, offset, seq, volume):
+        """更新委托的剩余量, seq 为委托进入活动委托的序号"""
+        entry = self.entryDict.get(vtOrderID)
+        if entry is not None:
+            # 部分成交只改变剩余量
+            if entry[0] is offset:
+                self.addVolume(offset, seq, volume - entry[2])
+                entry[2] = volume
+                return
+            self.remove(vtOrderID)
+
+        if not (offset is COFF.OFFSET_CLOSETODAY or offset is COFF.OFFSET_CLOSEYESTERDAY
+                or offset is COFF.OFFSET_CLOSE):
+            return
+
+        self.entryDict[vtOrderID] = [offset, seq, volume]
+        if offset is COFF.OFFSET_CLOSE and seq > self.lastCloseSeq:
+            if seq > self.maxSeq:
+                self.lastCloseSeq = seq
+                self.afterCloseVolume = 0
+            else:
+                self.lastCloseSeq = seq
+                self.rescan()
+        self.maxSeq = max(self.maxSeq, seq)
+        self.addVolume(offset, seq, volume)
+
+    def remove(self, vtOrderID):
+        entry = self.entryDict.pop(vtOrderID, None)
+        if entry is None:
+            return
+        offset, seq, volume = entry
+        self.addVolume(offset, seq, -volume)
+        if offset is COFF.OFFSET_CLOSE and seq == self.lastCloseSeq:
+            self.rescan()
+
+    def rescan(self):
+        """最后一笔平仓委托变化时, 重新统计其后的平今剩余量"""
+        entries = self.entryDict.values()
+        self.lastCloseSeq = max([seq for offset, seq, _ in entries
+                                 if offset is COFF.OFFSET_CLOSE] or [-1])
+        self.afterCloseVolume = sum([volume for offset, seq, volume in entries
+                                     if offset is COFF.OFFSET_CLOSETODAY
+                                     and seq > self.lastCloseSeq])
+
+    def frozen(self, td):
+        """根据当前今仓返回 (今仓冻结, 昨仓冻结)"""
+        if self.lastCloseSeq < 0:
+            return self.tdVolume, self.ydVolume
+        tdFrozen = min(td, self.tdVolume - self.afterCloseVolume + self.closeVolume) \
+            + self.afterCloseVolume
+        return tdFrozen, self.ydVolume + self.tdVolume + self.closeVolume - tdFrozen
+
+
 class PositionDetail(LoggingMixin):
     """本地维护的持仓信息"""
     WorkingStatus = [OSTA.STATUS_UNKNOWN, OSTA.STATUS_NOTTRADED, OSTA.STATUS_PARTTRADED]
@@ -268,6 +529,13 @@ class PositionDetail(LoggingMixin):
 
         self.workingOrderDict = {}
 
+        # 冻结量按委托增量维护, 多头持仓由空头平仓委托冻结, 空头持仓反之
+        self.longFrozenCounter = FrozenCounter()
+        self.shortFrozenCounter = FrozenCounter()
+        self.frozenCounterDict = {}     # vtOrderID: FrozenCounter
+        self.workingSeqDict = {}        # vtOrderID: 进入活动委托的序号
+        self.workingSeq = 0
+
     def updateTrade(self, trade):
         self.log.debug('成交更新')
         # 多头
@@ -327,11 +595,13 @@ class PositionDetail(LoggingMixin):
         # 将活动委托缓存下来
         if order.status in self.WorkingStatus:
             self.workingOrderDict[order.vtOrderID] = order
+            self.updateFrozenOrder(order.vtOrderID, order)
 
         # 移除缓存中已经完成的委托
         else:
             if order.vtOrderID in self.workingOrderDict:
                 del self.workingOrderDict[order.vtOrderID]
+                self.removeFrozenOrder(order.vtOrderID)
 
         # 计算冻结
         self.calculateFrozen()
@@ -362,6 +632,7 @@ class PositionDetail(LoggingMixin):
         order.totalVolume = req.volume
 
         self.workingOrderDict[vtOrderID] = order
+        self.updateFrozenOrder(vtOrderID, order)
         self.calculateFrozen()
 
     def updateTick(self, tick):
@@ -399,8 +670,47 @@ class PositionDetail(LoggingMixin):
         self.longPos = self.longTd + self.longYd
         self.shortPos = self.shortTd + self.shortYd
 
+    def updateFrozenOrder(self, vtOrderID, order):
+        """按活动委托的剩余量更新冻结计数"""
+        seq = self.workingSeqDict.get(vtOrderID)
+        if seq is None:
+            self.workingSeq += 1
+            seq = self.workingSeq
+            self.workingSeqDict[vtOrderID] = seq
+
+        if order.direction is CDIR.DIRECTION_LONG:
+            counter = self.shortFrozenCounter
+        elif order.direction is CDIR.DIRECTION_SHORT:
+            counter = self.longFrozenCounter
+        else:
+            counter = None
+
+        oldCounter = self.frozenCounterDict.get(vtOrderID)
+        if oldCounter is not None and oldCounter is not counter:
+            oldCounter.remove(vtOrderID)
+        if counter is None:
+            self.frozenCounterDict.pop(vtOrderID, None)
+            return
+
+        self.frozenCounterDict[vtOrderID] = counter
+        counter.update(vtOrderID, order.offset, seq, order.totalVolume - order.tradedVolume)
+
+    def removeFrozenOrder(self, vtOrderID):
+        self.workingSeqDict.pop(vtOrderID, None)
+        counter = self.frozenCounterDict.pop(vtOrderID, None)
+        if counter is not None:
+            counter.remove(vtOrderID)
+
     def calculateFrozen(self):
         self.log.debug('计算冻结情况')
+        self.longTdFrozen, self.longYdFrozen = self.longFrozenCounter.frozen(self.longTd)
+        self.shortTdFrozen, self.shortYdFrozen = self.shortFrozenCounter.frozen(self.shortTd)
+        self.longPosFrozen = self.longYdFrozen + self.longTdFrozen
+        self.shortPosFrozen = self.shortYdFrozen + self.shortTdFrozen
+
+    def recalculateFrozen(self):
+        """遍历全部活动委托重新计算冻结, 结果与 calculateFrozen 相同, 用于校验"""
+        self.log.debug('重新计算冻结情况')
         self.longPosFrozen = 0
         self.longYdFrozen = 0
         self.longTdFrozen = 0
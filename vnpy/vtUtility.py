@@ -34,9 +34,7 @@ class BarGenerator(object):
         # 新的一分钟
         elif self.bar.datetime.minute != tick.datetime.minute:
             # 生成上一分钟K线的时间戳
-            self.bar.datetime = self.bar.datetime.replace(second=0, microsecond=0)
-            self.bar.date = self.bar.datetime.strftime('%Y%m%d')
-            self.bar.time = self.bar.datetime.strftime('%H:%M:%S.%f')
+            self.bar.setDatetime(self.bar.datetime.replace(second=0, microsecond=0))
 
             # 推送已经结束的上一分钟K线
             self.onBar(self.bar)
@@ -61,7 +59,7 @@ class BarGenerator(object):
 
         # 通用更新部分
         self.bar.close = tick.lastPrice
-        self.bar.datetime = tick.datetime
+        self.bar.setDatetime(tick.datetime)
         self.bar.openInterest = tick.openInterest
 
         if self.lastTick:
@@ -99,9 +97,7 @@ class BarGenerator(object):
         # X分钟已经走完
         if not (bar.datetime.minute + 1) % self.xmin:   # 可以用X整除
             # 生成上一X分钟K线的时间戳
-            self.xminBar.datetime = self.xminBar.datetime.replace(second=0, microsecond=0)  # 将秒和微秒设为0
-            self.xminBar.date = self.xminBar.datetime.strftime('%Y%m%d')
-            self.xminBar.time = self.xminBar.datetime.strftime('%H:%M:%S.%f')
+            self.xminBar.setDatetime(self.xminBar.datetime.replace(second=0, microsecond=0))  # 将秒和微秒设为0
 
             # 推送
             self.onXminBar(self.xminBar)